@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 
 # Ensure we can import from src
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -7,4 +8,6 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from src.main import main
 
 if __name__ == "__main__":
+    # The local Whisper worker is a spawned child process (needed for frozen builds)
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
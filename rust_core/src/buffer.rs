@@ -0,0 +1,191 @@
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::{PyBufferError, PyValueError};
+use pyo3::ffi;
+use pyo3::prelude::*;
+use pyo3::types::PyBytes;
+use std::ffi::CString;
+use std::os::raw::{c_int, c_void};
+use std::ptr;
+use std::time::Instant;
+
+use crate::encode::{self, Format};
+
+/// Default Opus bitrate; plenty for 16 kHz speech.
+const DEFAULT_OPUS_BITRATE: u32 = 24000;
+
+pub const WAV_HEADER_LEN: usize = 44;
+
+/// 録音済みPCM (i16, インターリーブ) をPythonへ渡すためのバッファ
+///
+/// Implements the buffer protocol with format "h", so
+/// `numpy.frombuffer(buf, dtype=numpy.int16)` and `memoryview(buf)` see the
+/// samples without copying. The contents never change after construction.
+#[pyclass(frozen, module = "rust_core")]
+pub struct AudioBuffer {
+    samples: Vec<i16>,
+    sample_rate: u32,
+    channels: u16,
+    // Exposed through Py_buffer.shape / strides, so they must live as long as the object.
+    shape: [isize; 1],
+    strides: [isize; 1],
+}
+
+impl AudioBuffer {
+    pub fn from_samples(samples: Vec<i16>, sample_rate: u32, channels: u16) -> Self {
+        let len = samples.len() as isize;
+        Self {
+            samples,
+            sample_rate,
+            channels,
+            shape: [len],
+            strides: [std::mem::size_of::<i16>() as isize],
+        }
+    }
+}
+
+#[pymethods]
+impl AudioBuffer {
+    /// Build a buffer from any int16 buffer-protocol object (numpy int16 array, array('h'), ...).
+    #[new]
+    fn py_new(py: Python<'_>, data: PyBuffer<i16>, sample_rate: u32, channels: u16) -> PyResult<Self> {
+        if channels == 0 {
+            return Err(PyValueError::new_err("channels must be at least 1"));
+        }
+        Ok(Self::from_samples(data.to_vec(py)?, sample_rate, channels))
+    }
+
+    #[getter]
+    fn sample_rate(&self) -> u32 {
+        self.sample_rate
+    }
+
+    #[getter]
+    fn channels(&self) -> u16 {
+        self.channels
+    }
+
+    /// Number of frames (samples per channel).
+    #[getter]
+    fn frames(&self) -> usize {
+        self.samples.len() / self.channels.max(1) as usize
+    }
+
+    #[getter]
+    fn duration(&self) -> f64 {
+        if self.sample_rate == 0 {
+            return 0.0;
+        }
+        self.frames() as f64 / self.sample_rate as f64
+    }
+
+    fn __len__(&self) -> usize {
+        self.samples.len()
+    }
+
+    /// Complete 16-bit PCM WAV file, written straight into a new bytes object.
+    fn to_wav_bytes<'py>(&self, py: Python<'py>) -> PyResult<Bound<'py, PyBytes>> {
+        PyBytes::new_bound_with(py, wav_len(&self.samples), |out| {
+            write_wav(out, &self.samples, self.sample_rate, self.channels);
+            Ok(())
+        })
+    }
+
+    /// Encode for upload. `format` is "wav", "flac" or "opus" (Ogg Opus).
+    /// Returns (data, mime_type, encode_seconds); the GIL is released while encoding.
+    #[pyo3(signature = (format, bitrate=None))]
+    fn encode<'py>(
+        &self,
+        py: Python<'py>,
+        format: &str,
+        bitrate: Option<u32>,
+    ) -> PyResult<(Bound<'py, PyBytes>, &'static str, f64)> {
+        let format = Format::parse(format).map_err(PyValueError::new_err)?;
+        if format == Format::Wav {
+            let started = Instant::now();
+            let data = self.to_wav_bytes(py)?;
+            return Ok((data, format.mime_type(), started.elapsed().as_secs_f64()));
+        }
+        let bitrate = bitrate.unwrap_or(DEFAULT_OPUS_BITRATE);
+        let (data, elapsed) = py.allow_threads(|| {
+            let started = Instant::now();
+            encode::encode(&self.samples, self.sample_rate, self.channels, format, bitrate)
+                .map(|data| (data, started.elapsed().as_secs_f64()))
+        })
+        .map_err(PyValueError::new_err)?;
+        Ok((PyBytes::new_bound(py, &data), format.mime_type(), elapsed))
+    }
+
+    unsafe fn __getbuffer__(slf: Bound<'_, Self>, view: *mut ffi::Py_buffer, flags: c_int) -> PyResult<()> {
+        if view.is_null() {
+            return Err(PyBufferError::new_err("View is null"));
+        }
+        if (flags & ffi::PyBUF_WRITABLE) == ffi::PyBUF_WRITABLE {
+            return Err(PyBufferError::new_err("AudioBuffer is read-only"));
+        }
+        let this = slf.get();
+        (*view).buf = this.samples.as_ptr() as *mut c_void;
+        (*view).len = (this.samples.len() * std::mem::size_of::<i16>()) as isize;
+        (*view).readonly = 1;
+        (*view).itemsize = std::mem::size_of::<i16>() as isize;
+        (*view).format = if (flags & ffi::PyBUF_FORMAT) == ffi::PyBUF_FORMAT {
+            CString::new("h").unwrap().into_raw()
+        } else {
+            ptr::null_mut()
+        };
+        (*view).ndim = 1;
+        (*view).shape = if (flags & ffi::PyBUF_ND) == ffi::PyBUF_ND {
+            this.shape.as_ptr() as *mut isize
+        } else {
+            ptr::null_mut()
+        };
+        (*view).strides = if (flags & ffi::PyBUF_STRIDES) == ffi::PyBUF_STRIDES {
+            this.strides.as_ptr() as *mut isize
+        } else {
+            ptr::null_mut()
+        };
+        (*view).suboffsets = ptr::null_mut();
+        (*view).internal = ptr::null_mut();
+        (*view).obj = slf.into_any().into_ptr();
+        Ok(())
+    }
+
+    unsafe fn __releasebuffer__(&self, view: *mut ffi::Py_buffer) {
+        if !(*view).format.is_null() {
+            drop(CString::from_raw((*view).format));
+        }
+    }
+}
+
+/// Size of the WAV file image `write_wav` produces for these samples.
+pub fn wav_len(samples: &[i16]) -> usize {
+    WAV_HEADER_LEN + samples.len() * 2
+}
+
+/// Writes a complete 16-bit PCM WAV file into `out`, which must be `wav_len(samples)` bytes.
+pub fn write_wav(out: &mut [u8], samples: &[i16], sample_rate: u32, channels: u16) {
+    let data_len = samples.len() * 2;
+    out[..WAV_HEADER_LEN].copy_from_slice(&wav_header(data_len, sample_rate, channels));
+    for (dst, s) in out[WAV_HEADER_LEN..].chunks_exact_mut(2).zip(samples) {
+        dst.copy_from_slice(&s.to_le_bytes());
+    }
+}
+
+/// 16-bit PCM の WAV ヘッダ (RIFF/WAVE, fmt, data)
+pub fn wav_header(data_len: usize, sample_rate: u32, channels: u16) -> [u8; WAV_HEADER_LEN] {
+    let block_align = channels as u32 * 2;
+    let mut h = [0u8; WAV_HEADER_LEN];
+    h[0..4].copy_from_slice(b"RIFF");
+    h[4..8].copy_from_slice(&((36 + data_len) as u32).to_le_bytes());
+    h[8..12].copy_from_slice(b"WAVE");
+    h[12..16].copy_from_slice(b"fmt ");
+    h[16..20].copy_from_slice(&16u32.to_le_bytes());
+    h[20..22].copy_from_slice(&1u16.to_le_bytes());
+    h[22..24].copy_from_slice(&channels.to_le_bytes());
+    h[24..28].copy_from_slice(&sample_rate.to_le_bytes());
+    h[28..32].copy_from_slice(&(sample_rate * block_align).to_le_bytes());
+    h[32..34].copy_from_slice(&(block_align as u16).to_le_bytes());
+    h[34..36].copy_from_slice(&16u16.to_le_bytes());
+    h[36..40].copy_from_slice(b"data");
+    h[40..44].copy_from_slice(&(data_len as u32).to_le_bytes());
+    h
+}
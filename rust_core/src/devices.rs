@@ -0,0 +1,298 @@
+//! 入力デバイスのレジストリ
+//!
+//! Enumerates the host once, caches each device's supported configs and hands
+//! out stable string IDs, so starting a recording does not re-enumerate and a
+//! replugged USB mic is found again by ID rather than by position.
+
+use cpal::traits::{DeviceTrait, HostTrait};
+use parking_lot::Mutex;
+use std::collections::HashMap;
+use std::sync::atomic::{AtomicBool, AtomicUsize, Ordering};
+use std::sync::{Arc, OnceLock};
+use std::thread;
+use std::time::Duration;
+
+/// How often the watcher thread checks for added/removed devices.
+///
+/// cpal has no hotplug notifications, so this re-enumerates the host. That is
+/// not cheap: on ALSA it opens every PCM device, and a device that is busy
+/// can drop out of the list. The poll is therefore skipped while any input
+/// stream is open (see `StreamGuard`); changes made meanwhile are picked up by
+/// the first poll after the stream closes.
+///
+/// With `audio.warm_stream` a stream is open all the time, so that alone would
+/// stop detection for good. Instead the stream's error callback reports a lost
+/// device (`notify_device_lost`) and the next poll refreshes despite the open
+/// stream. Newly plugged devices are not seen until the warm stream closes;
+/// `resolve` still re-enumerates when asked for an ID it does not know.
+const WATCH_INTERVAL: Duration = Duration::from_secs(3);
+
+/// Input streams currently open (recording or warm)
+static OPEN_STREAMS: AtomicUsize = AtomicUsize::new(0);
+
+/// Set by a stream's error callback when its device disappeared
+static DEVICE_LOST: AtomicBool = AtomicBool::new(false);
+
+/// キャッシュされた入力デバイス
+#[derive(Clone)]
+pub struct InputDevice {
+    /// "<host>:<name>", plus "#<n>" for the n-th duplicate of a name.
+    pub id: String,
+    pub name: String,
+    pub is_default: bool,
+    pub device: cpal::Device,
+    pub configs: Vec<cpal::SupportedStreamConfigRange>,
+    pub default_config: Option<cpal::SupportedStreamConfig>,
+}
+
+#[derive(Default)]
+struct Registry {
+    loaded: bool,
+    devices: Vec<InputDevice>,
+    // The host default, which may not appear in the enumerated list.
+    default: Option<InputDevice>,
+    // Names in enumeration order plus the default's name; compared by the watcher.
+    signature: Vec<String>,
+    // Set to stop the running watcher thread; None when no watcher runs.
+    watcher_stop: Option<Arc<AtomicBool>>,
+}
+
+pub type ChangeListener = Arc<dyn Fn() + Send + Sync>;
+
+fn registry() -> &'static Mutex<Registry> {
+    static REGISTRY: OnceLock<Mutex<Registry>> = OnceLock::new();
+    REGISTRY.get_or_init(|| Mutex::new(Registry::default()))
+}
+
+fn listener() -> &'static Mutex<Option<ChangeListener>> {
+    static LISTENER: OnceLock<Mutex<Option<ChangeListener>>> = OnceLock::new();
+    LISTENER.get_or_init(|| Mutex::new(None))
+}
+
+/// キャッシュ済みの一覧 (初回のみ列挙する)
+pub fn list() -> Result<Vec<InputDevice>, String> {
+    ensure_loaded()?;
+    Ok(registry().lock().devices.clone())
+}
+
+/// 強制的に列挙し直す。一覧が変わった場合 true
+pub fn refresh() -> Result<bool, String> {
+    let (devices, default, signature) = enumerate()?;
+    let changed = {
+        let mut reg = registry().lock();
+        let changed = reg.loaded && reg.signature != signature;
+        reg.devices = devices;
+        reg.default = default;
+        reg.signature = signature;
+        reg.loaded = true;
+        changed
+    };
+    Ok(changed)
+}
+
+/// ID (None = ホストの既定デバイス) からデバイスを引く
+///
+/// A missing ID triggers one re-enumeration in case the device was just
+/// plugged in; if it is still absent this is an error rather than a silent
+/// switch to some other microphone.
+pub fn resolve(id: Option<&str>) -> Result<InputDevice, String> {
+    ensure_loaded()?;
+    if let Some(found) = lookup(id) {
+        return Ok(found);
+    }
+    refresh()?;
+    lookup(id).ok_or_else(|| match id {
+        Some(id) => format!("Input device not found: {}", id),
+        None => "No input device available".to_string(),
+    })
+}
+
+/// 一覧が変わったときに (監視スレッドから) 呼ばれるリスナーを設定する
+///
+/// The watcher thread only runs while a listener is set; None stops it.
+pub fn set_change_listener(callback: Option<ChangeListener>) {
+    let watch = callback.is_some();
+    *listener().lock() = callback;
+    if watch {
+        start_watcher();
+    } else {
+        stop_watcher();
+    }
+}
+
+/// 入力ストリームが開いている間保持する。監視スレッドはその間ポーリングしない
+pub struct StreamGuard(());
+
+impl StreamGuard {
+    pub fn new() -> Self {
+        OPEN_STREAMS.fetch_add(1, Ordering::SeqCst);
+        StreamGuard(())
+    }
+}
+
+impl Drop for StreamGuard {
+    fn drop(&mut self) {
+        OPEN_STREAMS.fetch_sub(1, Ordering::SeqCst);
+    }
+}
+
+/// 入力ストリームのデバイスが失われたことを監視スレッドに伝える
+///
+/// Called from cpal's error callback, so it only sets a flag.
+pub fn notify_device_lost() {
+    DEVICE_LOST.store(true, Ordering::SeqCst);
+}
+
+fn lookup(id: Option<&str>) -> Option<InputDevice> {
+    let reg = registry().lock();
+    match id {
+        Some(id) => reg.devices.iter().find(|d| d.id == id).cloned(),
+        None => reg.default.clone(),
+    }
+}
+
+fn ensure_loaded() -> Result<(), String> {
+    if registry().lock().loaded {
+        return Ok(());
+    }
+    refresh().map(|_| ())
+}
+
+fn enumerate() -> Result<(Vec<InputDevice>, Option<InputDevice>, Vec<String>), String> {
+    let host = cpal::default_host();
+    let host_name = host.id().name();
+    let default_device = host.default_input_device();
+    let default_name = default_device.as_ref().and_then(|d| d.name().ok());
+
+    let mut devices: Vec<InputDevice> = Vec::new();
+    let mut seen: HashMap<String, usize> = HashMap::new();
+    for device in host.input_devices().map_err(|e| e.to_string())? {
+        let Ok(name) = device.name() else { continue };
+        let id = next_id(&mut seen, host_name, &name);
+        devices.push(describe(device, id, name));
+    }
+
+    let mut default = None;
+    if let Some(name) = &default_name {
+        if let Some(d) = devices.iter_mut().find(|d| &d.name == name) {
+            d.is_default = true;
+            default = Some(d.clone());
+        }
+    }
+    if default.is_none() {
+        default = default_device.zip(default_name.clone()).map(|(device, name)| {
+            let mut d = describe(device, format!("{}:{}", host_name, name), name);
+            d.is_default = true;
+            d
+        });
+    }
+
+    let mut signature: Vec<String> = devices.iter().map(|d| d.id.clone()).collect();
+    signature.push(default_name.unwrap_or_default());
+    Ok((devices, default, signature))
+}
+
+/// Same-named devices are told apart by their order among that name only,
+/// so plugging in an unrelated device does not change existing IDs.
+fn next_id(seen: &mut HashMap<String, usize>, host_name: &str, name: &str) -> String {
+    let ordinal = seen.entry(name.to_string()).or_insert(0);
+    let id = if *ordinal == 0 {
+        format!("{}:{}", host_name, name)
+    } else {
+        format!("{}:{}#{}", host_name, name, ordinal)
+    };
+    *ordinal += 1;
+    id
+}
+
+fn describe(device: cpal::Device, id: String, name: String) -> InputDevice {
+    let configs = device
+        .supported_input_configs()
+        .map(|c| c.collect())
+        .unwrap_or_default();
+    let default_config = device.default_input_config().ok();
+    InputDevice {
+        id,
+        name,
+        is_default: false,
+        device,
+        configs,
+        default_config,
+    }
+}
+
+/// Signature used by the watcher: names only, no config queries. Still
+/// enumerates (and on ALSA opens) every device, so never call it while a
+/// stream is open.
+fn current_signature() -> Option<Vec<String>> {
+    let host = cpal::default_host();
+    let host_name = host.id().name();
+    let mut seen: HashMap<String, usize> = HashMap::new();
+    let mut signature = Vec::new();
+    for device in host.input_devices().ok()? {
+        let Ok(name) = device.name() else { continue };
+        signature.push(next_id(&mut seen, host_name, &name));
+    }
+    signature.push(host.default_input_device().and_then(|d| d.name().ok()).unwrap_or_default());
+    Some(signature)
+}
+
+fn start_watcher() {
+    let stop = Arc::new(AtomicBool::new(false));
+    {
+        let mut reg = registry().lock();
+        if reg.watcher_stop.is_some() {
+            return;
+        }
+        reg.watcher_stop = Some(stop.clone());
+    }
+    let flag = stop.clone();
+    let spawned = thread::Builder::new()
+        .name("rust_core-devices".into())
+        .spawn(move || watch(&flag));
+    if spawned.is_err() {
+        let mut reg = registry().lock();
+        if reg.watcher_stop.as_ref().is_some_and(|s| Arc::ptr_eq(s, &stop)) {
+            reg.watcher_stop = None;
+        }
+    }
+}
+
+fn stop_watcher() {
+    if let Some(stop) = registry().lock().watcher_stop.take() {
+        stop.store(true, Ordering::SeqCst);
+    }
+}
+
+/// 監視スレッド本体。stop が立つと次の周期で終了する
+fn watch(stop: &AtomicBool) {
+    loop {
+        thread::sleep(WATCH_INTERVAL);
+        if stop.load(Ordering::SeqCst) {
+            return;
+        }
+        // A lost device is worth one enumeration even with a stream open
+        let lost = DEVICE_LOST.swap(false, Ordering::SeqCst);
+        if OPEN_STREAMS.load(Ordering::SeqCst) > 0 && !lost {
+            continue;
+        }
+        let Some(signature) = current_signature() else { continue };
+        if registry().lock().signature == signature {
+            continue;
+        }
+        match refresh() {
+            Ok(true) => {
+                if stop.load(Ordering::SeqCst) {
+                    return;
+                }
+                // Call without holding the lock; the callback may block (e.g. on the GIL).
+                let callback = listener().lock().clone();
+                if let Some(callback) = callback {
+                    callback();
+                }
+            }
+            Ok(false) => {}
+            Err(e) => eprintln!("failed to refresh input devices: {}", e),
+        }
+    }
+}
@@ -0,0 +1,128 @@
+//! 入力ブロックへのリアルタイムDSP (ハイパス / DC除去 + ゲイン + ソフトクリップ)
+//!
+//! Runs inside the audio callback: no allocation, no locks. Parameters are
+//! atomics so `start()` can change them while a warm stream is running.
+
+use std::sync::atomic::{AtomicU32, Ordering};
+
+/// Below this level the soft clipper is exactly linear.
+const CLIP_KNEE: f32 = 0.8;
+
+/// start() から設定され、コールバックが毎ブロック読むパラメータ
+pub struct DspParams {
+    gain_bits: AtomicU32,
+    // 0.0 = high-pass off
+    highpass_hz_bits: AtomicU32,
+}
+
+impl Default for DspParams {
+    fn default() -> Self {
+        Self {
+            gain_bits: AtomicU32::new(1.0f32.to_bits()),
+            highpass_hz_bits: AtomicU32::new(0),
+        }
+    }
+}
+
+impl DspParams {
+    pub fn configure(&self, gain_db: f32, highpass_hz: Option<f32>) {
+        let gain = 10f32.powf(gain_db / 20.0);
+        self.gain_bits.store(gain.to_bits(), Ordering::Relaxed);
+        let hz = highpass_hz.filter(|&hz| hz > 0.0).unwrap_or(0.0);
+        self.highpass_hz_bits.store(hz.to_bits(), Ordering::Relaxed);
+    }
+
+    fn gain(&self) -> f32 {
+        f32::from_bits(self.gain_bits.load(Ordering::Relaxed))
+    }
+
+    fn highpass_hz(&self) -> f32 {
+        f32::from_bits(self.highpass_hz_bits.load(Ordering::Relaxed))
+    }
+}
+
+/// コールバック側の状態 (フィルタ履歴と作業バッファ)
+pub struct DspChain {
+    channels: usize,
+    sample_rate: f32,
+    // One-pole high-pass: y[n] = a * (y[n-1] + x[n] - x[n-1])
+    coeff: f32,
+    coeff_hz: f32,
+    prev_in: Vec<f32>,
+    prev_out: Vec<f32>,
+    scratch: Vec<f32>,
+}
+
+impl DspChain {
+    /// `max_block` sizes the scratch buffer; longer blocks are processed in pieces.
+    pub fn new(channels: usize, sample_rate: u32, max_block: usize) -> Self {
+        let channels = channels.max(1);
+        Self {
+            channels,
+            sample_rate: sample_rate as f32,
+            coeff: 0.0,
+            coeff_hz: 0.0,
+            prev_in: vec![0.0; channels],
+            prev_out: vec![0.0; channels],
+            scratch: vec![0.0; (max_block - max_block % channels).max(channels)],
+        }
+    }
+
+    /// Processed blocks are handed to `sink` one scratch buffer at a time.
+    /// With unity gain and no high-pass the input is passed through untouched.
+    pub fn process(&mut self, params: &DspParams, data: &[f32], mut sink: impl FnMut(&[f32])) {
+        let gain = params.gain();
+        let highpass_hz = params.highpass_hz();
+        if gain == 1.0 && highpass_hz == 0.0 {
+            sink(data);
+            return;
+        }
+        if highpass_hz != self.coeff_hz {
+            self.coeff = (-2.0 * std::f32::consts::PI * highpass_hz / self.sample_rate).exp();
+            self.coeff_hz = highpass_hz;
+        }
+
+        let piece = self.scratch.len();
+        for chunk in data.chunks(piece) {
+            let out = &mut self.scratch[..chunk.len()];
+            out.copy_from_slice(chunk);
+            if highpass_hz > 0.0 {
+                highpass(out, self.channels, self.coeff, &mut self.prev_in, &mut self.prev_out);
+            }
+            if gain != 1.0 {
+                apply_gain(out, gain);
+            }
+            sink(out);
+        }
+    }
+}
+
+fn highpass(block: &mut [f32], channels: usize, a: f32, prev_in: &mut [f32], prev_out: &mut [f32]) {
+    for frame in block.chunks_exact_mut(channels) {
+        for ((s, x1), y1) in frame.iter_mut().zip(prev_in.iter_mut()).zip(prev_out.iter_mut()) {
+            let x = *s;
+            let y = a * (*y1 + x - *x1);
+            *x1 = x;
+            *y1 = y;
+            *s = y;
+        }
+    }
+}
+
+/// Gain followed by a soft clipper that is linear up to CLIP_KNEE and then
+/// bends smoothly towards ±1. The multiply loop is kept separate so it vectorizes.
+fn apply_gain(block: &mut [f32], gain: f32) {
+    for s in block.iter_mut() {
+        *s *= gain;
+    }
+    if gain <= 1.0 {
+        return;
+    }
+    let range = 1.0 - CLIP_KNEE;
+    for s in block.iter_mut() {
+        let mag = s.abs();
+        if mag > CLIP_KNEE {
+            *s = s.signum() * (CLIP_KNEE + range * ((mag - CLIP_KNEE) / range).tanh());
+        }
+    }
+}
@@ -0,0 +1,156 @@
+//! アップロード用の圧縮エンコード (FLAC / Ogg Opus)
+
+use crate::buffer::{wav_len, write_wav};
+
+/// Opus frame length; 20 ms is the codec's sweet spot for speech.
+#[cfg(feature = "opus")]
+const OPUS_FRAME_MS: u32 = 20;
+/// Ogg granule positions for Opus are always counted at 48 kHz.
+#[cfg(feature = "opus")]
+const OPUS_GRANULE_RATE: u64 = 48000;
+
+#[derive(Clone, Copy, PartialEq, Eq, Debug)]
+pub enum Format {
+    Wav,
+    Flac,
+    Opus,
+}
+
+impl Format {
+    pub fn parse(name: &str) -> Result<Self, String> {
+        match name.to_ascii_lowercase().as_str() {
+            "wav" => Ok(Format::Wav),
+            "flac" => Ok(Format::Flac),
+            "opus" | "ogg" => Ok(Format::Opus),
+            other => Err(format!("Unknown audio format: {}", other)),
+        }
+    }
+
+    pub fn mime_type(self) -> &'static str {
+        match self {
+            Format::Wav => "audio/wav",
+            Format::Flac => "audio/flac",
+            Format::Opus => "audio/ogg",
+        }
+    }
+}
+
+/// i16 インターリーブPCMを指定フォーマットのファイルイメージにする
+pub fn encode(samples: &[i16], sample_rate: u32, channels: u16, format: Format, bitrate: u32) -> Result<Vec<u8>, String> {
+    match format {
+        Format::Wav => Ok(encode_wav(samples, sample_rate, channels)),
+        Format::Flac => encode_flac(samples, sample_rate, channels),
+        Format::Opus => encode_opus(samples, sample_rate, channels, bitrate),
+    }
+}
+
+fn encode_wav(samples: &[i16], sample_rate: u32, channels: u16) -> Vec<u8> {
+    let mut out = vec![0u8; wav_len(samples)];
+    write_wav(&mut out, samples, sample_rate, channels);
+    out
+}
+
+fn encode_flac(samples: &[i16], sample_rate: u32, channels: u16) -> Result<Vec<u8>, String> {
+    use flacenc::component::BitRepr;
+    use flacenc::error::Verify;
+
+    let config = flacenc::config::Encoder::default()
+        .into_verified()
+        .map_err(|_| "Invalid FLAC encoder configuration".to_string())?;
+    let wide: Vec<i32> = samples.iter().map(|&s| s as i32).collect();
+    let source = flacenc::source::MemSource::from_samples(&wide, channels as usize, 16, sample_rate as usize);
+    let stream = flacenc::encode_with_fixed_block_size(&config, source, config.block_size)
+        .map_err(|e| format!("FLAC encode failed: {:?}", e))?;
+
+    let mut sink = flacenc::bitsink::ByteSink::new();
+    stream
+        .write(&mut sink)
+        .map_err(|e| format!("FLAC write failed: {:?}", e))?;
+    Ok(sink.as_slice().to_vec())
+}
+
+#[cfg(not(feature = "opus"))]
+fn encode_opus(_samples: &[i16], _sample_rate: u32, _channels: u16, _bitrate: u32) -> Result<Vec<u8>, String> {
+    Err("rust_core was built without Opus support".to_string())
+}
+
+#[cfg(feature = "opus")]
+fn encode_opus(samples: &[i16], sample_rate: u32, channels: u16, bitrate: u32) -> Result<Vec<u8>, String> {
+    use ogg::writing::{PacketWriteEndInfo, PacketWriter};
+
+    if ![8000, 12000, 16000, 24000, 48000].contains(&sample_rate) {
+        return Err(format!("Opus cannot encode {} Hz audio", sample_rate));
+    }
+    let opus_channels = match channels {
+        1 => opus::Channels::Mono,
+        2 => opus::Channels::Stereo,
+        n => return Err(format!("Opus cannot encode {} channels", n)),
+    };
+
+    let mut encoder = opus::Encoder::new(sample_rate, opus_channels, opus::Application::Voip)
+        .map_err(|e| e.to_string())?;
+    encoder
+        .set_bitrate(opus::Bitrate::Bits(bitrate as i32))
+        .map_err(|e| e.to_string())?;
+    let granule_scale = OPUS_GRANULE_RATE / sample_rate as u64;
+    let pre_skip = encoder.get_lookahead().map_err(|e| e.to_string())? as u64 * granule_scale;
+
+    let serial = 0x566f_4963; // "VoIc"
+    let mut writer = PacketWriter::new(Vec::with_capacity(samples.len() / 4));
+    let io_err = |e: std::io::Error| e.to_string();
+
+    // RFC 7845 identification header
+    let mut head = Vec::with_capacity(19);
+    head.extend_from_slice(b"OpusHead");
+    head.push(1);
+    head.push(channels as u8);
+    head.extend_from_slice(&(pre_skip as u16).to_le_bytes());
+    head.extend_from_slice(&sample_rate.to_le_bytes());
+    head.extend_from_slice(&0i16.to_le_bytes());
+    head.push(0);
+    writer.write_packet(head, serial, PacketWriteEndInfo::EndPage, 0).map_err(io_err)?;
+
+    // Comment header with an empty tag list
+    let vendor = b"voice-in rust_core";
+    let mut tags = Vec::with_capacity(16 + vendor.len());
+    tags.extend_from_slice(b"OpusTags");
+    tags.extend_from_slice(&(vendor.len() as u32).to_le_bytes());
+    tags.extend_from_slice(vendor);
+    tags.extend_from_slice(&0u32.to_le_bytes());
+    writer.write_packet(tags, serial, PacketWriteEndInfo::EndPage, 0).map_err(io_err)?;
+
+    let frame_frames = (sample_rate * OPUS_FRAME_MS / 1000) as usize;
+    let frame_len = frame_frames * channels as usize;
+    let total_frames = samples.len() / channels as usize;
+    // The decoder drops the first pre_skip samples, so the lookahead still in
+    // the encoder after the last real frame is flushed with trailing silence.
+    // Empty input still yields one (silent) frame so the stream is valid.
+    let lookahead = (pre_skip / granule_scale) as usize;
+    let packets = ((total_frames + lookahead + frame_frames - 1) / frame_frames).max(1);
+    let mut packet = vec![0u8; 4000];
+    let mut padded = vec![0i16; frame_len];
+    for i in 0..packets {
+        let start = (i * frame_len).min(samples.len());
+        let chunk = &samples[start..(start + frame_len).min(samples.len())];
+        let frame: &[i16] = if chunk.len() == frame_len {
+            chunk
+        } else {
+            padded[..chunk.len()].copy_from_slice(chunk);
+            padded[chunk.len()..].fill(0);
+            &padded
+        };
+        let n = encoder.encode(frame, &mut packet).map_err(|e| e.to_string())?;
+        let last = i + 1 == packets;
+        // Granules count decoded samples, pre-skip included. The final one
+        // marks where real audio ends and never exceeds what was decoded.
+        let granule = if last {
+            pre_skip + total_frames as u64 * granule_scale
+        } else {
+            ((i + 1) * frame_frames) as u64 * granule_scale
+        };
+        let end = if last { PacketWriteEndInfo::EndStream } else { PacketWriteEndInfo::NormalPacket };
+        writer.write_packet(packet[..n].to_vec(), serial, end, granule).map_err(io_err)?;
+    }
+
+    Ok(writer.into_inner())
+}
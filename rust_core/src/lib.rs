@@ -1,11 +1,40 @@
+use parking_lot::Mutex;
 use pyo3::prelude::*;
+use std::sync::{mpsc, Arc};
+use std::thread;
 
+mod buffer;
+mod devices;
+mod dsp;
+mod encode;
 mod recorder;
-use recorder::AudioRecorder;
+mod resample;
+mod ring;
+mod segment;
+mod vad;
+use buffer::AudioBuffer;
+use recorder::{AudioRecorder, CaptureOptions, ChunkBatch, Subscription};
+use segment::{Segment, SegmentCallback};
 
-#[pyclass(unsendable)]
+/// Batches queued for the Python callback before new ones are dropped.
+const SUBSCRIBER_QUEUE: usize = 64;
+
+/// Every method locks `inner` with the GIL released, so a stop() that is
+/// finalizing a long recording does not block other Python threads, and the
+/// recorder can be driven from any thread.
+#[pyclass]
 struct PyAudioRecorder {
-    inner: AudioRecorder,
+    inner: Mutex<AudioRecorder>,
+}
+
+impl PyAudioRecorder {
+    fn with_inner<R, F>(&self, py: Python<'_>, f: F) -> R
+    where
+        R: Send,
+        F: FnOnce(&mut AudioRecorder) -> R + Send,
+    {
+        py.allow_threads(|| f(&mut self.inner.lock()))
+    }
 }
 
 #[pymethods]
@@ -13,46 +42,288 @@ impl PyAudioRecorder {
     #[new]
     fn new() -> Self {
         PyAudioRecorder {
-            inner: AudioRecorder::new(),
+            inner: Mutex::new(AudioRecorder::new()),
         }
     }
 
-    fn start(&mut self, file_path: String, input_device_index: Option<usize>) -> PyResult<u32> {
-        self.inner.start(file_path, input_device_index).map_err(|e| {
+    /// Records into `file_path` as WAV, or into memory when it is None (see `take_buffer`).
+    /// `input_device_id` is an ID from `get_input_devices()`; None is the host default.
+    /// `target_sample_rate` / `target_channels` convert the capture (e.g. 16000 / 1);
+    /// None keeps the device format. Returns the output sample rate.
+    /// `trim_margin_ms` trims the in-memory recording to the detected speech
+    /// plus that margin; `vad_energy_threshold` is the per-frame RMS floor.
+    /// `monitor_only` keeps nothing and only feeds subscribers (level meters).
+    /// `input_gain_db` (soft-clipped) and `highpass_hz` (DC removal / rumble
+    /// filter, None = off) are applied in the audio callback.
+    /// After `max_seconds` of output the recording is finalized by rust_core and
+    /// `on_auto_stop()` is called once from a background thread; call `stop()`
+    /// afterwards to collect the result as usual.
+    /// With `segment_pause_ms`, every stretch of speech followed by that long a
+    /// pause (and at least `segment_min_ms` long) is passed to
+    /// `on_segment(index, AudioBuffer)` while recording continues, in order,
+    /// from a background thread. After `stop()`, `take_final_segment()` holds
+    /// the rest and `get_segment_count()` the number of segments delivered.
+    #[pyo3(signature = (
+        file_path=None,
+        input_device_id=None,
+        target_sample_rate=None,
+        target_channels=None,
+        trim_margin_ms=None,
+        vad_energy_threshold=0.005,
+        monitor_only=false,
+        input_gain_db=0.0,
+        highpass_hz=None,
+        max_seconds=None,
+        on_auto_stop=None,
+        segment_pause_ms=None,
+        segment_min_ms=0,
+        on_segment=None
+    ))]
+    fn start(
+        &self,
+        py: Python<'_>,
+        file_path: Option<String>,
+        input_device_id: Option<String>,
+        target_sample_rate: Option<u32>,
+        target_channels: Option<u16>,
+        trim_margin_ms: Option<u32>,
+        vad_energy_threshold: f32,
+        monitor_only: bool,
+        input_gain_db: f32,
+        highpass_hz: Option<f32>,
+        max_seconds: Option<f32>,
+        on_auto_stop: Option<PyObject>,
+        segment_pause_ms: Option<u32>,
+        segment_min_ms: u32,
+        on_segment: Option<PyObject>,
+    ) -> PyResult<u32> {
+        // Called on the writer thread, which must never wait for the GIL (stop()
+        // joins it), so the Python call is made from a short-lived thread instead.
+        let on_limit = on_auto_stop.map(|callback| -> recorder::LimitCallback {
+            Box::new(move || {
+                let spawned = thread::Builder::new()
+                    .name("rust_core-autostop".into())
+                    .spawn(move || {
+                        Python::with_gil(|py| {
+                            if let Err(e) = callback.call0(py) {
+                                e.print(py);
+                            }
+                        })
+                    });
+                if let Err(e) = spawned {
+                    eprintln!("failed to deliver auto-stop: {}", e);
+                }
+            })
+        });
+        let on_segment = match on_segment {
+            Some(callback) => Some(segment_sender(callback)?),
+            None => None,
+        };
+        let options = CaptureOptions {
+            file_path,
+            input_device_id,
+            target_sample_rate,
+            target_channels,
+            vad_energy_threshold,
+            trim_margin_ms,
+            monitor_only,
+            input_gain_db,
+            highpass_hz,
+            max_seconds,
+            on_limit,
+            segment_pause_ms,
+            segment_min_ms,
+            on_segment,
+        };
+        self.with_inner(py, move |r| r.start(options)).map_err(|e| {
             pyo3::exceptions::PyRuntimeError::new_err(format!("Failed to start recording: {}", e))
         })
     }
 
-    fn stop(&mut self) -> PyResult<()> {
-        self.inner.stop();
+    /// Calls `callback(peak, rms, chunk)` every `interval_ms` of captured audio,
+    /// from a background thread that takes the GIL once per batch. `chunk` is an
+    /// AudioBuffer in the output format when `include_audio` is true, else None.
+    /// Replaces any previous subscriber and survives across recordings. If the
+    /// callback falls behind, batches beyond a small queue are dropped.
+    #[pyo3(signature = (callback, interval_ms=50, include_audio=false))]
+    fn subscribe(&self, py: Python<'_>, callback: PyObject, interval_ms: u32, include_audio: bool) -> PyResult<()> {
+        let (tx, rx) = mpsc::sync_channel::<(f32, f32, Option<AudioBuffer>)>(SUBSCRIBER_QUEUE);
+
+        // The writer thread only enqueues; the GIL is taken here, so the writer
+        // never waits on Python.
+        thread::Builder::new()
+            .name("rust_core-subscriber".into())
+            .spawn(move || {
+                while let Ok(batch) = rx.recv() {
+                    Python::with_gil(|py| {
+                        if let Err(e) = callback.call1(py, batch) {
+                            e.print(py);
+                        }
+                    });
+                }
+            })
+            .map_err(|e| pyo3::exceptions::PyRuntimeError::new_err(e.to_string()))?;
+
+        let subscription = Subscription {
+            interval_ms,
+            include_audio,
+            callback: Box::new(move |batch: &ChunkBatch| {
+                let chunk = include_audio
+                    .then(|| AudioBuffer::from_samples(batch.samples.to_vec(), batch.sample_rate, batch.channels));
+                let _ = tx.try_send((batch.peak, batch.rms, chunk));
+            }),
+        };
+        self.with_inner(py, move |r| r.subscribe(Some(subscription)));
+        Ok(())
+    }
+
+    /// Removes the subscriber; its thread exits once the queue drains.
+    fn unsubscribe(&self, py: Python<'_>) {
+        self.with_inner(py, |r| r.subscribe(None));
+    }
+
+    /// Keeps the input stream open between recordings, buffering the last
+    /// `preroll_ms` of audio. A later `start()` on the same device then only
+    /// marks the start position and the take begins with the pre-roll.
+    #[pyo3(signature = (input_device_id=None, target_sample_rate=None, preroll_ms=500))]
+    fn warm_up(
+        &self,
+        py: Python<'_>,
+        input_device_id: Option<String>,
+        target_sample_rate: Option<u32>,
+        preroll_ms: u32,
+    ) -> PyResult<()> {
+        self.with_inner(py, move |r| r.warm_up(input_device_id, target_sample_rate, preroll_ms))
+            .map_err(|e| pyo3::exceptions::PyRuntimeError::new_err(format!("Failed to open warm stream: {}", e)))
+    }
+
+    /// Closes the warm stream (stopping any recording in progress).
+    fn cool_down(&self, py: Python<'_>) {
+        self.with_inner(py, |r| r.cool_down());
+    }
+
+    fn is_warm(&self, py: Python<'_>) -> bool {
+        self.with_inner(py, |r| r.is_warm())
+    }
+
+    /// Stops the stream and finalizes the output (flush, trim, WAV header)
+    /// with the GIL released.
+    fn stop(&self, py: Python<'_>) -> PyResult<()> {
+        self.with_inner(py, |r| r.stop());
         Ok(())
     }
 
-    fn get_stats(&self) -> PyResult<(f32, f32, f32)> {
-        Ok(self.inner.get_stats())
+    /// The in-memory recording of the last `start(None, ...)`/`stop()` cycle, once.
+    fn take_buffer(&self, py: Python<'_>) -> Option<AudioBuffer> {
+        self.with_inner(py, |r| r.take_capture())
+            .map(|c| AudioBuffer::from_samples(c.samples, c.sample_rate, c.channels))
     }
 
-    fn is_silence(&self, energy_threshold: f32, peak_threshold: f32, min_duration: f32) -> PyResult<bool> {
+    /// With segmentation: the audio after the last delivered segment, once.
+    /// None when it holds no speech.
+    fn take_final_segment(&self, py: Python<'_>) -> Option<AudioBuffer> {
+        self.with_inner(py, |r| r.take_final_segment())
+            .map(|c| AudioBuffer::from_samples(c.samples, c.sample_rate, c.channels))
+    }
+
+    /// Segments passed to `on_segment` during the last recording.
+    fn get_segment_count(&self, py: Python<'_>) -> usize {
+        self.with_inner(py, |r| r.segment_count())
+    }
+
+    /// (peak, avg_rms, duration_seconds)
+    fn get_stats(&self, py: Python<'_>) -> PyResult<(f32, f32, f32)> {
+        Ok(self.with_inner(py, |r| r.get_stats()))
+    }
+
+    /// (start_s, end_s, speech_s) of the detected speech in the last recording,
+    /// measured before trimming; None when no speech was found.
+    fn get_speech_span(&self, py: Python<'_>) -> Option<(f32, f32, f32)> {
+        self.with_inner(py, |r| r.speech_span())
+    }
+
+    /// Number of audio blocks dropped because the writer thread fell behind.
+    fn get_overrun_count(&self, py: Python<'_>) -> PyResult<usize> {
+        Ok(self.with_inner(py, |r| r.overrun_count()))
+    }
+
+    fn is_silence(&self, py: Python<'_>, energy_threshold: f32, peak_threshold: f32, min_duration: f32) -> PyResult<bool> {
         let config = recorder::VadConfig {
             energy_threshold,
             peak_threshold,
             min_duration,
         };
-        Ok(self.inner.is_silence(&config))
+        Ok(self.with_inner(py, move |r| r.is_silence(&config)))
     }
 }
 
+/// Forwards segments to `callback(index, AudioBuffer)` on a dedicated thread.
+/// The queue is unbounded: unlike level batches, a segment must never be dropped.
+fn segment_sender(callback: PyObject) -> PyResult<SegmentCallback> {
+    let (tx, rx) = mpsc::channel::<(usize, AudioBuffer)>();
+    thread::Builder::new()
+        .name("rust_core-segments".into())
+        .spawn(move || {
+            while let Ok(segment) = rx.recv() {
+                Python::with_gil(|py| {
+                    if let Err(e) = callback.call1(py, segment) {
+                        e.print(py);
+                    }
+                });
+            }
+        })
+        .map_err(|e| pyo3::exceptions::PyRuntimeError::new_err(e.to_string()))?;
+
+    // Called on the writer thread; it only moves the samples into the queue.
+    // The sender is dropped with the take, which ends the thread.
+    Ok(Box::new(move |segment: Segment| {
+        let _ = tx.send((segment.index, AudioBuffer::from_samples(segment.samples, segment.sample_rate, segment.channels)));
+    }))
+}
+
+/// Cached input devices as (name, id, is_default); enumerates only on first use.
+#[pyfunction]
+fn get_input_devices() -> PyResult<Vec<(String, String, bool)>> {
+    devices::list()
+        .map(|list| list.into_iter().map(|d| (d.name, d.id, d.is_default)).collect())
+        .map_err(|e| {
+            pyo3::exceptions::PyRuntimeError::new_err(format!("Failed to list devices: {}", e))
+        })
+}
+
+/// Re-enumerates input devices (e.g. from a "Refresh" button). Returns True
+/// if the list changed.
 #[pyfunction]
-fn get_input_devices() -> PyResult<Vec<(String, u32)>> {
-    recorder::get_input_devices_list().map_err(|e| {
+fn refresh_input_devices(py: Python<'_>) -> PyResult<bool> {
+    py.allow_threads(devices::refresh).map_err(|e| {
         pyo3::exceptions::PyRuntimeError::new_err(format!("Failed to list devices: {}", e))
     })
 }
 
+/// Calls `callback()` from a background thread whenever devices are added or
+/// removed; None removes the callback and stops the watcher thread. Devices
+/// are not polled while an input stream is open.
+#[pyfunction]
+#[pyo3(signature = (callback=None))]
+fn watch_input_devices(callback: Option<PyObject>) {
+    devices::set_change_listener(callback.map(|callback| -> devices::ChangeListener {
+        Arc::new(move || {
+            Python::with_gil(|py| {
+                if let Err(e) = callback.call0(py) {
+                    e.print(py);
+                }
+            })
+        })
+    }));
+}
+
 /// A Python module implemented in Rust.
 #[pymodule]
 fn rust_core(_py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_class::<PyAudioRecorder>()?;
+    m.add_class::<AudioBuffer>()?;
     m.add_function(wrap_pyfunction!(get_input_devices, m)?)?;
+    m.add_function(wrap_pyfunction!(refresh_input_devices, m)?)?;
+    m.add_function(wrap_pyfunction!(watch_input_devices, m)?)?;
     Ok(())
 }
@@ -1,41 +1,70 @@
-use cpal::traits::{DeviceTrait, HostTrait, StreamTrait};
+use cpal::traits::{DeviceTrait, StreamTrait};
 use hound::WavWriter;
 use parking_lot::Mutex;
-use std::sync::Arc;
-use std::sync::atomic::{AtomicBool, Ordering};
+use std::collections::VecDeque;
+use std::sync::{mpsc, Arc};
+use std::sync::atomic::{AtomicBool, AtomicU32, AtomicU64, AtomicUsize, Ordering};
 use std::thread;
+use std::time::Duration;
 
-pub fn get_input_devices_list() -> Result<Vec<(String, u32)>, String> {
-    let host = cpal::default_host();
-    let devices = host.input_devices().map_err(|e| e.to_string())?;
-    
-    let mut list = Vec::new();
-    // cpal doesn't guarantee index stability across runs easily without persistent handle,
-    // but for simple UI selection, we rely on iteration order assuming it matches between get and open calls
-    // if performed in short succession.
-    // Ideally we should return name and let caller match by name, but duplicate names exist.
-    // We will return (Name, Index) tuple.
-    for (index, device) in devices.enumerate() {
-        if let Ok(name) = device.name() {
-             list.push((name, index as u32));
-        }
-    }
-    Ok(list)
-}
+use crate::devices;
+use crate::dsp::{DspChain, DspParams};
+use crate::resample::FormatConverter;
+use crate::ring::{self, Consumer, Producer};
+use crate::segment::{SegmentCallback, Segmenter};
+use crate::vad::{FrameVad, SpeechSpan, FRAME_MS};
+
+/// Seconds of audio the ring buffer can hold before the callback starts dropping blocks.
+const RING_SECONDS: usize = 2;
+/// Samples drained from the ring per writer iteration.
+const WRITER_CHUNK: usize = 8192;
+/// How long the writer sleeps when the ring is empty.
+const WRITER_IDLE: Duration = Duration::from_millis(5);
+/// Initial capacity of the in-memory sink, in seconds.
+const MEMORY_RESERVE_SECONDS: usize = 10;
+/// Scratch buffer of the callback DSP stage, in milliseconds of input.
+const DSP_SCRATCH_MS: usize = 100;
+/// Shortest delivery interval a subscriber may ask for.
+const MIN_SUBSCRIBE_INTERVAL_MS: u32 = 10;
 
 /// 録音中に保持する統計情報
-#[derive(Clone, Default)]
+///
+/// The audio callback updates these and reset() clears them from the control
+/// thread, so every update is a single atomic read-modify-write (the float
+/// sum via fetch_update); readers never block the callback.
+#[derive(Default)]
 pub struct AudioStats {
-    pub peak: f32,
-    pub rms_sum: f32,
-    pub rms_count: usize,
-    pub samples_written: usize,
+    peak_bits: AtomicU32,
+    rms_sum_bits: AtomicU64,
+    rms_count: AtomicUsize,
+    // Captured frames at the device rate (one per sample instant, across all channels).
+    frames_captured: AtomicUsize,
+    overruns: AtomicUsize,
+    dropped_samples: AtomicUsize,
 }
 
-/// 録音状態を管理する構造体
-pub struct RecorderState {
-    pub writer: Option<WavWriter<std::io::BufWriter<std::fs::File>>>,
-    pub stats: AudioStats,
+impl AudioStats {
+    fn reset(&self) {
+        self.peak_bits.store(0, Ordering::Relaxed);
+        self.rms_sum_bits.store(0, Ordering::Relaxed);
+        self.rms_count.store(0, Ordering::Relaxed);
+        self.frames_captured.store(0, Ordering::Relaxed);
+        self.overruns.store(0, Ordering::Relaxed);
+        self.dropped_samples.store(0, Ordering::Relaxed);
+    }
+
+    fn peak(&self) -> f32 {
+        f32::from_bits(self.peak_bits.load(Ordering::Relaxed))
+    }
+
+    fn avg_rms(&self) -> f32 {
+        let count = self.rms_count.load(Ordering::Relaxed);
+        if count == 0 {
+            return 0.0;
+        }
+        let sum = f64::from_bits(self.rms_sum_bits.load(Ordering::Relaxed));
+        (sum / count as f64).sqrt() as f32
+    }
 }
 
 #[derive(Clone, Copy)]
@@ -55,178 +84,1013 @@ impl Default for VadConfig {
     }
 }
 
+/// start() に渡す録音設定
+pub struct CaptureOptions {
+    /// WAVの保存先。None の場合はメモリに録音し、stop() 後に take_capture() で取り出す
+    pub file_path: Option<String>,
+    /// デバイスレジストリのID (None = 既定デバイス)
+    pub input_device_id: Option<String>,
+    /// 出力フォーマット (None = デバイスのまま)。変換は書き出しスレッドで行う
+    pub target_sample_rate: Option<u32>,
+    pub target_channels: Option<u16>,
+    /// フレーム単位VADのRMS下限
+    pub vad_energy_threshold: f32,
+    /// メモリ録音を発話区間 + このマージンに切り詰める (WAVファイルは対象外)
+    pub trim_margin_ms: Option<u32>,
+    /// 音声を保存せず、購読者へのレベル/チャンク配信だけを行う (マイクテスト用)
+    pub monitor_only: bool,
+    /// コールバック内で適用する入力ゲイン (dB、ソフトクリップ付き)
+    pub input_gain_db: f32,
+    /// DC除去 / ハイパスのカットオフ (None = 無効)
+    pub highpass_hz: Option<f32>,
+    /// 録音長の上限 (秒)。到達すると書き出しスレッドがテイクを確定し on_limit を呼ぶ
+    pub max_seconds: Option<f32>,
+    pub on_limit: Option<LimitCallback>,
+    /// 発話の間がこの長さ (ms) 続いたら、そこまでを on_segment へ渡す (None = 分割しない)
+    pub segment_pause_ms: Option<u32>,
+    /// これより短いセグメントは作らない (ms)
+    pub segment_min_ms: u32,
+    pub on_segment: Option<SegmentCallback>,
+}
+
+impl Default for CaptureOptions {
+    fn default() -> Self {
+        Self {
+            file_path: None,
+            input_device_id: None,
+            target_sample_rate: None,
+            target_channels: None,
+            vad_energy_threshold: VadConfig::default().energy_threshold,
+            trim_margin_ms: None,
+            monitor_only: false,
+            input_gain_db: 0.0,
+            highpass_hz: None,
+            max_seconds: None,
+            on_limit: None,
+            segment_pause_ms: None,
+            segment_min_ms: 0,
+            on_segment: None,
+        }
+    }
+}
+
+/// 購読者へ一定間隔でまとめて渡すレベルと音声 (出力フォーマット)
+pub struct ChunkBatch<'a> {
+    pub peak: f32,
+    pub rms: f32,
+    /// Interleaved i16 samples since the previous batch; empty unless the
+    /// subscription asked for audio.
+    pub samples: &'a [i16],
+    pub sample_rate: u32,
+    pub channels: u16,
+}
+
+pub type ChunkCallback = Box<dyn FnMut(&ChunkBatch) + Send>;
+
+/// 録音データの購読設定
+///
+/// The callback runs on the writer thread, so it must return quickly and
+/// must not wait on anything the recorder's owner may hold (e.g. the GIL).
+pub struct Subscription {
+    pub interval_ms: u32,
+    pub include_audio: bool,
+    pub callback: ChunkCallback,
+}
+
+type SharedSubscription = Arc<Mutex<Option<Subscription>>>;
+
+type WavFileWriter = WavWriter<std::io::BufWriter<std::fs::File>>;
+
+/// 書き出し先: WAVファイル、メモリ上のPCM、または破棄 (モニタのみ)
+enum Sink {
+    Wav(WavFileWriter),
+    Memory(Vec<i16>),
+    Discard,
+}
+
+impl Sink {
+    fn write(&mut self, block: &[f32]) -> Result<(), String> {
+        match self {
+            Sink::Wav(writer) => {
+                let mut samples = writer.get_i16_writer(block.len() as u32);
+                for &s in block {
+                    samples.write_sample(endpoint_scale(s));
+                }
+                samples.flush().map_err(|e| e.to_string())
+            }
+            Sink::Memory(pcm) => {
+                pcm.extend(block.iter().map(|&s| endpoint_scale(s)));
+                Ok(())
+            }
+            Sink::Discard => Ok(()),
+        }
+    }
+
+    /// Finalizes the sink. The in-memory variant hands its samples back,
+    /// cut to `keep` (frame range) when trimming applies.
+    fn finish(self, keep: Option<(usize, usize)>, channels: usize) -> Result<Option<Vec<i16>>, String> {
+        match self {
+            Sink::Wav(writer) => writer.finalize().map(|_| None).map_err(|e| e.to_string()),
+            Sink::Memory(mut pcm) => {
+                if let Some((start, end)) = keep {
+                    pcm.truncate(end * channels);
+                    pcm.drain(..(start * channels).min(pcm.len()));
+                }
+                Ok(Some(pcm))
+            }
+            Sink::Discard => Ok(None),
+        }
+    }
+}
+
+/// 書き出しスレッドの結果
+struct WriterOutput {
+    pcm: Option<Vec<i16>>,
+    speech: SpeechSpan,
+    // 分割録音: 配信済みセグメント数と、最後の区切り以降の残り
+    segments: usize,
+    final_segment: Option<Vec<i16>>,
+}
+
+/// 書き出しスレッド側で購読者向けにレベルと音声を溜め、間隔ごとに配信する
+struct ChunkMonitor {
+    subscription: SharedSubscription,
+    sample_rate: u32,
+    channels: u16,
+    peak: f32,
+    sum_sq: f64,
+    count: usize,
+    samples: Vec<i16>,
+}
+
+impl ChunkMonitor {
+    fn new(subscription: SharedSubscription, sample_rate: u32, channels: u16) -> Self {
+        Self {
+            subscription,
+            sample_rate,
+            channels,
+            peak: 0.0,
+            sum_sq: 0.0,
+            count: 0,
+            samples: Vec::new(),
+        }
+    }
+
+    fn process(&mut self, block: &[f32]) {
+        // Local handle so the guard does not borrow `self`.
+        let subscription = self.subscription.clone();
+        let mut guard = subscription.lock();
+        let Some(sub) = guard.as_mut() else {
+            // Nobody is listening; don't let a later subscriber get stale data.
+            self.reset();
+            return;
+        };
+        for &s in block {
+            self.peak = self.peak.max(s.abs());
+            self.sum_sq += (s * s) as f64;
+        }
+        self.count += block.len();
+        if sub.include_audio {
+            self.samples.extend(block.iter().map(|&s| endpoint_scale(s)));
+        }
+        let interval = sub.interval_ms.max(MIN_SUBSCRIBE_INTERVAL_MS) as usize;
+        let batch_len = self.sample_rate as usize * self.channels as usize * interval / 1000;
+        if self.count >= batch_len.max(1) {
+            self.deliver(sub);
+        }
+    }
+
+    /// Hands over whatever is left when the recording stops.
+    fn flush(&mut self) {
+        let subscription = self.subscription.clone();
+        let mut guard = subscription.lock();
+        if let Some(sub) = guard.as_mut() {
+            if self.count > 0 {
+                self.deliver(sub);
+            }
+        }
+    }
+
+    fn deliver(&mut self, sub: &mut Subscription) {
+        let batch = ChunkBatch {
+            peak: self.peak,
+            rms: (self.sum_sq / self.count.max(1) as f64).sqrt() as f32,
+            samples: &self.samples,
+            sample_rate: self.sample_rate,
+            channels: self.channels,
+        };
+        (sub.callback)(&batch);
+        self.reset();
+    }
+
+    fn reset(&mut self) {
+        self.peak = 0.0;
+        self.sum_sq = 0.0;
+        self.count = 0;
+        self.samples.clear();
+    }
+}
+
+/// メモリ録音の結果 (i16 インターリーブ)
+pub struct PcmCapture {
+    pub samples: Vec<i16>,
+    pub sample_rate: u32,
+    pub channels: u16,
+}
+
+/// 上限到達時に一度だけ呼ばれる通知 (書き出しスレッドから)
+pub type LimitCallback = Box<dyn FnOnce() + Send>;
+
+/// 1回の録音 (テイク) の書き出し状態。書き出しスレッドが所有する
+struct Take {
+    converter: FormatConverter,
+    vad: FrameVad,
+    monitor: ChunkMonitor,
+    segmenter: Option<Segmenter>,
+    sink: Sink,
+    sample_rate: u32,
+    channels: u16,
+    trim_margin: Option<usize>,
+    converted: Vec<f32>,
+    // 出力レートでのフレーム数の上限と、これまでに書いたフレーム数
+    max_frames: Option<usize>,
+    frames_written: usize,
+    on_limit: Option<LimitCallback>,
+}
+
+impl Take {
+    /// Returns true once the take has reached `max_frames`; the block is cut there.
+    fn process(&mut self, block: &[f32]) -> Result<bool, String> {
+        self.converted.clear();
+        self.converter.process(block, &mut self.converted);
+        let channels = self.channels as usize;
+        let mut reached = false;
+        if let Some(max) = self.max_frames {
+            let remaining = max.saturating_sub(self.frames_written);
+            if self.converted.len() / channels >= remaining {
+                self.converted.truncate(remaining * channels);
+                reached = true;
+            }
+        }
+        self.frames_written += self.converted.len() / channels;
+        self.analyze();
+        self.sink.write(&self.converted)?;
+        Ok(reached)
+    }
+
+    /// VAD, subscribers and segmentation all see the converted block.
+    fn analyze(&mut self) {
+        self.vad.process(&self.converted);
+        self.monitor.process(&self.converted);
+        if let Some(segmenter) = self.segmenter.as_mut() {
+            segmenter.push(&self.converted);
+            segmenter.update(&self.vad.span());
+        }
+    }
+
+    fn finish(mut self) -> Result<WriterOutput, String> {
+        if !self.max_frames.is_some_and(|max| self.frames_written >= max) {
+            self.converted.clear();
+            self.converter.flush(&mut self.converted);
+            self.analyze();
+            self.sink.write(&self.converted)?;
+        }
+        self.monitor.flush();
+
+        let speech = self.vad.span();
+        // Only trim when speech was found; silent takes are rejected by is_silence anyway.
+        let keep = self.trim_margin.and_then(|margin| speech.keep_range(margin));
+        let pcm = self.sink.finish(keep, self.channels as usize)?;
+        let (segments, final_segment) = match self.segmenter {
+            Some(segmenter) => segmenter.finish(&speech),
+            None => (0, None),
+        };
+        Ok(WriterOutput {
+            pcm,
+            speech,
+            segments,
+            final_segment,
+        })
+    }
+}
+
+/// ウォームモードで書き出しスレッドへ送る指示
+enum WriterCommand {
+    /// Start a take; the buffered pre-roll becomes its beginning.
+    Begin(Take),
+    /// Finish the current take and send its result back.
+    End(mpsc::Sender<Result<WriterOutput, String>>),
+}
+
+/// ウォームモードで開いたままにしている入力ストリーム
+struct WarmStream {
+    device_id: Option<String>,
+    input_rate: u32,
+    input_channels: u16,
+}
+
+/// 入力ストリームを保持するスレッドへのハンドル
+///
+/// cpal::Stream is !Send, so it is built, played and dropped on its own
+/// thread. Holding only this handle keeps AudioRecorder Send, which lets the
+/// Python binding release the GIL around start/stop.
+struct StreamHandle {
+    close: mpsc::Sender<()>,
+    thread: thread::JoinHandle<()>,
+    // Pauses the device watcher's polling while the stream is open.
+    _guard: devices::StreamGuard,
+}
+
+impl StreamHandle {
+    /// Drops the stream and waits for it, so no callback runs after this returns.
+    fn close(self) {
+        drop(self.close);
+        let _ = self.thread.join();
+    }
+}
+
 /// メインのレコーダー構造体
 pub struct AudioRecorder {
+    // Shared with the audio callback, which only updates stats while set.
+    // The writer clears it when a take reaches its length limit.
     is_recording: Arc<AtomicBool>,
-    state: Arc<Mutex<RecorderState>>,
-    // 録音スレッドを停止させるための仕組みが必要だが、
-    // cpalのstreamはDrop時に停止するため、Streamを保持する形にする
-    stream: Option<cpal::Stream>,
+    // A take was started and stop() has not collected it yet (stays set after
+    // an auto-stop until stop() is called).
+    take_open: bool,
+    stats: Arc<AudioStats>,
+    // cpalのstreamはDrop時に停止する。Stream自体はSendではないため専用スレッドが保持する
+    stream: Option<StreamHandle>,
+    // 書き出しスレッド: リングバッファからWAVへまとめて書き出す
+    writer_thread: Option<thread::JoinHandle<Result<Option<WriterOutput>, String>>>,
+    writer_stop: Arc<AtomicBool>,
+    writer_commands: Option<mpsc::Sender<WriterCommand>>,
+    // Some while the stream is kept open between recordings
+    warm: Option<WarmStream>,
+    // 出力 (WAV / メモリ) のフォーマット
     sample_rate: u32,
+    channels: u16,
+    // デバイスから実際に受け取っているサンプルレート
+    input_sample_rate: u32,
+    // メモリ録音モードで stop() 後に取り出されるのを待つPCM
+    capture: Option<PcmCapture>,
+    // 直近の録音のフレーム単位VAD結果 (stop() 後に確定)
+    speech: Option<SpeechSpan>,
+    // 分割録音の最後のセグメントと、それ以前に配信したセグメント数 (stop() 後に確定)
+    final_segment: Option<PcmCapture>,
+    segment_count: usize,
+    // レベル/チャンクの購読者 (録音をまたいで保持し、録音中でも差し替え可能)
+    subscription: SharedSubscription,
+    // コールバック内DSPの設定 (start() ごとに更新、ウォーム中も即反映)
+    dsp: Arc<DspParams>,
 }
 
 impl AudioRecorder {
     pub fn new() -> Self {
         Self {
             is_recording: Arc::new(AtomicBool::new(false)),
-            state: Arc::new(Mutex::new(RecorderState {
-                writer: None,
-                stats: AudioStats::default(),
-            })),
+            take_open: false,
+            stats: Arc::new(AudioStats::default()),
             stream: None,
+            writer_thread: None,
+            writer_stop: Arc::new(AtomicBool::new(false)),
+            writer_commands: None,
+            warm: None,
             sample_rate: 0,
+            channels: 0,
+            input_sample_rate: 0,
+            capture: None,
+            speech: None,
+            final_segment: None,
+            segment_count: 0,
+            subscription: Arc::new(Mutex::new(None)),
+            dsp: Arc::new(DspParams::default()),
         }
     }
 
-    pub fn start(&mut self, file_path: String, input_device_index: Option<usize>) -> Result<u32, String> {
-        if self.is_recording.load(Ordering::SeqCst) {
+    /// 購読者を設定する (None で解除)。録音中に呼んでも次のブロックから反映される
+    pub fn subscribe(&self, subscription: Option<Subscription>) {
+        *self.subscription.lock() = subscription;
+    }
+
+    /// 録音を開始し、出力のサンプルレートを返す
+    ///
+    /// When a warm stream is open on the same device this only marks the start
+    /// position, and the take begins with the buffered pre-roll.
+    pub fn start(&mut self, options: CaptureOptions) -> Result<u32, String> {
+        if self.take_open {
             return Ok(0);
         }
 
-        let host = cpal::default_host();
-        
-        // デバイス選択 logic
-        let device = if let Some(index) = input_device_index {
-            let mut devices = host.input_devices().map_err(|e| e.to_string())?;
-            devices.nth(index).ok_or_else(|| "Device not found by index".to_string())?
-        } else {
-            host.default_input_device()
-                .ok_or_else(|| "No input device available".to_string())?
-        };
+        self.dsp.configure(options.input_gain_db, options.highpass_hz);
 
-        // サポートされている設定から最適なものを探す (48k > 44.1k > 16k)
-        let mut supported_configs_range = device.supported_input_configs()
-            .map_err(|e| e.to_string())?;
-            
-        // 優先度順にトライ
-        let preferred_rates = [48000, 44100, 16000];
-        let mut selected_config = None;
-        let mut selected_sample_rate = cpal::SampleRate(44100);
-
-        // Collect configs to avoid consuming iterator if we need multiple passes?
-        // supported_input_configs returns iterator.
-        // Let's just create a valid config manually if supported.
-        
-        let supported_configs: Vec<_> = supported_configs_range.collect();
-
-        for &rate in &preferred_rates {
-            let sr = cpal::SampleRate(rate);
-            for r in &supported_configs {
-                if r.min_sample_rate() <= sr && r.max_sample_rate() >= sr {
-                    selected_config = Some(r.with_sample_rate(sr));
-                    selected_sample_rate = sr;
-                    break;
-                }
+        if let Some(warm) = &self.warm {
+            if warm.device_id == options.input_device_id {
+                let (rate, channels) = (warm.input_rate, warm.input_channels);
+                let take = self.build_take(options, rate, channels)?;
+                return self.begin_warm_take(take);
             }
-            if selected_config.is_some() { break; }
+            // 別デバイスが指定された: ウォームストリームを閉じて通常の録音へ
+            self.cool_down();
         }
 
-        // Default fallback if no preferred rate found
-        let config = if let Some(c) = selected_config {
-             c
-        } else {
-             // Use default
-             device.default_input_config().map_err(|e| e.to_string())?.into()
-        };
-        
-        // 実際のサンプルレートを取得
-        let sample_rate = config.sample_rate().0;
-        let stream_config: cpal::StreamConfig = config.into();
-
-        // WAV writer の準備
-        let spec = hound::WavSpec {
-            channels: stream_config.channels,
-            sample_rate: sample_rate,
-            bits_per_sample: 16,
-            sample_format: hound::SampleFormat::Int,
-        };
-        
-        let writer = WavWriter::create(&file_path, spec)
-            .map_err(|e| e.to_string())?;
+        let (device, stream_config) = select_input(options.input_device_id.as_deref(), options.target_sample_rate)?;
+        let sample_rate = stream_config.sample_rate.0;
+        let take = self.build_take(options, sample_rate, stream_config.channels)?;
+        let (out_rate, out_channels) = (take.sample_rate, take.channels);
 
         // 状態のリセット
-        {
-            let mut state = self.state.lock();
-            state.writer = Some(writer);
-            state.stats = AudioStats::default();
-        }
-        
-        let state_clone = self.state.clone();
-        let err_fn = |err| eprintln!("an error occurred on stream: {}", err);
-        
-        let stream = device.build_input_stream(
-            &stream_config,
-            move |data: &[f32], _: &_| {
-                process_audio_input(data, &state_clone);
-            },
-            err_fn,
-            None 
-        ).map_err(|e| e.to_string())?;
-
-        stream.play().map_err(|e| e.to_string())?;
-        
-        self.stream = Some(stream);
-        self.sample_rate = sample_rate;
+        self.reset_results();
+
+        // Set before the stream starts so the first callback is counted.
         self.is_recording.store(true, Ordering::SeqCst);
-        
-        Ok(sample_rate)
+        if let Err(e) = self.open_capture(device, stream_config, Some(take), 0) {
+            self.is_recording.store(false, Ordering::SeqCst);
+            return Err(e);
+        }
+        self.take_open = true;
+
+        self.sample_rate = out_rate;
+        self.channels = out_channels;
+        self.input_sample_rate = sample_rate;
+
+        Ok(out_rate)
     }
 
     pub fn stop(&mut self) {
-        if !self.is_recording.load(Ordering::SeqCst) {
+        if !self.take_open {
             return;
         }
-        
-        // StreamをDropすることで停止
-        self.stream = None;
-        self.is_recording.store(false, Ordering::SeqCst);
-        
-        // Writerをフラッシュして閉じる
-        let mut state = self.state.lock();
-        if let Some(w) = state.writer.take() {
-            let _ = w.finalize();
+        self.take_open = false;
+
+        let result = if self.warm.is_some() {
+            // ストリームは開いたまま、テイクだけを閉じる
+            self.is_recording.store(false, Ordering::SeqCst);
+            self.end_warm_take().map(Some)
+        } else {
+            // StreamをDropすることで停止 (以降リングバッファへの書き込みは発生しない)
+            self.close_stream();
+            self.is_recording.store(false, Ordering::SeqCst);
+            // 書き出しスレッドに残りを吐き出させ、WAVを閉じる
+            self.close_writer()
+        };
+
+        match result {
+            Ok(Some(output)) => {
+                self.speech = Some(output.speech);
+                self.segment_count = output.segments;
+                self.final_segment = output.final_segment.map(|samples| PcmCapture {
+                    samples,
+                    sample_rate: self.sample_rate,
+                    channels: self.channels,
+                });
+                if let Some(samples) = output.pcm {
+                    self.capture = Some(PcmCapture {
+                        samples,
+                        sample_rate: self.sample_rate,
+                        channels: self.channels,
+                    });
+                }
+            }
+            Ok(None) => {}
+            Err(e) => eprintln!("failed to write recording: {}", e),
+        }
+
+        let overruns = self.stats.overruns.load(Ordering::Relaxed);
+        if overruns > 0 {
+            eprintln!(
+                "recording ring buffer overrun {} times ({} samples dropped)",
+                overruns,
+                self.stats.dropped_samples.load(Ordering::Relaxed)
+            );
         }
     }
-    
+
+    /// 入力ストリームを開いたままにし、直近 `preroll_ms` を常に保持する
+    ///
+    /// Later `start()` calls on the same device skip device setup entirely and
+    /// include the buffered audio from just before the call.
+    pub fn warm_up(&mut self, device_id: Option<String>, target_sample_rate: Option<u32>, preroll_ms: u32) -> Result<(), String> {
+        if self.take_open {
+            return Err("Cannot open a warm stream while recording".to_string());
+        }
+        self.cool_down();
+
+        let (device, stream_config) = select_input(device_id.as_deref(), target_sample_rate)?;
+        let input_rate = stream_config.sample_rate.0;
+        let input_channels = stream_config.channels;
+        let preroll_len = input_rate as usize * preroll_ms as usize / 1000 * input_channels as usize;
+        self.open_capture(device, stream_config, None, preroll_len)?;
+
+        self.input_sample_rate = input_rate;
+        self.warm = Some(WarmStream {
+            device_id,
+            input_rate,
+            input_channels,
+        });
+        Ok(())
+    }
+
+    /// ウォームストリームを閉じる (録音中なら先に停止する)
+    pub fn cool_down(&mut self) {
+        if self.warm.is_none() {
+            return;
+        }
+        self.stop();
+        self.close_stream();
+        if let Err(e) = self.close_writer() {
+            eprintln!("failed to close warm stream: {}", e);
+        }
+        self.warm = None;
+    }
+
+    pub fn is_warm(&self) -> bool {
+        self.warm.is_some()
+    }
+
+    /// (peak, avg_rms, duration_seconds)
     pub fn get_stats(&self) -> (f32, f32, f32) {
-        let state = self.state.lock();
-        let s = &state.stats;
-        
-        let mut avg_rms = 0.0;
-        if s.rms_count > 0 {
-            avg_rms = (s.rms_sum / s.rms_count as f32).sqrt();
+        let s = &self.stats;
+        (s.peak(), s.avg_rms(), self.duration())
+    }
+
+    /// 録音済みの長さ (秒)。チャンネル数に依存しない。
+    fn duration(&self) -> f32 {
+        if self.input_sample_rate == 0 {
+            return 0.0;
         }
-        
-        // duration (samples / sample_rate) は外からsample_rateを知る必要があるので
-        // ここでは samples などを返すか、呼び出し側で管理するか
-        // とりあえず samples_written を返す
-        (s.peak, avg_rms, s.samples_written as f32) // samples as float
+        self.stats.frames_captured.load(Ordering::Relaxed) as f32 / self.input_sample_rate as f32
+    }
+
+    /// メモリ録音の結果を取り出す (一度だけ)
+    pub fn take_capture(&mut self) -> Option<PcmCapture> {
+        self.capture.take()
+    }
+
+    /// 分割録音で最後の区切り以降に残った音声 (一度だけ)。発話がなければ None
+    pub fn take_final_segment(&mut self) -> Option<PcmCapture> {
+        self.final_segment.take()
+    }
+
+    /// 直近の録音で on_segment へ渡したセグメント数 (最後の残りは含まない)
+    pub fn segment_count(&self) -> usize {
+        self.segment_count
+    }
+
+    /// 直近の録音の発話区間: (開始秒, 終了秒, 発話秒数)。発話なしなら None
+    pub fn speech_span(&self) -> Option<(f32, f32, f32)> {
+        let span = self.speech?;
+        let first = span.first?;
+        let frame_secs = FRAME_MS as f32 / 1000.0;
+        Some((
+            first as f32 * frame_secs,
+            span.end as f32 * frame_secs,
+            span.speech_frames as f32 * frame_secs,
+        ))
+    }
+
+    /// コールバックがリングバッファに書き込めずに捨てたブロック数
+    pub fn overrun_count(&self) -> usize {
+        self.stats.overruns.load(Ordering::Relaxed)
     }
 
     pub fn is_silence(&self, config: &VadConfig) -> bool {
-        let state = self.state.lock();
-        let s = &state.stats;
-        
-        let mut avg_rms = 0.0;
-        if s.rms_count > 0 {
-            avg_rms = (s.rms_sum / s.rms_count as f32).sqrt();
-        }
-        
-        let duration = if self.sample_rate > 0 {
-            s.samples_written as f32 / self.sample_rate as f32
-        } else {
-            0.0
-        };
+        let s = &self.stats;
+        let avg_rms = s.avg_rms();
+        let duration = self.duration();
 
         let too_short = duration < config.min_duration;
-        let is_quiet = s.peak < config.peak_threshold && avg_rms < config.energy_threshold;
-        
-        too_short || is_quiet
+        let is_quiet = s.peak() < config.peak_threshold && avg_rms < config.energy_threshold;
+        // フレーム単位VADで発話が一度も検出されなかった (stop() 後のみ判定可能)
+        let no_speech = self.speech.map(|span| span.first.is_none()).unwrap_or(false);
+
+        too_short || is_quiet || no_speech
+    }
+
+    fn reset_results(&mut self) {
+        self.stats.reset();
+        self.capture = None;
+        self.speech = None;
+        self.final_segment = None;
+        self.segment_count = 0;
+    }
+
+    /// 入力フォーマットから出力フォーマットへのテイクを用意する
+    fn build_take(&self, options: CaptureOptions, in_rate: u32, in_channels: u16) -> Result<Take, String> {
+        // 出力フォーマット (ダウンミックス / リサンプリング)
+        let out_rate = options.target_sample_rate.filter(|&r| r > 0).unwrap_or(in_rate);
+        let out_channels = options.target_channels.filter(|&c| c > 0).unwrap_or(in_channels);
+        let converter = FormatConverter::new(in_rate, in_channels, out_rate, out_channels)?;
+        let vad = FrameVad::new(out_rate, out_channels, options.vad_energy_threshold);
+        let monitor = ChunkMonitor::new(self.subscription.clone(), out_rate, out_channels);
+        let trim_margin = options.trim_margin_ms.map(|ms| ((ms + FRAME_MS - 1) / FRAME_MS) as usize);
+        let max_frames = options
+            .max_seconds
+            .filter(|&secs| secs > 0.0)
+            .map(|secs| (secs as f64 * out_rate as f64) as usize);
+        let segmenter = match (options.segment_pause_ms, options.on_segment) {
+            (Some(pause_ms), Some(callback)) if !options.monitor_only => Some(Segmenter::new(
+                out_rate,
+                out_channels,
+                pause_ms,
+                options.segment_min_ms,
+                callback,
+            )),
+            _ => None,
+        };
+
+        // 書き出し先の準備
+        let sink = match &options.file_path {
+            _ if options.monitor_only => Sink::Discard,
+            Some(path) => {
+                let spec = hound::WavSpec {
+                    channels: out_channels,
+                    sample_rate: out_rate,
+                    bits_per_sample: 16,
+                    sample_format: hound::SampleFormat::Int,
+                };
+                Sink::Wav(WavWriter::create(path, spec).map_err(|e| e.to_string())?)
+            }
+            None => Sink::Memory(Vec::with_capacity(
+                out_rate as usize * out_channels as usize * MEMORY_RESERVE_SECONDS,
+            )),
+        };
+
+        Ok(Take {
+            converter,
+            vad,
+            monitor,
+            segmenter,
+            sink,
+            sample_rate: out_rate,
+            channels: out_channels,
+            trim_margin,
+            converted: Vec::with_capacity(WRITER_CHUNK),
+            max_frames,
+            frames_written: 0,
+            on_limit: options.on_limit,
+        })
+    }
+
+    /// リングバッファ・書き出しスレッド・入力ストリームを用意して再生を始める
+    fn open_capture(
+        &mut self,
+        device: cpal::Device,
+        stream_config: cpal::StreamConfig,
+        take: Option<Take>,
+        preroll_len: usize,
+    ) -> Result<(), String> {
+        let channels = stream_config.channels as usize;
+        let sample_rate = stream_config.sample_rate.0 as usize;
+
+        // リングバッファはここで一度だけ確保し、コールバック内では確保しない
+        let (mut producer, consumer) = ring::with_capacity(sample_rate * channels * RING_SECONDS);
+        let (commands_tx, commands_rx) = mpsc::channel();
+
+        self.writer_stop.store(false, Ordering::SeqCst);
+        let writer_stop = self.writer_stop.clone();
+        let writer_recording = self.is_recording.clone();
+        let writer_stats = self.stats.clone();
+        let writer_thread = thread::Builder::new()
+            .name("rust_core-writer".into())
+            .spawn(move || run_writer(consumer, channels, take, preroll_len, commands_rx, writer_stop, writer_recording, writer_stats))
+            .map_err(|e| e.to_string())?;
+
+        let stats_clone = self.stats.clone();
+        let recording = self.is_recording.clone();
+        let dsp_params = self.dsp.clone();
+        let mut dsp = DspChain::new(channels, sample_rate as u32, sample_rate * channels * DSP_SCRATCH_MS / 1000);
+
+        // ストリームは専用スレッドで生成し、close されるまでそこで保持する
+        let guard = devices::StreamGuard::new();
+        let (ready_tx, ready_rx) = mpsc::sync_channel::<Result<(), String>>(1);
+        let (close_tx, close_rx) = mpsc::channel::<()>();
+        let stream_thread = thread::Builder::new()
+            .name("rust_core-stream".into())
+            .spawn(move || {
+                let err_fn = |err: cpal::StreamError| {
+                    if matches!(err, cpal::StreamError::DeviceNotAvailable) {
+                        devices::notify_device_lost();
+                    }
+                    eprintln!("an error occurred on stream: {}", err);
+                };
+                let stream = device.build_input_stream(
+                    &stream_config,
+                    move |data: &[f32], _: &_| {
+                        dsp.process(&dsp_params, data, |block| {
+                            process_audio_input(block, channels, &mut producer, &stats_clone, &recording);
+                        });
+                    },
+                    err_fn,
+                    None
+                ).map_err(|e| e.to_string())
+                    .and_then(|stream| stream.play().map(|_| stream).map_err(|e| e.to_string()));
+
+                match stream {
+                    Ok(stream) => {
+                        let _ = ready_tx.send(Ok(()));
+                        // Sender が drop されるまで待ち、ここで Stream を drop する
+                        let _ = close_rx.recv();
+                        drop(stream);
+                    }
+                    Err(e) => {
+                        let _ = ready_tx.send(Err(e));
+                    }
+                }
+            })
+            .map_err(|e| e.to_string());
+
+        let started = stream_thread.and_then(|handle| {
+            match ready_rx.recv() {
+                Ok(Ok(())) => Ok(handle),
+                Ok(Err(e)) => {
+                    let _ = handle.join();
+                    Err(e)
+                }
+                Err(_) => {
+                    let _ = handle.join();
+                    Err("audio stream thread exited".to_string())
+                }
+            }
+        });
+
+        let stream_thread = match started {
+            Ok(handle) => handle,
+            Err(e) => {
+                // 書き出しスレッドを後始末してからエラーを返す
+                self.writer_stop.store(true, Ordering::SeqCst);
+                let _ = writer_thread.join();
+                return Err(e);
+            }
+        };
+
+        self.stream = Some(StreamHandle {
+            close: close_tx,
+            thread: stream_thread,
+            _guard: guard,
+        });
+        self.writer_thread = Some(writer_thread);
+        self.writer_commands = Some(commands_tx);
+        Ok(())
+    }
+
+    fn begin_warm_take(&mut self, take: Take) -> Result<u32, String> {
+        let (out_rate, out_channels) = (take.sample_rate, take.channels);
+        let commands = self
+            .writer_commands
+            .as_ref()
+            .ok_or_else(|| "Warm stream is not running".to_string())?;
+
+        self.reset_results();
+        self.is_recording.store(true, Ordering::SeqCst);
+        if commands.send(WriterCommand::Begin(take)).is_err() {
+            self.is_recording.store(false, Ordering::SeqCst);
+            return Err("Recording writer thread has exited".to_string());
+        }
+        self.take_open = true;
+
+        self.sample_rate = out_rate;
+        self.channels = out_channels;
+        Ok(out_rate)
+    }
+
+    fn end_warm_take(&mut self) -> Result<WriterOutput, String> {
+        let (reply_tx, reply_rx) = mpsc::channel();
+        self.writer_commands
+            .as_ref()
+            .ok_or_else(|| "Warm stream is not running".to_string())?
+            .send(WriterCommand::End(reply_tx))
+            .map_err(|_| "Recording writer thread has exited".to_string())?;
+        reply_rx
+            .recv()
+            .map_err(|_| "Recording writer thread has exited".to_string())?
+    }
+
+    fn close_stream(&mut self) {
+        if let Some(stream) = self.stream.take() {
+            stream.close();
+        }
+    }
+
+    /// 書き出しスレッドを止めて合流する (ストリームは先に閉じておくこと)
+    fn close_writer(&mut self) -> Result<Option<WriterOutput>, String> {
+        self.writer_stop.store(true, Ordering::SeqCst);
+        self.writer_commands = None;
+        match self.writer_thread.take() {
+            Some(handle) => handle
+                .join()
+                .map_err(|_| "recording writer thread panicked".to_string())?,
+            None => Ok(None),
+        }
+    }
+}
+
+/// デバイスと、サポートされている設定から最適なものを選ぶ
+///
+/// Both come from the device registry cache, so no host enumeration or
+/// config query happens here.
+fn select_input(device_id: Option<&str>, target_sample_rate: Option<u32>) -> Result<(cpal::Device, cpal::StreamConfig), String> {
+    let input = devices::resolve(device_id)?;
+
+    // サポートされている設定から最適なものを探す (目標レート > 48k > 44.1k > 16k)
+    // デバイスが目標レートで開ければリサンプリング自体が不要になる
+    // 優先度順にトライ
+    let mut preferred_rates = vec![48000, 44100, 16000];
+    if let Some(rate) = target_sample_rate.filter(|&r| r > 0) {
+        preferred_rates.retain(|&r| r != rate);
+        preferred_rates.insert(0, rate);
     }
+    let mut selected_config = None;
+
+    for &rate in &preferred_rates {
+        let sr = cpal::SampleRate(rate);
+        for r in &input.configs {
+            if r.min_sample_rate() <= sr && r.max_sample_rate() >= sr {
+                selected_config = Some(r.clone().with_sample_rate(sr));
+                break;
+            }
+        }
+        if selected_config.is_some() { break; }
+    }
+
+    // Default fallback if no preferred rate found
+    let config = match selected_config.or(input.default_config) {
+        Some(c) => c,
+        None => input.device.default_input_config().map_err(|e| e.to_string())?,
+    };
+
+    Ok((input.device, config.into()))
+}
+
+/// 書き出しスレッド本体: リングバッファを空になるまでまとめて読み出し、テイクへ渡す
+fn run_writer(
+    mut consumer: Consumer,
+    channels: usize,
+    take: Option<Take>,
+    preroll_len: usize,
+    commands: mpsc::Receiver<WriterCommand>,
+    stop: Arc<AtomicBool>,
+    recording: Arc<AtomicBool>,
+    stats: Arc<AudioStats>,
+) -> Result<Option<WriterOutput>, String> {
+    let mut block = vec![0.0f32; WRITER_CHUNK - WRITER_CHUNK % channels.max(1)];
+    let mut state = WriterState::new(take, preroll_len, channels, recording, stats);
+    loop {
+        let mut disconnected = false;
+        loop {
+            match commands.try_recv() {
+                Ok(WriterCommand::Begin(next)) => state.begin(next),
+                Ok(WriterCommand::End(reply)) => {
+                    // Everything already captured belongs to the take.
+                    loop {
+                        let n = consumer.pop_slice(&mut block, channels);
+                        state.feed(&block[..n]);
+                        if n < block.len() {
+                            break;
+                        }
+                    }
+                    let _ = reply.send(state.end().unwrap_or_else(|| Err("No recording in progress".to_string())));
+                }
+                Err(mpsc::TryRecvError::Empty) => break,
+                Err(mpsc::TryRecvError::Disconnected) => {
+                    // The recorder is gone (or closing); treat it like stop.
+                    disconnected = true;
+                    break;
+                }
+            }
+        }
+
+        // Check the flag before draining: once it is set the stream is gone,
+        // so an empty ring afterwards really means everything was written.
+        let stopping = disconnected || stop.load(Ordering::Acquire);
+        let n = consumer.pop_slice(&mut block, channels);
+        if n > 0 {
+            state.feed(&block[..n]);
+            continue;
+        }
+        if stopping {
+            break;
+        }
+        thread::sleep(WRITER_IDLE);
+    }
+
+    state.end().transpose()
+}
+
+/// 書き出しスレッドが持つテイクの状態
+///
+/// With no take in progress (warm mode between recordings) the most recent
+/// `preroll_len` samples are kept so the next take can start with them.
+struct WriterState {
+    take: Option<Take>,
+    // A write error ends the take early; it is reported when the take is ended.
+    failed: Option<String>,
+    // A take that hit its length limit, finalized and waiting for stop().
+    completed: Option<Result<WriterOutput, String>>,
+    preroll: VecDeque<f32>,
+    preroll_len: usize,
+    channels: usize,
+    // The recorder's is_recording flag, cleared when a take reaches its limit
+    recording: Arc<AtomicBool>,
+    // Pre-roll fed into a take is counted here; the callback only counts live blocks
+    stats: Arc<AudioStats>,
 }
 
-fn process_audio_input(data: &[f32], state: &Arc<Mutex<RecorderState>>) {
+impl WriterState {
+    fn new(take: Option<Take>, preroll_len: usize, channels: usize, recording: Arc<AtomicBool>, stats: Arc<AudioStats>) -> Self {
+        Self {
+            take,
+            failed: None,
+            completed: None,
+            preroll: VecDeque::with_capacity(preroll_len),
+            preroll_len,
+            channels: channels.max(1),
+            recording,
+            stats,
+        }
+    }
+
+    fn begin(&mut self, take: Take) {
+        self.take = Some(take);
+        self.failed = None;
+        self.completed = None;
+        let preroll: Vec<f32> = self.preroll.drain(..).collect();
+        // Part of the take, so duration and min_duration match the VAD's frame offsets
+        self.stats
+            .frames_captured
+            .fetch_add(preroll.len() / self.channels, Ordering::Relaxed);
+        self.feed(&preroll);
+    }
+
+    /// ブロックを進行中のテイクへ、なければプリロールへ渡す
+    fn feed(&mut self, block: &[f32]) {
+        if block.is_empty() {
+            return;
+        }
+        if let Some(take) = self.take.as_mut() {
+            match take.process(block) {
+                Ok(false) => {}
+                Ok(true) => self.complete(),
+                Err(e) => {
+                    self.failed = Some(e);
+                    self.take = None;
+                }
+            }
+            return;
+        }
+        if self.preroll_len == 0 {
+            return;
+        }
+        self.preroll.extend(block.iter().copied());
+        if self.preroll.len() > self.preroll_len {
+            // Drop whole frames from the front so channels stay aligned.
+            let excess = self.preroll.len() - self.preroll_len;
+            let excess = excess + (self.channels - excess % self.channels) % self.channels;
+            self.preroll.drain(..excess.min(self.preroll.len()));
+        }
+    }
+
+    /// Finalizes a take that reached its limit, then tells the owner once.
+    ///
+    /// Recording ends here rather than at stop(): the flag is cleared first so
+    /// the callback stops counting frames and levels for the finished take.
+    fn complete(&mut self) {
+        let Some(mut take) = self.take.take() else { return };
+        self.recording.store(false, Ordering::SeqCst);
+        let on_limit = take.on_limit.take();
+        self.completed = Some(take.finish());
+        if let Some(callback) = on_limit {
+            callback();
+        }
+    }
+
+    /// Result of the current (or already completed) take; None if there was none.
+    fn end(&mut self) -> Option<Result<WriterOutput, String>> {
+        if let Some(e) = self.failed.take() {
+            self.take = None;
+            return Some(Err(e));
+        }
+        if let Some(take) = self.take.take() {
+            return Some(take.finish());
+        }
+        self.completed.take()
+    }
+}
+
+/// リアルタイムのオーディオスレッドで呼ばれる。確保もロックも行わない。
+fn process_audio_input(data: &[f32], channels: usize, producer: &mut Producer, stats: &AudioStats, recording: &AtomicBool) {
     if data.is_empty() { return; }
+
+    let pushed = producer.push_slice(data);
+    // A warm stream runs between recordings too; stats only cover the take.
+    if !recording.load(Ordering::Relaxed) {
+        return;
+    }
+    if !pushed {
+        // Writer fell behind; drop this block rather than block the audio thread.
+        stats.overruns.fetch_add(1, Ordering::Relaxed);
+        stats.dropped_samples.fetch_add(data.len(), Ordering::Relaxed);
+        return;
+    }
     
     // RMSとPeakの計算
     let mut max_val = 0.0f32;
@@ -240,30 +1104,17 @@ fn process_audio_input(data: &[f32], state: &Arc<Mutex<RecorderState>>) {
         sum_sq += sample * sample;
     }
     
-    // PCM (i16) への変換準備
-    let pcm_samples: Vec<i16> = data.iter()
-        .map(|&s| endpoint_scale(s))
-        .collect();
-
-    let mut state_guard = state.lock();
-    
-    // 統計更新
-    if max_val > state_guard.stats.peak {
-        state_guard.stats.peak = max_val;
-    }
-    state_guard.stats.rms_sum += sum_sq;
-    state_guard.stats.rms_count += data.len();
-    state_guard.stats.samples_written += data.len();
-    
-    // 書き出し
-    if let Some(writer) = &mut state_guard.writer {
-        for s in pcm_samples {
-            let _ = writer.write_sample(s);
-        }
-    }
+    // 統計更新 (非負のf32はビット列の大小と値の大小が一致する)
+    stats.peak_bits.fetch_max(max_val.to_bits(), Ordering::Relaxed);
+    // A single read-modify-write, so a concurrent reset() is never overwritten
+    let _ = stats.rms_sum_bits.fetch_update(Ordering::Relaxed, Ordering::Relaxed, |bits| {
+        Some((f64::from_bits(bits) + sum_sq as f64).to_bits())
+    });
+    stats.rms_count.fetch_add(data.len(), Ordering::Relaxed);
+    stats.frames_captured.fetch_add(data.len() / channels.max(1), Ordering::Relaxed);
 }
 
-fn endpoint_scale(sample: f32) -> i16 {
+pub(crate) fn endpoint_scale(sample: f32) -> i16 {
     let s = sample.clamp(-1.0, 1.0);
     if s >= 0.0 {
         (s * 32767.0) as i16
@@ -271,3 +1122,37 @@ fn endpoint_scale(sample: f32) -> i16 {
         (s * 32768.0) as i16
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn a_full_ring_counts_an_overrun() {
+        let (mut producer, _consumer) = ring::with_capacity(4);
+        let stats = AudioStats::default();
+        let recording = AtomicBool::new(true);
+
+        process_audio_input(&[0.5; 4], 2, &mut producer, &stats, &recording);
+        assert_eq!(stats.overruns.load(Ordering::Relaxed), 0);
+        assert_eq!(stats.frames_captured.load(Ordering::Relaxed), 2);
+
+        process_audio_input(&[0.5; 4], 2, &mut producer, &stats, &recording);
+        assert_eq!(stats.overruns.load(Ordering::Relaxed), 1);
+        assert_eq!(stats.dropped_samples.load(Ordering::Relaxed), 4);
+        // The dropped block is not counted as captured
+        assert_eq!(stats.frames_captured.load(Ordering::Relaxed), 2);
+    }
+
+    #[test]
+    fn a_warm_stream_does_not_count_outside_a_take() {
+        let (mut producer, _consumer) = ring::with_capacity(4);
+        let stats = AudioStats::default();
+        let recording = AtomicBool::new(false);
+
+        process_audio_input(&[0.5; 4], 2, &mut producer, &stats, &recording);
+        process_audio_input(&[0.5; 4], 2, &mut producer, &stats, &recording);
+        assert_eq!(stats.overruns.load(Ordering::Relaxed), 0);
+        assert_eq!(stats.frames_captured.load(Ordering::Relaxed), 0);
+    }
+}
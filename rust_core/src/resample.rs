@@ -0,0 +1,288 @@
+//! 録音フォーマット変換 (ダウンミックス + サンプルレート変換)
+//!
+//! Runs on the writer thread, never in the audio callback. Resampling uses a
+//! rational-ratio polyphase FIR whose prototype is a Kaiser-windowed sinc.
+
+/// Taps per polyphase branch for a 1:1 ratio; scaled up with the decimation factor.
+const BASE_TAPS: usize = 64;
+/// Kaiser window beta (~80 dB stopband attenuation).
+const KAISER_BETA: f64 = 8.0;
+/// Cutoff as a fraction of the lower Nyquist frequency.
+const ROLLOFF: f64 = 0.92;
+
+fn gcd(a: usize, b: usize) -> usize {
+    if b == 0 { a } else { gcd(b, a % b) }
+}
+
+/// Zeroth-order modified Bessel function of the first kind (series expansion).
+fn bessel_i0(x: f64) -> f64 {
+    let mut sum = 1.0;
+    let mut term = 1.0;
+    let half = x / 2.0;
+    for k in 1..50 {
+        term *= (half / k as f64) * (half / k as f64);
+        sum += term;
+        if term < sum * 1e-12 {
+            break;
+        }
+    }
+    sum
+}
+
+/// 単一チャンネルのポリフェーズ・リサンプラ (ストリーミング)
+pub struct Resampler {
+    up: usize,
+    down: usize,
+    taps: usize,
+    // Branch p occupies coeffs[p * taps..(p + 1) * taps]; tap k applies to x[i - k].
+    coeffs: Vec<f32>,
+    // Input history: the first `taps - 1` samples are context for the next output.
+    history: Vec<f32>,
+    // Position of the next output in the upsampled domain, relative to history[0].
+    pos: usize,
+}
+
+impl Resampler {
+    pub fn new(in_rate: u32, out_rate: u32) -> Self {
+        let g = gcd(in_rate as usize, out_rate as usize).max(1);
+        let up = out_rate as usize / g;
+        let down = in_rate as usize / g;
+        let taps = (BASE_TAPS * up.max(down) + up - 1) / up;
+
+        // Prototype low-pass at the upsampled rate, cut at the lower of the two Nyquists.
+        let len = taps * up;
+        let fc = ROLLOFF * 0.5 / up.max(down) as f64;
+        let center = (len - 1) as f64 / 2.0;
+        let i0_beta = bessel_i0(KAISER_BETA);
+        let proto: Vec<f64> = (0..len)
+            .map(|n| {
+                let x = n as f64 - center;
+                let sinc = if x == 0.0 {
+                    2.0 * fc
+                } else {
+                    (2.0 * std::f64::consts::PI * fc * x).sin() / (std::f64::consts::PI * x)
+                };
+                let r = 2.0 * n as f64 / (len - 1).max(1) as f64 - 1.0;
+                let window = bessel_i0(KAISER_BETA * (1.0 - r * r).max(0.0).sqrt()) / i0_beta;
+                sinc * window
+            })
+            .collect();
+
+        // Split into branches and normalise each to unity DC gain.
+        let mut coeffs = vec![0.0f32; len];
+        for p in 0..up {
+            let sum: f64 = (0..taps).map(|k| proto[k * up + p]).sum();
+            let scale = if sum.abs() > 1e-12 { 1.0 / sum } else { 0.0 };
+            for k in 0..taps {
+                coeffs[p * taps + k] = (proto[k * up + p] * scale) as f32;
+            }
+        }
+
+        Self {
+            up,
+            down,
+            taps,
+            coeffs,
+            history: vec![0.0; taps - 1],
+            pos: (taps - 1) * up,
+        }
+    }
+
+    /// Input samples the filter delays the signal by (half the branch length).
+    pub fn delay(&self) -> usize {
+        self.taps / 2
+    }
+
+    pub fn process(&mut self, input: &[f32], out: &mut Vec<f32>) {
+        self.history.extend_from_slice(input);
+        let taps = self.taps;
+        loop {
+            let i = self.pos / self.up;
+            if i >= self.history.len() {
+                break;
+            }
+            let p = self.pos % self.up;
+            let branch = &self.coeffs[p * taps..(p + 1) * taps];
+            let window = &self.history[i + 1 - taps..=i];
+            // window is oldest..newest, branch tap k applies to x[i - k].
+            let acc: f32 = branch.iter().zip(window.iter().rev()).map(|(c, x)| c * x).sum();
+            out.push(acc);
+            self.pos += self.down;
+        }
+        // Drop input that no future output can reach.
+        let keep_from = (self.pos / self.up).min(self.history.len()) + 1 - taps;
+        if keep_from > 0 {
+            self.history.drain(..keep_from);
+            self.pos -= keep_from * self.up;
+        }
+    }
+}
+
+/// 入力フォーマットから目標フォーマットへの変換器
+pub struct FormatConverter {
+    in_channels: usize,
+    out_channels: usize,
+    resamplers: Vec<Resampler>,
+    // Per-channel scratch buffers, reused across blocks.
+    planar_in: Vec<Vec<f32>>,
+    planar_out: Vec<Vec<f32>>,
+    // Output samples still owed to the filter delay at the start of the stream.
+    skip: usize,
+}
+
+impl FormatConverter {
+    /// `out_channels` must be 1 (downmix) or equal to `in_channels`.
+    pub fn new(in_rate: u32, in_channels: u16, out_rate: u32, out_channels: u16) -> Result<Self, String> {
+        let in_channels = in_channels.max(1) as usize;
+        let out_channels = out_channels.max(1) as usize;
+        if out_channels != 1 && out_channels != in_channels {
+            return Err(format!(
+                "Unsupported channel conversion: {} -> {}",
+                in_channels, out_channels
+            ));
+        }
+        let resamplers: Vec<Resampler> = if in_rate != out_rate {
+            (0..out_channels).map(|_| Resampler::new(in_rate, out_rate)).collect()
+        } else {
+            Vec::new()
+        };
+        // Compensate for the FIR group delay so the output stays time-aligned.
+        let skip = resamplers
+            .first()
+            .map(|r| (r.delay() as u64 * out_rate as u64 / in_rate as u64) as usize)
+            .unwrap_or(0);
+        Ok(Self {
+            in_channels,
+            out_channels,
+            resamplers,
+            planar_in: vec![Vec::new(); out_channels],
+            planar_out: vec![Vec::new(); out_channels],
+            skip,
+        })
+    }
+
+    pub fn is_passthrough(&self) -> bool {
+        self.resamplers.is_empty() && self.in_channels == self.out_channels
+    }
+
+    /// Converts one interleaved block, appending interleaved output to `out`.
+    pub fn process(&mut self, input: &[f32], out: &mut Vec<f32>) {
+        if self.is_passthrough() {
+            out.extend_from_slice(input);
+            return;
+        }
+
+        for ch in self.planar_in.iter_mut() {
+            ch.clear();
+        }
+        if self.out_channels == 1 {
+            let scale = 1.0 / self.in_channels as f32;
+            self.planar_in[0].extend(
+                input
+                    .chunks_exact(self.in_channels)
+                    .map(|frame| frame.iter().sum::<f32>() * scale),
+            );
+        } else {
+            for frame in input.chunks_exact(self.in_channels) {
+                for (ch, &s) in self.planar_in.iter_mut().zip(frame) {
+                    ch.push(s);
+                }
+            }
+        }
+
+        if self.resamplers.is_empty() {
+            // Same rate, so this is a plain downmix to mono.
+            out.extend_from_slice(&self.planar_in[0]);
+            return;
+        }
+
+        for ((r, src), dst) in self
+            .resamplers
+            .iter_mut()
+            .zip(self.planar_in.iter())
+            .zip(self.planar_out.iter_mut())
+        {
+            dst.clear();
+            r.process(src, dst);
+        }
+        let produced = self.planar_out[0].len();
+        let skip = self.skip.min(produced);
+        self.skip -= skip;
+        interleave(&self.planar_out, out, skip);
+    }
+
+    /// Pushes enough silence through the filters to emit the buffered tail.
+    pub fn flush(&mut self, out: &mut Vec<f32>) {
+        if self.resamplers.is_empty() {
+            return;
+        }
+        let tail = vec![0.0f32; self.resamplers[0].delay() * self.in_channels];
+        self.process(&tail, out);
+    }
+}
+
+fn interleave(planar: &[Vec<f32>], out: &mut Vec<f32>, skip: usize) {
+    let frames = planar[0].len();
+    for i in skip..frames {
+        for ch in planar {
+            out.push(ch[i]);
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn sine(freq: f32, rate: u32, len: usize) -> Vec<f32> {
+        (0..len)
+            .map(|i| 0.5 * (2.0 * std::f32::consts::PI * freq * i as f32 / rate as f32).sin())
+            .collect()
+    }
+
+    /// 48 kHz mono in blocks the size of a typical callback, flushed at the end.
+    fn convert(input: &[f32]) -> Vec<f32> {
+        let mut converter = FormatConverter::new(48000, 1, 16000, 1).unwrap();
+        let mut out = Vec::new();
+        for block in input.chunks(480) {
+            converter.process(block, &mut out);
+        }
+        converter.flush(&mut out);
+        out
+    }
+
+    fn rms(samples: &[f32]) -> f32 {
+        (samples.iter().map(|s| s * s).sum::<f32>() / samples.len() as f32).sqrt()
+    }
+
+    #[test]
+    fn output_length_matches_the_ratio() {
+        let out = convert(&vec![0.0; 48000]);
+        assert_eq!(out.len(), 16000);
+    }
+
+    #[test]
+    fn passband_is_kept() {
+        let out = convert(&sine(1000.0, 48000, 48000));
+        // Skip the edges, where the filter sees the stream start and the flush
+        let level = rms(&out[2000..14000]);
+        let expected = 0.5 / 2f32.sqrt();
+        assert!((level - expected).abs() < expected * 0.01, "rms {} vs {}", level, expected);
+    }
+
+    #[test]
+    fn above_the_new_nyquist_is_removed() {
+        let out = convert(&sine(10000.0, 48000, 48000));
+        let level = rms(&out[2000..14000]);
+        assert!(level < 1e-3, "rms {}", level);
+    }
+
+    #[test]
+    fn downmix_averages_channels() {
+        let mut converter = FormatConverter::new(16000, 2, 16000, 1).unwrap();
+        let mut out = Vec::new();
+        converter.process(&[0.2, 0.4, -0.2, 0.0], &mut out);
+        assert_eq!(out.len(), 2);
+        assert!((out[0] - 0.3).abs() < 1e-6 && (out[1] + 0.1).abs() < 1e-6);
+    }
+}
@@ -0,0 +1,130 @@
+use std::cell::UnsafeCell;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::Arc;
+
+/// オーディオコールバックと書き出しスレッドの間で使う SPSC リングバッファ
+///
+/// Storage is allocated once in `with_capacity`; `push_slice` and `pop_slice`
+/// never allocate or lock, so the producer side is safe to call from the
+/// realtime audio callback.
+struct RingBuffer {
+    buf: Box<[UnsafeCell<f32>]>,
+    mask: usize,
+    // Monotonic counters; the index into `buf` is `counter & mask`.
+    head: AtomicUsize,
+    tail: AtomicUsize,
+}
+
+// Only one Producer and one Consumer exist per buffer, and each slot is
+// accessed by at most one side at a time (guarded by head/tail).
+unsafe impl Sync for RingBuffer {}
+unsafe impl Send for RingBuffer {}
+
+pub struct Producer {
+    ring: Arc<RingBuffer>,
+}
+
+pub struct Consumer {
+    ring: Arc<RingBuffer>,
+}
+
+/// Capacity is rounded up to the next power of two.
+pub fn with_capacity(capacity: usize) -> (Producer, Consumer) {
+    let cap = capacity.max(2).next_power_of_two();
+    let buf: Box<[UnsafeCell<f32>]> = (0..cap).map(|_| UnsafeCell::new(0.0)).collect();
+    let ring = Arc::new(RingBuffer {
+        buf,
+        mask: cap - 1,
+        head: AtomicUsize::new(0),
+        tail: AtomicUsize::new(0),
+    });
+    (Producer { ring: ring.clone() }, Consumer { ring })
+}
+
+impl Producer {
+    /// Pushes the whole slice or nothing. Returns false when there is not
+    /// enough free space (the caller counts this as an overrun).
+    pub fn push_slice(&mut self, data: &[f32]) -> bool {
+        let r = &self.ring;
+        let head = r.head.load(Ordering::Relaxed);
+        let tail = r.tail.load(Ordering::Acquire);
+        let free = r.buf.len() - head.wrapping_sub(tail);
+        if data.len() > free {
+            return false;
+        }
+        for (i, &s) in data.iter().enumerate() {
+            unsafe { *r.buf[(head.wrapping_add(i)) & r.mask].get() = s; }
+        }
+        r.head.store(head.wrapping_add(data.len()), Ordering::Release);
+        true
+    }
+}
+
+impl Consumer {
+    /// Pops up to `out.len()` samples, rounded down to a multiple of `align`
+    /// so interleaved frames are never split between two reads.
+    pub fn pop_slice(&mut self, out: &mut [f32], align: usize) -> usize {
+        let r = &self.ring;
+        let tail = r.tail.load(Ordering::Relaxed);
+        let available = r.head.load(Ordering::Acquire).wrapping_sub(tail);
+        let mut n = available.min(out.len());
+        if align > 1 {
+            n -= n % align;
+        }
+        for (i, slot) in out[..n].iter_mut().enumerate() {
+            *slot = unsafe { *r.buf[(tail.wrapping_add(i)) & r.mask].get() };
+        }
+        r.tail.store(tail.wrapping_add(n), Ordering::Release);
+        n
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn capacity_is_rounded_up_to_a_power_of_two() {
+        let (mut producer, _consumer) = with_capacity(5);
+        assert!(producer.push_slice(&[0.0; 8]));
+        assert!(!producer.push_slice(&[0.0]));
+    }
+
+    #[test]
+    fn wraps_around_the_end_of_the_buffer() {
+        let (mut producer, mut consumer) = with_capacity(8);
+        let mut out = [0.0f32; 8];
+        // 6 of 8 slots per round, so every round after the first wraps
+        for round in 0..5 {
+            let data: Vec<f32> = (0..6).map(|i| (round * 10 + i) as f32).collect();
+            assert!(producer.push_slice(&data));
+            assert_eq!(consumer.pop_slice(&mut out, 1), 6);
+            assert_eq!(&out[..6], &data[..]);
+        }
+    }
+
+    #[test]
+    fn rejects_a_block_that_does_not_fit() {
+        let (mut producer, mut consumer) = with_capacity(8);
+        let mut out = [0.0f32; 8];
+        assert!(producer.push_slice(&[1.0; 6]));
+        // All or nothing: nothing of the rejected block is written
+        assert!(!producer.push_slice(&[2.0; 3]));
+        assert_eq!(consumer.pop_slice(&mut out, 1), 6);
+        assert!(out[..6].iter().all(|&s| s == 1.0));
+        assert!(producer.push_slice(&[2.0; 3]));
+        assert_eq!(consumer.pop_slice(&mut out, 1), 3);
+    }
+
+    #[test]
+    fn pops_whole_frames_only() {
+        let (mut producer, mut consumer) = with_capacity(8);
+        let mut out = [0.0f32; 8];
+        assert!(producer.push_slice(&[1.0, 2.0, 3.0, 4.0, 5.0]));
+        assert_eq!(consumer.pop_slice(&mut out, 2), 4);
+        assert_eq!(consumer.pop_slice(&mut out, 2), 0);
+        assert!(producer.push_slice(&[6.0]));
+        assert_eq!(consumer.pop_slice(&mut out, 2), 2);
+        assert_eq!(&out[..2], &[5.0, 6.0]);
+    }
+}
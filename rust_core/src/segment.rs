@@ -0,0 +1,166 @@
+//! 発話の切れ目で録音を区切るセグメンタ
+//!
+//! Runs on the writer thread next to FrameVad and sees the same converted
+//! samples. Once speech has been followed by a long enough pause, everything
+//! up to the middle of that pause is handed to the callback, so a long
+//! dictation can be transcribed piece by piece while the user keeps talking.
+
+use crate::recorder::endpoint_scale;
+use crate::vad::{SpeechSpan, FRAME_MS};
+
+/// 確定したセグメント (i16 インターリーブ、出力フォーマット)
+pub struct Segment {
+    /// 0-based, in recording order.
+    pub index: usize,
+    pub samples: Vec<i16>,
+    pub sample_rate: u32,
+    pub channels: u16,
+}
+
+pub type SegmentCallback = Box<dyn FnMut(Segment) + Send>;
+
+pub struct Segmenter {
+    sample_rate: u32,
+    channels: u16,
+    // Per channel, same framing as FrameVad.
+    frame_samples: usize,
+    pause_frames: usize,
+    min_frames: usize,
+    callback: SegmentCallback,
+    // Samples since the last cut.
+    pending: Vec<i16>,
+    // VAD frame index at which `pending` starts.
+    start_frame: usize,
+    emitted: usize,
+}
+
+impl Segmenter {
+    /// Cuts after `pause_ms` of non-speech, but never produces a segment
+    /// shorter than `min_ms` (short ones keep growing until the next pause).
+    pub fn new(sample_rate: u32, channels: u16, pause_ms: u32, min_ms: u32, callback: SegmentCallback) -> Self {
+        let frames = |ms: u32| ((ms + FRAME_MS - 1) / FRAME_MS) as usize;
+        Self {
+            sample_rate,
+            channels: channels.max(1),
+            frame_samples: ((sample_rate * FRAME_MS / 1000) as usize).max(1),
+            pause_frames: frames(pause_ms).max(1),
+            min_frames: frames(min_ms),
+            callback,
+            pending: Vec::new(),
+            start_frame: 0,
+            emitted: 0,
+        }
+    }
+
+    /// Appends a converted block; call `update` once the VAD has seen it too.
+    pub fn push(&mut self, block: &[f32]) {
+        self.pending.extend(block.iter().map(|&s| endpoint_scale(s)));
+    }
+
+    pub fn update(&mut self, span: &SpeechSpan) {
+        // Speech since the last cut, followed by a long enough pause?
+        if span.first.is_none() || span.end <= self.start_frame {
+            return;
+        }
+        let silence = span.total_frames - span.end;
+        if silence < self.pause_frames {
+            return;
+        }
+        let cut = span.end + silence / 2;
+        if cut - self.start_frame < self.min_frames {
+            return;
+        }
+
+        let len = ((cut - self.start_frame) * self.frame_samples * self.channels as usize).min(self.pending.len());
+        let samples: Vec<i16> = self.pending.drain(..len).collect();
+        self.start_frame = cut;
+        (self.callback)(Segment {
+            index: self.emitted,
+            samples,
+            sample_rate: self.sample_rate,
+            channels: self.channels,
+        });
+        self.emitted += 1;
+    }
+
+    /// (segments emitted, remainder after the last cut). The remainder is
+    /// None when it holds no speech, e.g. the key was released after a pause.
+    pub fn finish(self, span: &SpeechSpan) -> (usize, Option<Vec<i16>>) {
+        let has_speech = span.first.is_some() && span.end > self.start_frame;
+        (self.emitted, has_speech.then_some(self.pending))
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::sync::{Arc, Mutex};
+
+    const RATE: u32 = 16000;
+    // Samples per 20 ms VAD frame at 16 kHz
+    const FRAME: usize = 320;
+
+    fn span(first: usize, end: usize, total_frames: usize) -> SpeechSpan {
+        SpeechSpan {
+            frame_samples: FRAME,
+            total_frames,
+            speech_frames: end - first,
+            first: Some(first),
+            end,
+        }
+    }
+
+    /// 300 ms pause, 1 s minimum; returns the segmenter and the (index, length) of each segment.
+    fn segmenter() -> (Segmenter, Arc<Mutex<Vec<(usize, usize)>>>) {
+        let segments = Arc::new(Mutex::new(Vec::new()));
+        let sink = segments.clone();
+        let segmenter = Segmenter::new(RATE, 1, 300, 1000, Box::new(move |segment: Segment| {
+            sink.lock().unwrap().push((segment.index, segment.samples.len()));
+        }));
+        (segmenter, segments)
+    }
+
+    #[test]
+    fn cuts_in_the_middle_of_a_long_enough_pause() {
+        let (mut segmenter, segments) = segmenter();
+        segmenter.push(&vec![0.0; 60 * FRAME]);
+        // Speech until frame 40, then 20 frames (400 ms) of silence
+        segmenter.update(&span(0, 40, 60));
+        assert_eq!(*segments.lock().unwrap(), vec![(0, 50 * FRAME)]);
+    }
+
+    #[test]
+    fn waits_for_the_pause_to_be_long_enough() {
+        let (mut segmenter, segments) = segmenter();
+        segmenter.push(&vec![0.0; 54 * FRAME]);
+        // 14 frames (280 ms) of silence is below the 300 ms pause
+        segmenter.update(&span(0, 40, 54));
+        assert!(segments.lock().unwrap().is_empty());
+    }
+
+    #[test]
+    fn never_cuts_a_segment_shorter_than_the_minimum() {
+        let (mut segmenter, segments) = segmenter();
+        segmenter.push(&vec![0.0; 40 * FRAME]);
+        // The cut would be at frame 30 (600 ms), under the 1 s minimum
+        segmenter.update(&span(0, 20, 40));
+        assert!(segments.lock().unwrap().is_empty());
+    }
+
+    #[test]
+    fn later_segments_start_at_the_previous_cut() {
+        let (mut segmenter, segments) = segmenter();
+        segmenter.push(&vec![0.0; 60 * FRAME]);
+        segmenter.update(&span(0, 40, 60));
+        // No new speech since the cut
+        segmenter.update(&span(0, 40, 70));
+        segmenter.push(&vec![0.0; 80 * FRAME]);
+        segmenter.update(&span(0, 120, 140));
+        assert_eq!(*segments.lock().unwrap(), vec![(0, 50 * FRAME), (1, 80 * FRAME)]);
+
+        let (count, rest) = segmenter.finish(&span(0, 120, 140));
+        assert_eq!(count, 2);
+        // Only the silence after the last cut is left, so there is no final piece
+        assert!(rest.is_none());
+    }
+}
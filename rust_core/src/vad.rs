@@ -0,0 +1,171 @@
+//! フレーム単位の発話検出 (短時間エネルギー + ゼロ交差率)
+//!
+//! Fed by the writer thread with converted samples, so it sees the same audio
+//! that ends up in the payload and never runs on the realtime callback.
+
+/// Analysis frame length.
+pub const FRAME_MS: u32 = 20;
+/// Consecutive speech frames needed before a run counts (rejects key clicks).
+const MIN_SPEECH_RUN: usize = 3;
+/// Adaptive threshold: this many times the tracked noise floor.
+const NOISE_RATIO: f32 = 3.0;
+/// Per-frame rise of the noise floor estimate when the signal is louder.
+const NOISE_RISE: f32 = 1.002;
+/// The adaptive threshold never exceeds this many times the configured one,
+/// so a loud first frame cannot mask the rest of the recording.
+const NOISE_CAP_RATIO: f32 = 8.0;
+/// Zero-crossing rate above which a quieter frame still counts (fricatives).
+const FRICATIVE_ZCR: f32 = 0.25;
+
+/// 録音全体の発話区間 (フレーム単位)
+#[derive(Clone, Copy, Default, Debug)]
+pub struct SpeechSpan {
+    pub frame_samples: usize,
+    pub total_frames: usize,
+    pub speech_frames: usize,
+    // Half-open [first, end) range covering every accepted speech run.
+    pub first: Option<usize>,
+    pub end: usize,
+}
+
+impl SpeechSpan {
+    /// Sample range (per channel) to keep, widened by `margin_frames` on both
+    /// sides. The end may run past the recording; callers clamp it.
+    pub fn keep_range(&self, margin_frames: usize) -> Option<(usize, usize)> {
+        let first = self.first?;
+        let start = first.saturating_sub(margin_frames) * self.frame_samples;
+        let end = (self.end + margin_frames) * self.frame_samples;
+        Some((start, end))
+    }
+}
+
+pub struct FrameVad {
+    channels: usize,
+    energy_threshold: f32,
+    frame_samples: usize,
+    // Partial frame carried between blocks (mono).
+    pending: Vec<f32>,
+    noise_floor: f32,
+    run_start: usize,
+    run_len: usize,
+    span: SpeechSpan,
+}
+
+impl FrameVad {
+    pub fn new(sample_rate: u32, channels: u16, energy_threshold: f32) -> Self {
+        let frame_samples = ((sample_rate * FRAME_MS / 1000) as usize).max(1);
+        Self {
+            channels: channels.max(1) as usize,
+            energy_threshold,
+            frame_samples,
+            pending: Vec::with_capacity(frame_samples),
+            noise_floor: f32::MAX,
+            run_start: 0,
+            run_len: 0,
+            span: SpeechSpan {
+                frame_samples,
+                ..SpeechSpan::default()
+            },
+        }
+    }
+
+    /// Feeds interleaved samples; complete frames are classified immediately.
+    pub fn process(&mut self, block: &[f32]) {
+        let scale = 1.0 / self.channels as f32;
+        for frame in block.chunks_exact(self.channels) {
+            self.pending.push(frame.iter().sum::<f32>() * scale);
+            if self.pending.len() == self.frame_samples {
+                let speech = self.classify();
+                self.push_decision(speech);
+                self.pending.clear();
+            }
+        }
+    }
+
+    pub fn span(&self) -> SpeechSpan {
+        self.span
+    }
+
+    fn classify(&mut self) -> bool {
+        let n = self.pending.len() as f32;
+        let mut sum_sq = 0.0f32;
+        let mut crossings = 0usize;
+        let mut prev = 0.0f32;
+        for &s in &self.pending {
+            sum_sq += s * s;
+            if (s >= 0.0) != (prev >= 0.0) {
+                crossings += 1;
+            }
+            prev = s;
+        }
+        let rms = (sum_sq / n).sqrt();
+        let zcr = crossings as f32 / n;
+
+        // Minimum tracker with a slow upward drift follows the background level.
+        self.noise_floor = if rms < self.noise_floor { rms } else { self.noise_floor * NOISE_RISE };
+        let adaptive = (self.noise_floor * NOISE_RATIO).min(self.energy_threshold * NOISE_CAP_RATIO);
+        let threshold = self.energy_threshold.max(adaptive);
+
+        rms >= threshold || (rms >= threshold * 0.5 && zcr >= FRICATIVE_ZCR)
+    }
+
+    fn push_decision(&mut self, speech: bool) {
+        let index = self.span.total_frames;
+        self.span.total_frames += 1;
+        if speech {
+            if self.run_len == 0 {
+                self.run_start = index;
+            }
+            self.run_len += 1;
+            if self.run_len == MIN_SPEECH_RUN {
+                self.span.speech_frames += MIN_SPEECH_RUN;
+                if self.span.first.is_none() {
+                    self.span.first = Some(self.run_start);
+                }
+            } else if self.run_len > MIN_SPEECH_RUN {
+                self.span.speech_frames += 1;
+            }
+            if self.run_len >= MIN_SPEECH_RUN {
+                self.span.end = index + 1;
+            }
+        } else {
+            self.run_len = 0;
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const RATE: u32 = 16000;
+    const FRAME: usize = 320;
+
+    fn tone(frames: usize) -> Vec<f32> {
+        (0..frames * FRAME)
+            .map(|i| 0.3 * (2.0 * std::f32::consts::PI * 440.0 * i as f32 / RATE as f32).sin())
+            .collect()
+    }
+
+    #[test]
+    fn finds_the_speech_between_silences() {
+        let mut vad = FrameVad::new(RATE, 1, 0.01);
+        vad.process(&vec![0.0; 10 * FRAME]);
+        vad.process(&tone(10));
+        vad.process(&vec![0.0; 10 * FRAME]);
+        let span = vad.span();
+        assert_eq!(span.total_frames, 30);
+        assert_eq!(span.first, Some(10));
+        assert_eq!(span.end, 20);
+        assert_eq!(span.speech_frames, 10);
+    }
+
+    #[test]
+    fn ignores_runs_shorter_than_min_speech_run() {
+        let mut vad = FrameVad::new(RATE, 1, 0.01);
+        vad.process(&vec![0.0; 5 * FRAME]);
+        vad.process(&tone(MIN_SPEECH_RUN - 1));
+        vad.process(&vec![0.0; 5 * FRAME]);
+        assert_eq!(vad.span().first, None);
+    }
+}
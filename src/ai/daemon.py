@@ -0,0 +1,229 @@
+"""
+Shared local transcription daemon.
+
+Loads the local Whisper model once and serves LocalDaemonProvider clients over
+a Unix domain socket, so several Voice In users on one workstation share a
+single copy of the model:
+
+    python -m src.ai.daemon [--socket PATH] [--model-size large-v3] [--mode 600] [--allow-uid UID ...]
+
+By default the socket is private to the user running the daemon (mode 600 in
+a mode 700 directory). To share it, put it in a directory the other users can
+reach, widen --mode and list their uids with --allow-uid; connections from
+any other uid are refused.
+
+Requests are decoded one at a time. Pending requests are queued per client
+(peer uid) and served round-robin, so one user dictating a lot cannot starve
+the others.
+"""
+import argparse
+import collections
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+import numpy as np
+
+from src.core.config import config_manager
+from src.ai.providers.local import LocalProvider
+from src.ai.providers.local_daemon import (
+    PROTOCOL_VERSION, default_socket_path, peer_uid, send_message, recv_message,
+)
+
+# Requests a single client may have waiting before new ones are refused
+MAX_QUEUED_PER_CLIENT = 4
+
+
+class _Job:
+    def __init__(self, client, audio, prompts):
+        self.client = client
+        self.audio = audio
+        self.prompts = prompts
+        self.done = threading.Event()
+        self.text = None
+        self.error = None
+
+
+class FairQueue:
+    """Per-client FIFO queues served round-robin."""
+
+    def __init__(self, max_per_client=MAX_QUEUED_PER_CLIENT):
+        self._cond = threading.Condition()
+        self._queues = collections.OrderedDict()  # client -> deque of jobs
+        self._max_per_client = max_per_client
+
+    def put(self, job):
+        with self._cond:
+            queue = self._queues.setdefault(job.client, collections.deque())
+            if len(queue) >= self._max_per_client:
+                raise RuntimeError(f"Too many pending requests ({len(queue)})")
+            queue.append(job)
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._queues:
+                self._cond.wait()
+            # Take from the client at the front, then move it to the back
+            client, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            del self._queues[client]
+            if queue:
+                self._queues[client] = queue
+            return job
+
+    def __len__(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+
+class TranscriptionDaemon:
+    def __init__(self, socket_path, mode=0o600, allowed_uids=()):
+        self.socket_path = socket_path
+        self.mode = mode
+        self.allowed_uids = {os.getuid(), *allowed_uids}
+        self.queue = FairQueue()
+        self.provider = None
+        self.model_name = config_manager.settings.get("local", {}).get("model_size", "large-v3")
+
+    def serve_forever(self):
+        from rust_core import AudioBuffer
+        self._audio_buffer = AudioBuffer
+
+        logging.info(f"Loading {self.model_name}")
+        self.provider = LocalProvider()
+        self.provider.warm_up()
+        threading.Thread(target=self._decode_loop, name="decoder", daemon=True).start()
+
+        _prepare_socket_dir(self.socket_path)
+        if os.path.exists(self.socket_path):
+            if _socket_in_use(self.socket_path):
+                raise RuntimeError(f"Another daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)
+
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                daemon._handle(self.request)
+
+        # Created private, so nobody can connect before the chmod below
+        umask = os.umask(0o177)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(umask)
+        server.daemon_threads = True
+        os.chmod(self.socket_path, self.mode)
+        logging.info(f"Listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _handle(self, sock):
+        uid = peer_uid(sock)
+        if uid is not None and uid not in self.allowed_uids:
+            logging.warning(f"Refused connection from uid {uid}")
+            return
+        try:
+            header, payload = recv_message(sock)
+            if header is None:
+                return
+            if header.get("version") != PROTOCOL_VERSION:
+                send_message(sock, {"ok": False, "error": f"Unsupported protocol version {header.get('version')}"})
+                return
+            op = header.get("op")
+            if op == "ping":
+                send_message(sock, {"ok": True, "model": self.model_name, "queued": len(self.queue)})
+            elif op == "transcribe":
+                client = f"uid:{uid}" if uid is not None else header.get("client") or "unknown"
+                audio = self._audio_buffer(
+                    np.frombuffer(payload, dtype=np.int16),
+                    int(header["sample_rate"]),
+                    int(header["channels"]),
+                )
+                job = _Job(client, audio, header.get("prompts") or {})
+                self.queue.put(job)
+                job.done.wait()
+                if job.error is not None:
+                    send_message(sock, {"ok": False, "error": job.error})
+                else:
+                    send_message(sock, {"ok": True, "text": job.text})
+            else:
+                send_message(sock, {"ok": False, "error": f"Unknown op: {op}"})
+        except Exception as e:
+            logging.error(f"Request failed: {e}")
+            try:
+                send_message(sock, {"ok": False, "error": str(e)})
+            except OSError:
+                pass
+
+    def _decode_loop(self):
+        while True:
+            job = self.queue.get()
+            try:
+                logging.info(f"Transcribing {job.audio.duration:.1f} s for {job.client}")
+                job.text = self.provider.transcribe(job.audio, job.prompts)
+            except Exception as e:
+                logging.exception("Transcription failed")
+                job.error = str(e)
+            finally:
+                job.done.set()
+
+
+def _prepare_socket_dir(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    if path != default_socket_path():
+        return
+    # The default directory may be in the shared temp dir; never use one
+    # somebody else created or can write to
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"{directory} must be owned by you with mode 700")
+
+
+def _socket_in_use(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared local Whisper transcription daemon for Voice In")
+    parser.add_argument("--socket", default=None, help=f"Unix socket path (default: local.daemon_socket or {default_socket_path()})")
+    parser.add_argument("--model-size", default=None, help="Override local.model_size")
+    parser.add_argument("--device", default=None, help="Override local.device")
+    parser.add_argument("--compute-type", default=None, help="Override local.compute_type")
+    parser.add_argument("--mode", default="600", help="Socket permissions, octal (default: 600)")
+    parser.add_argument("--allow-uid", type=int, action="append", default=[],
+                        help="Also accept requests from this uid (repeatable); others are refused")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", stream=sys.stdout)
+
+    local = config_manager.settings.setdefault("local", {})
+    for key, value in (("model_size", args.model_size), ("device", args.device), ("compute_type", args.compute_type)):
+        if value:
+            local[key] = value
+
+    socket_path = args.socket or local.get("daemon_socket") or default_socket_path()
+    daemon = TranscriptionDaemon(socket_path, int(args.mode, 8), args.allow_uid)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# A single asyncio event loop, on its own thread, runs every provider call
+# (dictations, settings tests, segment uploads). Cloud providers use their SDKs'
+# async clients on it; blocking work (local models, building providers) goes to
+# one small shared executor instead of a new thread per request.
+
+# Threads for blocking calls made from the loop
+MAX_BLOCKING_WORKERS = 4
+
+_lock = threading.Lock()
+_loop = None
+# provider instance -> asyncio.Semaphore (only touched on the loop thread)
+_limiters = weakref.WeakKeyDictionary()
+# (provider name, limit) -> asyncio.Semaphore for whole dictations
+_job_slots = {}
+
+
+def get_loop():
+    """The shared loop, started on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=MAX_BLOCKING_WORKERS, thread_name_prefix="ai-blocking")
+            )
+            threading.Thread(target=_run, args=(loop,), name="ai-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _run(loop):
+    asyncio.set_event_loop(loop)
+    logging.info("Inference event loop started")
+    loop.run_forever()
+
+
+def submit(coro):
+    """Schedule coro on the shared loop from any thread; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call in the loop's executor and await its result."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def limiter(provider):
+    """Async context manager capping concurrent calls into provider at its max_concurrency."""
+    limit = getattr(provider, "max_concurrency", None)
+    if not limit:
+        return contextlib.nullcontext()
+    semaphore = _limiters.get(provider)
+    if semaphore is None:
+        semaphore = _limiters[provider] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def job_slot(name, limit):
+    """Async context manager allowing at most limit dictations for provider name at once."""
+    if not limit:
+        return contextlib.nullcontext()
+    key = (name, limit)
+    if key not in _job_slots:
+        _job_slots[key] = asyncio.Semaphore(limit)
+    return _job_slots[key]
@@ -0,0 +1,188 @@
+import os
+import json
+import asyncio
+import logging
+import tempfile
+import threading
+import collections
+
+from src.core.config import config_manager, STATE_DIR
+from src.ai import event_loop
+from src.ai import resilience
+
+# Hedged requests ("race" mode): the audio goes to the primary provider, and if
+# no answer has arrived after the primary's hedge_quantile latency a backup
+# request is sent (to another provider, or the same one again). The first
+# valid answer wins; the other request is cancelled. Latencies and win/loss
+# counts are kept in hedge_stats.json under the state dir to tune the delay.
+
+STATS_PATH = os.path.join(STATE_DIR, 'hedge_stats.json')
+# Latency samples kept per provider
+MAX_SAMPLES = 200
+# Below this many samples the configured default delay is used
+MIN_SAMPLES = 10
+
+
+class HedgeStats:
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.latency = {}  # provider -> deque of seconds
+        self.races = {}    # "primary>backup" -> counters
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, samples in (data.get("latency") or {}).items():
+            self.latency[name] = collections.deque(samples[-MAX_SAMPLES:], maxlen=MAX_SAMPLES)
+        self.races = data.get("races") or {}
+
+    def add_latency(self, provider, seconds):
+        with self._lock:
+            samples = self.latency.setdefault(provider, collections.deque(maxlen=MAX_SAMPLES))
+            samples.append(round(seconds, 3))
+
+    def quantile(self, provider, q):
+        """q-quantile of provider's recent latencies, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self.latency.get(provider, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def add_race(self, key, winner, backup_fired, delay):
+        with self._lock:
+            race = self.races.setdefault(key, {"runs": 0, "backup_fired": 0, "wins": {}, "no_answer": 0})
+            race["runs"] += 1
+            race["backup_fired"] += int(backup_fired)
+            if winner is None:
+                race["no_answer"] += 1
+            else:
+                race["wins"][winner] = race["wins"].get(winner, 0) + 1
+            race["last_delay"] = round(delay, 3)
+            return dict(race)
+
+    def save(self):
+        with self._lock:
+            payload = {
+                "version": 1,
+                "latency": {name: list(samples) for name, samples in self.latency.items()},
+                "races": self.races,
+            }
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                mode='w', encoding='utf-8', suffix='.tmp', delete=False, dir=os.path.dirname(self.path),
+            ) as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+                tmp_path = f.name
+            os.replace(tmp_path, self.path)
+            tmp_path = None
+        except OSError as e:
+            logging.warning(f"Could not save hedge stats: {e}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+
+stats = HedgeStats()
+
+
+def race_settings(primary):
+    """(backup provider name, settings) if race mode is on for primary, else None."""
+    providers = config_manager.settings.get("providers", {})
+    if not providers.get("race", False):
+        return None
+    backup = providers.get("race_with") or "same"
+    if backup == "same":
+        backup = primary
+    return backup, providers
+
+
+def hedge_delay(primary, settings):
+    """Seconds to wait for the primary before sending the backup request."""
+    default = float(settings.get("hedge_default_delay_ms", 2500)) / 1000.0
+    minimum = float(settings.get("hedge_min_delay_ms", 300)) / 1000.0
+    observed = stats.quantile(primary, float(settings.get("hedge_quantile", 0.95)))
+    return max(minimum, observed if observed is not None else default)
+
+
+async def race(primary, backup, call, settings):
+    """
+    Run call(primary), and call(backup) as well once hedge_delay() has passed
+    (or the primary came back empty or failed transiently; any other error is
+    raised at once). Returns the first non-empty text; empty text only if no
+    attempt produced more. call(name) must return a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    delay = hedge_delay(primary, settings)
+    started = loop.time()
+    # Distinct labels, so a second attempt at the same provider is told apart
+    labels = {primary: primary}
+    backup_label = backup if backup != primary else f"{backup}#2"
+    tasks = {asyncio.ensure_future(call(primary)): primary}
+    starts = {label: started for label in tasks.values()}
+    backup_fired = False
+    errors = []
+    fallback = None
+    winner = None
+
+    def fire_backup():
+        nonlocal backup_fired
+        backup_fired = True
+        labels[backup_label] = backup
+        starts[backup_label] = loop.time()
+        logging.info(f"Race: no answer from {primary} after {loop.time() - started:.2f} s; sending to {backup_label}")
+        tasks[asyncio.ensure_future(call(backup))] = backup_label
+
+    try:
+        pending = set(tasks)
+        while pending:
+            timeout = None if backup_fired else max(0.0, delay - (loop.time() - started))
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                fire_backup()
+                pending = {t for t in tasks if not t.done()}
+                continue
+            for task in done:
+                label = tasks[task]
+                elapsed = loop.time() - starts[label]
+                if task.exception() is not None:
+                    error = task.exception()
+                    if not backup_fired and not resilience.is_transient(error):
+                        # Another request would fail the same way; don't pay for it
+                        raise error
+                    logging.warning(f"Race: {label} failed after {elapsed:.2f} s: {error}")
+                    errors.append(error)
+                    continue
+                stats.add_latency(labels[label], elapsed)
+                text = task.result() or ""
+                if text.strip():
+                    winner = label
+                    logging.info(f"Race: {label} answered first in {elapsed:.2f} s")
+                    return text
+                if fallback is None:
+                    fallback = text
+            if not backup_fired and not pending:
+                # The primary came back empty or failed transiently; the backup is a retry now
+                fire_backup()
+                pending = {t for t in tasks if not t.done()}
+        if fallback is not None:
+            return fallback
+        raise errors[0]
+    finally:
+        for task, label in tasks.items():
+            if not task.done():
+                task.cancel()
+                # The loser took at least this long; keeps slow providers' tails in the samples
+                stats.add_latency(labels[label], loop.time() - starts[label])
+        summary = stats.add_race(f"{primary}>{backup}", winner, backup_fired, delay)
+        logging.info(f"Race stats {primary}>{backup}: {summary}")
+        await event_loop.run_blocking(stats.save)
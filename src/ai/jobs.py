@@ -0,0 +1,93 @@
+import collections
+import logging
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+# FIFO of dictations between the recorder and the AI layer. The user can record
+# the next sentence while earlier ones are still being transcribed; the workers
+# run concurrently (AIWorker bounds this per provider), but their results come
+# out of this queue strictly in recording order.
+
+
+class _Job:
+    def __init__(self, number, worker):
+        self.number = number
+        self.worker = worker
+        # partial() chunks held back until every earlier job has finished
+        self.chunks = []
+        self.done = False
+        self.text = None
+        self.error = None
+
+
+class JobQueue(QObject):
+    # Same signals as AIWorker, for the job at the head of the queue only
+    partial = pyqtSignal(str)
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._jobs = collections.deque()
+        self._next_number = 1
+
+    @property
+    def pending(self):
+        """Jobs whose result has not been delivered yet."""
+        return len(self._jobs)
+
+    def add(self, worker):
+        """Queue worker behind the jobs already added and start it."""
+        job = _Job(self._next_number, worker)
+        self._next_number += 1
+        self._jobs.append(job)
+        worker.partial.connect(self._on_partial)
+        worker.finished.connect(self._on_finished)
+        worker.error.connect(self._on_error)
+        if len(self._jobs) > 1:
+            logging.info(f"Dictation #{job.number} queued behind {len(self._jobs) - 1} other(s)")
+        worker.start()
+
+    def _job_for(self, worker):
+        for job in self._jobs:
+            if job.worker is worker:
+                return job
+        return None
+
+    @pyqtSlot(str)
+    def _on_partial(self, chunk):
+        job = self._job_for(self.sender())
+        if job is None:
+            return
+        if job is self._jobs[0]:
+            self.partial.emit(chunk)
+        else:
+            job.chunks.append(chunk)
+
+    @pyqtSlot(str)
+    def _on_finished(self, text):
+        self._complete(self.sender(), text, None)
+
+    @pyqtSlot(str)
+    def _on_error(self, err):
+        self._complete(self.sender(), None, err)
+
+    def _complete(self, worker, text, err):
+        job = self._job_for(worker)
+        if job is None:
+            return
+        job.done = True
+        job.text = text
+        job.error = err
+        # Deliver every finished job at the head, then let the next one catch up
+        while self._jobs and self._jobs[0].done:
+            head = self._jobs.popleft()
+            if head.error is not None:
+                self.error.emit(head.error)
+            else:
+                self.finished.emit(head.text)
+            if self._jobs:
+                following = self._jobs[0]
+                for chunk in following.chunks:
+                    self.partial.emit(chunk)
+                following.chunks.clear()
@@ -1,6 +1,118 @@
+import logging
 from abc import ABC, abstractmethod
 
+from src.core.config import config_manager
+from src.ai.event_loop import run_blocking
+from src.ai.resilience import call_stage
+
 class AIProvider(ABC):
+    # Upload encodings the provider's API accepts, most preferred first.
+    upload_formats = ("wav",)
+    # True if transcribe_stream() yields text as it is generated rather than all at once
+    streams_output = False
+    # Calls into one instance that may run at the same time (None = no limit)
+    max_concurrency = None
+
+    @classmethod
+    def settings_key(cls):
+        """
+        Settings an instance is built from. The provider registry reuses an
+        instance until this value changes.
+        """
+        return ()
+
+    @classmethod
+    def is_configured(cls):
+        """False if an instance cannot work with the current settings (e.g. no API key)."""
+        return True
+
+    @classmethod
+    def prepare(cls):
+        """
+        Slow one-time setup before an instance is built. Only called from
+        background preloading, never on the dictation path.
+        """
+        pass
+
+    def warm_up(self):
+        """Prepare for the first request (called once after construction by preload)."""
+        pass
+
+    async def open_connection(self):
+        """
+        Open or refresh the connection to the service so the next request can
+        skip connection setup. Called on hold-key press; must be cheap.
+        """
+        pass
+
+    def cancel(self):
+        """
+        Abandon the blocking transcribe() in progress, called once it has
+        passed the "local" deadline, so it stops holding an executor thread.
+        The instance must still work for the next request. Calls that cannot
+        be interrupted (an in-process model) just keep running.
+        """
+        pass
+
+    def close(self):
+        """
+        Release connections or worker processes. Called by the provider
+        registry when it drops this instance; the instance is not used again.
+        """
+        pass
+
     @abstractmethod
-    def transcribe(self, audio_path: str, prompts: dict) -> str:
+    def transcribe(self, audio, prompts: dict) -> str:
+        # audio: rust_core.AudioBuffer (16-bit PCM held in memory by the recorder)
         pass
+
+    def transcribe_stream(self, audio, prompts: dict):
+        """Like transcribe(), but yields the text in pieces as they become available."""
+        yield self.transcribe(audio, prompts)
+
+    async def transcribe_async(self, audio, prompts: dict) -> str:
+        """
+        Coroutine version of transcribe(), run on the shared inference loop
+        (src.ai.event_loop). By default transcribe() runs in the loop's
+        executor under the "local" deadline, without retries: another attempt
+        would queue behind the decode that timed out. On timeout, cancel()
+        frees the executor thread where the provider can.
+        """
+        try:
+            return await call_stage(
+                "local", lambda: run_blocking(self.transcribe, audio, prompts), type(self).__name__, retries=0,
+            )
+        except TimeoutError:
+            self.cancel()
+            raise
+
+    async def transcribe_stream_async(self, audio, prompts: dict):
+        """Async generator version of transcribe_stream()."""
+        yield await self.transcribe_async(audio, prompts)
+
+    def encode_upload(self, audio):
+        """
+        Encode the recording in the configured upload format if this provider
+        accepts it, falling back to WAV. Returns (filename, data, mime_type).
+        """
+        audio_settings = config_manager.settings.get("audio", {})
+        fmt = str(audio_settings.get("upload_format") or "wav").lower()
+        if fmt not in self.upload_formats:
+            fmt = "wav"
+        bitrate = int(audio_settings.get("opus_bitrate", 24000))
+
+        try:
+            data, mime_type, seconds = audio.encode(fmt, bitrate)
+        except Exception as e:
+            logging.warning(f"Encoding upload as {fmt} failed ({e}); sending WAV")
+            fmt = "wav"
+            data, mime_type, seconds = audio.encode(fmt)
+
+        wav_size = 44 + len(audio) * 2
+        logging.info(
+            f"Upload payload: {fmt} {len(data) / 1024:.1f} KiB "
+            f"({len(data) / wav_size:.0%} of WAV {wav_size / 1024:.1f} KiB), "
+            f"encoded in {seconds * 1000:.1f} ms"
+        )
+        extension = "ogg" if fmt == "opus" else fmt
+        return f"audio.{extension}", data, mime_type
@@ -1,6 +1,5 @@
 import os
 import logging
-import mimetypes
 
 try:
     from google import genai
@@ -10,48 +9,72 @@ except ImportError:
     raise ImportError("The 'google-genai' package is required. Please install it via pip or uv.")
 
 from src.core.config import config_manager
+from src.ai import event_loop
+from src.ai.event_loop import run_blocking
+from src.ai.resilience import call_stage, iterate_stage
 from src.ai.providers.base import AIProvider
+from src.ai.providers.http_pool import ConnectionPool
 
 class GeminiProvider(AIProvider):
+    upload_formats = ("flac", "opus", "wav")
+    streams_output = True
+
+    @classmethod
+    def settings_key(cls):
+        return (config_manager.settings.get("gemini_key") or os.getenv("GEMINI_API_KEY"),)
+
+    @classmethod
+    def is_configured(cls):
+        return bool(cls.settings_key()[0])
+
     def __init__(self):
         self.api_key = config_manager.settings.get("gemini_key") or os.getenv("GEMINI_API_KEY")
         self.client = None
+        self.pool = None
         if self.api_key:
             try:
-                self.client = genai.Client(api_key=self.api_key)
+                self.pool = ConnectionPool("gemini")
+                try:
+                    http_options = types.HttpOptions(httpx_async_client=self.pool.async_client)
+                except Exception:
+                    # Older google-genai without custom client support keeps its own pool
+                    logging.info("google-genai cannot use a shared httpx client; connection reuse is not tracked")
+                    self.pool.close()
+                    self.pool = None
+                    http_options = None
+                self.client = genai.Client(api_key=self.api_key, http_options=http_options)
             except Exception:
                 logging.exception("Error configuring Gemini Client")
 
-    def transcribe(self, audio_path: str, prompts: dict) -> str:
-        if not self.client:
-             raise RuntimeError("Gemini Client not initialized (Check API Key)")
+    async def open_connection(self):
+        if not self.client or (self.pool is not None and not self.pool.needs_warming()):
+            return
+        try:
+            # Small metadata request; leaves a TLS connection in the pool
+            await self.client.aio.models.get(model=self._model_name())
+        except Exception as e:
+            logging.warning(f"Gemini connection warm-up failed: {e}")
 
-        model_name = config_manager.settings.get("gemini_model") or os.getenv("GEMINI_MODEL") or "gemini-2.0-flash" 
-        
-        prompt_text = prompts.get("gemini_transcribe_prompt", "")
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+    def _model_name(self):
+        return config_manager.settings.get("gemini_model") or os.getenv("GEMINI_MODEL") or "gemini-2.0-flash"
 
+    def transcribe(self, audio, prompts: dict) -> str:
+        # Blocking entry point for callers off the inference loop
+        return event_loop.submit(self.transcribe_async(audio, prompts)).result()
+
+    async def transcribe_async(self, audio, prompts: dict) -> str:
         try:
-            mime_type, _ = mimetypes.guess_type(audio_path)
-            if not mime_type or not mime_type.startswith("audio/"):
-                mime_type = "audio/wav"
-
-            with open(audio_path, "rb") as f:
-                audio_bytes = f.read()
-                
-            # New SDK usage (v1/v0.x of google-genai)
-            # client.models.generate_content
-            response = self.client.models.generate_content(
+            # Encoding is CPU work; keep it off the loop
+            model_name, contents, config = await run_blocking(self._request, audio, prompts)
+            response = await call_stage("transcription", lambda: self.client.aio.models.generate_content(
                 model=model_name,
-                contents=[
-                    types.Content(
-                        parts=[
-                            types.Part.from_bytes(data=audio_bytes, mime_type=mime_type),
-                            types.Part.from_text(text=prompt_text)
-                        ]
-                    )
-                ],
-                config=types.GenerateContentConfig(temperature=0.0)
-            )
+                contents=contents,
+                config=config
+            ), "gemini")
             
             if response.text:
                 return response.text.strip()
@@ -60,3 +83,42 @@ class GeminiProvider(AIProvider):
         except Exception:
             logging.exception("Gemini Transcription Error")
             raise
+
+    async def transcribe_stream_async(self, audio, prompts: dict):
+        try:
+            model_name, contents, config = await run_blocking(self._request, audio, prompts)
+            # Only opening the stream is retried; text already handed out cannot be taken back
+            stream = await call_stage("transcription", lambda: self.client.aio.models.generate_content_stream(
+                model=model_name,
+                contents=contents,
+                config=config
+            ), "gemini")
+            async for chunk in iterate_stage("transcription", stream, "gemini"):
+                if chunk.text:
+                    yield chunk.text
+
+        except Exception:
+            logging.exception("Gemini Transcription Error")
+            raise
+
+    def _request(self, audio, prompts):
+        if not self.client:
+             raise RuntimeError("Gemini Client not initialized (Check API Key)")
+
+        model_name = self._model_name()
+        
+        prompt_text = prompts.get("gemini_transcribe_prompt", "")
+
+        _, audio_bytes, mime_type = self.encode_upload(audio)
+            
+        # New SDK usage (v1/v0.x of google-genai)
+        # client.models.generate_content
+        contents = [
+            types.Content(
+                parts=[
+                    types.Part.from_bytes(data=audio_bytes, mime_type=mime_type),
+                    types.Part.from_text(text=prompt_text)
+                ]
+            )
+        ]
+        return model_name, contents, types.GenerateContentConfig(temperature=0.0)
@@ -1,56 +1,127 @@
 import os
-from groq import Groq
+import logging
+from groq import AsyncGroq
 from src.core.config import config_manager
+from src.ai import event_loop
+from src.ai.event_loop import run_blocking
+from src.ai.resilience import call_stage, iterate_stage
 from src.ai.providers.base import AIProvider
+from src.ai.providers.http_pool import ConnectionPool
 
 class GroqProvider(AIProvider):
+    upload_formats = ("flac", "opus", "wav")
+    streams_output = True
+
+    @classmethod
+    def settings_key(cls):
+        return (config_manager.settings.get("groq_key") or os.getenv("GROQ_API_KEY"),)
+
+    @classmethod
+    def is_configured(cls):
+        return bool(cls.settings_key()[0])
+
     def __init__(self):
         self.api_key = config_manager.settings.get("groq_key") or os.getenv("GROQ_API_KEY")
-        self.client = None
+        self.async_client = None
+        self.pool = None
         if self.api_key:
             try:
                 # Groq client does not support 'proxies' arg directly in some versions or it's handled differently.
                 # Since we don't have proxy settings, just remove it.
-                self.client = Groq(api_key=self.api_key)
+                self.pool = ConnectionPool("groq")
+                # Retries and deadlines are handled per stage (src.ai.resilience)
+                self.async_client = AsyncGroq(api_key=self.api_key, http_client=self.pool.async_client,
+                                              timeout=self.pool.timeout, max_retries=0)
             except Exception as e:
                 print(f"Error initializing Groq client: {e}")
 
-    def transcribe(self, audio_path: str, prompts: dict) -> str:
-        if not self.client:
-            raise RuntimeError("Groq Client not initialized (Missing API Key?)")
+    async def open_connection(self):
+        if not self.async_client or not self.pool.needs_warming():
+            return
+        try:
+            # Cheapest authenticated call; leaves a TLS connection in the pool
+            await self.async_client.models.list()
+        except Exception as e:
+            logging.warning(f"Groq connection warm-up failed: {e}")
 
-        whisper_prompt = prompts.get("groq_whisper_prompt", "")
-        refine_system = prompts.get("groq_refine_system_prompt", "")
-
-        # 1. Transcribe
-        with open(audio_path, "rb") as file:
-            transcription = self.client.audio.transcriptions.create(
-                file=(audio_path, file.read()),
-                model="whisper-large-v3",
-                language="ja",
-                temperature=0.0,
-                prompt=whisper_prompt,
-                response_format="text"
-            )
-        raw_text = str(transcription)
-        
-        if not raw_text or not raw_text.strip() or raw_text == whisper_prompt:
-             return ""
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+    def transcribe(self, audio, prompts: dict) -> str:
+        # Blocking entry point for callers off the inference loop
+        return event_loop.submit(self.transcribe_async(audio, prompts)).result()
+
+    async def transcribe_async(self, audio, prompts: dict) -> str:
+        raw_text = await self._transcribe_raw_async(audio, prompts)
+        if not raw_text:
+            return ""
 
         # 2. Refine
-        completion = self.client.chat.completions.create(
+        completion = await call_stage("refine", lambda: self.async_client.chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=self._refine_messages(raw_text, prompts),
+            temperature=0.0,
+        ), "groq")
+        return completion.choices[0].message.content
+
+    async def transcribe_stream_async(self, audio, prompts: dict):
+        raw_text = await self._transcribe_raw_async(audio, prompts)
+        if not raw_text:
+            return
+
+        # 2. Refine, yielding tokens as the model produces them. Only opening
+        # the stream is retried; text already handed out cannot be taken back.
+        stream = await call_stage("refine", lambda: self.async_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": refine_system
-                },
-                {
-                    "role": "user", 
-                    "content": raw_text
-                }
-            ],
+            messages=self._refine_messages(raw_text, prompts),
+            temperature=0.0,
+            stream=True,
+        ), "groq")
+        async for chunk in iterate_stage("refine", stream, "groq"):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def _transcribe_raw_async(self, audio, prompts):
+        if not self.async_client:
+            raise RuntimeError("Groq Client not initialized (Missing API Key?)")
+
+        # 1. Transcribe (encoding is CPU work; keep it off the loop)
+        args = await run_blocking(self._transcription_args, audio, prompts)
+        transcription = await call_stage(
+            "transcription", lambda: self.async_client.audio.transcriptions.create(**args), "groq"
+        )
+        return self._raw_text(transcription, prompts)
+
+    def _transcription_args(self, audio, prompts):
+        filename, data, _ = self.encode_upload(audio)
+        return dict(
+            file=(filename, data),
+            model="whisper-large-v3",
+            language="ja",
             temperature=0.0,
+            prompt=prompts.get("groq_whisper_prompt", ""),
+            response_format="text"
         )
-        final_text = completion.choices[0].message.content
-        return final_text
+
+    def _raw_text(self, transcription, prompts):
+        raw_text = str(transcription)
+        
+        if not raw_text or not raw_text.strip() or raw_text == prompts.get("groq_whisper_prompt", ""):
+             return ""
+        return raw_text
+
+    def _refine_messages(self, raw_text, prompts):
+        return [
+            {
+                "role": "system", 
+                "content": prompts.get("groq_refine_system_prompt", "")
+            },
+            {
+                "role": "user", 
+                "content": raw_text
+            }
+        ]
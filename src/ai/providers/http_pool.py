@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+
+import httpx
+
+from src.core.config import config_manager
+from src.ai import event_loop
+
+# Long-lived httpx clients for the cloud providers. Connections are kept alive
+# between dictations, and the providers touch them on hold-key press
+# (AIProvider.open_connection) so DNS, TCP and TLS setup happen while the user
+# is still speaking. Every response logs whether it used a new or a reused
+# connection, with the running reuse rate. Provider calls all run on the
+# inference event loop, so the client is async and belongs to that loop.
+
+# Idle pooled connections are closed after this long
+KEEPALIVE_EXPIRY = 120.0
+MAX_KEEPALIVE_CONNECTIONS = 4
+# open_connection() is skipped if the pool was used this recently
+WARM_INTERVAL = 30.0
+
+
+class _ConnectionTrace:
+    # httpcore trace hook (awaited by the async transport): sees
+    # "connection.connect_tcp.started" only when the request had to open a
+    # new connection
+    def __init__(self):
+        self.new_connection = False
+
+    async def __call__(self, event_name, info):
+        if event_name.startswith("connection.connect_tcp") or event_name.startswith("connection.start_tls"):
+            self.new_connection = True
+
+
+def configured_timeout():
+    """httpx timeouts from providers.timeouts (connect, upload = write, read = the longest stage)."""
+    timeouts = config_manager.settings.get("providers", {}).get("timeouts", {})
+    connect = float(timeouts.get("connect", 5))
+    read = max(float(timeouts.get("transcription", 30)), float(timeouts.get("refine", 20)))
+    return httpx.Timeout(read, connect=connect, write=float(timeouts.get("upload", 20)), pool=connect)
+
+
+class ConnectionPool:
+    def __init__(self, name, timeout=None):
+        self.name = name
+        self._lock = threading.Lock()
+        self.new_connections = 0
+        self.reused_connections = 0
+        self._last_used = 0.0
+        self.timeout = timeout if timeout is not None else configured_timeout()
+        timeout = self.timeout
+        limits = httpx.Limits(
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        # Only used on the inference event loop (src.ai.event_loop)
+        self.async_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=limits,
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+
+    def needs_warming(self):
+        return time.monotonic() - self._last_used > WARM_INTERVAL
+
+    def reuse_rate(self):
+        with self._lock:
+            total = self.new_connections + self.reused_connections
+            return self.reused_connections / total if total else 0.0
+
+    def close(self):
+        """Close the pooled connections (on the inference loop, which owns them)."""
+        event_loop.submit(self.async_client.aclose())
+
+    async def _on_request(self, request):
+        self._last_used = time.monotonic()
+        request.extensions["trace"] = _ConnectionTrace()
+
+    async def _on_response(self, response):
+        trace = response.request.extensions.get("trace")
+        if not isinstance(trace, _ConnectionTrace):
+            return
+        with self._lock:
+            if trace.new_connection:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+            total = self.new_connections + self.reused_connections
+            reused = self.reused_connections
+        logging.info(
+            f"{self.name}: {'new' if trace.new_connection else 'reused'} connection for "
+            f"{response.request.url.path} (reuse {reused}/{total}, {reused / total:.0%})"
+        )
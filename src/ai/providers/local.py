@@ -1,9 +1,32 @@
 import os
+import io
 import logging
+import numpy as np
 from src.core.config import config_manager
 from src.ai.providers.base import AIProvider
+from src.ai.providers import local_tuning
 
 class LocalProvider(AIProvider):
+    # The model decodes one request at a time
+    max_concurrency = 1
+
+    @classmethod
+    def settings_key(cls):
+        local_settings = config_manager.settings.get("local", {})
+        # Resolved values, so a new benchmark result rebuilds the model
+        return (local_settings.get("model_size", "large-v3"),) + local_tuning.resolve(local_settings)
+
+    @classmethod
+    def prepare(cls):
+        # The benchmark loads every candidate configuration, so it never runs
+        # before the model is usable; see local_tuning.benchmark_in_background
+        local_tuning.benchmark_in_background(cls.benchmark)
+
+    @classmethod
+    def benchmark(cls, model_size, progress=None):
+        """Benchmark model_size on this machine and store the fastest configuration."""
+        return local_tuning.run_benchmark(model_size, progress)
+
     def __init__(self):
         try:
             from faster_whisper import WhisperModel
@@ -12,17 +35,34 @@ class LocalProvider(AIProvider):
         
         local_settings = config_manager.settings.get("local", {})
         model_size = local_settings.get("model_size", "large-v3")
-        device = local_settings.get("device", "cuda")
-        compute_type = local_settings.get("compute_type", "float16")
+        device, compute_type, cpu_threads, num_workers = local_tuning.resolve(local_settings)
         
-        logging.info(f"Loading Local Whisper Model: {model_size} on {device} ({compute_type})")
+        logging.info(f"Loading Local Whisper Model: {model_size} on {device} ({compute_type}, "
+                     f"threads={cpu_threads or 'auto'}, workers={num_workers})")
         try:
-            self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
+            self.model = WhisperModel(model_size, device=device, compute_type=compute_type,
+                                      cpu_threads=cpu_threads, num_workers=num_workers)
         except Exception as e:
             logging.error(f"Failed to load WhisperModel: {e}")
             raise e
 
-    def transcribe(self, audio_path: str, prompts: dict) -> str:
+        # Batched pipeline for long recordings: VAD-split chunks decoded together.
+        # It shares self.model, so keeping one around costs nothing.
+        self.batched = None
+        try:
+            from faster_whisper import BatchedInferencePipeline
+            self.batched = BatchedInferencePipeline(model=self.model)
+        except ImportError:
+            logging.warning("faster-whisper is too old for batched inference (needs 1.1+)")
+
+    def warm_up(self):
+        # A tiny decode initializes CTranslate2 (kernels, allocator, CUDA context)
+        # so the first real dictation does not pay for it.
+        segments, _ = self.model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1, language="ja")
+        for _ in segments:
+            pass
+
+    def transcribe(self, audio, prompts: dict) -> str:
         # prompt argument in transcribe is for initial prompt (context)
         # We can use the whisper prompt from settings if applicable, but typical whisper prompt is different.
         # But 'initial_prompt' is supported by faster-whisper.
@@ -31,15 +71,40 @@ class LocalProvider(AIProvider):
         # Whisper initial prompt is usually previous text or style guide.
         # faster-whisper 'initial_prompt'
         
-        segments, info = self.model.transcribe(
-            audio_path, 
-            beam_size=5, 
-            initial_prompt=whisper_prompt,
-            language="ja"
-        )
+        local_settings = config_manager.settings.get("local", {})
+        beam_size = max(1, int(local_settings.get("beam_size", 5)))
+        min_seconds = float(local_settings.get("batched_min_seconds", 15))
+
+        use_batched = local_settings.get("batched", True) and self.batched is not None
+        if use_batched and audio.duration >= min_seconds:
+            batch_size = max(1, int(local_settings.get("batch_size", 8)))
+            logging.info(f"Batched decode of {audio.duration:.1f} s (batch_size={batch_size}, beam_size={beam_size})")
+            segments, info = self.batched.transcribe(
+                self._to_model_input(audio),
+                batch_size=batch_size,
+                beam_size=beam_size,
+                initial_prompt=whisper_prompt,
+                language="ja"
+            )
+        else:
+            segments, info = self.model.transcribe(
+                self._to_model_input(audio), 
+                beam_size=beam_size, 
+                initial_prompt=whisper_prompt,
+                language="ja"
+            )
         
         text_segments = []
         for segment in segments:
             text_segments.append(segment.text)
             
         return "".join(text_segments).strip()
+
+    @staticmethod
+    def _to_model_input(audio):
+        # faster-whisper takes float32 mono 16 kHz arrays as-is; view the PCM
+        # without copying and only pay for the int16 -> float32 conversion.
+        if audio.sample_rate == 16000 and audio.channels == 1:
+            return np.frombuffer(audio, dtype=np.int16).astype(np.float32) / 32768.0
+        # Anything else goes through its own decoder/resampler.
+        return io.BytesIO(audio.to_wav_bytes())
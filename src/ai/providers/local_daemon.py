@@ -0,0 +1,194 @@
+import json
+import os
+import socket
+import struct
+import logging
+import tempfile
+import threading
+
+from src.core.config import config_manager
+from src.ai.providers.base import AIProvider
+
+# Client for the shared transcription daemon (python -m src.ai.daemon). Several
+# users on one machine then share a single loaded model instead of each process
+# loading its own.
+#
+# Wire format, both directions: 4-byte big-endian header length, a UTF-8 JSON
+# header, then header["bytes"] bytes of payload (int16 PCM for requests).
+#
+# The socket carries dictation audio, so by default it lives in a private
+# per-user directory and the client only talks to a daemon run by itself, root
+# or local.daemon_uid (checked with SO_PEERCRED before any audio is sent).
+
+PROTOCOL_VERSION = 1
+# Upper bound for a header; anything larger is a protocol error
+MAX_HEADER = 64 * 1024
+# Upper bound for a payload (about 30 minutes of 16 kHz mono PCM)
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+
+def default_socket_path():
+    """$XDG_RUNTIME_DIR/voice-in/whisperd.sock, or a per-user directory in the temp dir."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        directory = os.path.join(runtime_dir, "voice-in")
+    else:
+        directory = os.path.join(tempfile.gettempdir(), f"voice-in-{os.getuid()}")
+    return os.path.join(directory, "whisperd.sock")
+
+
+def socket_path():
+    return config_manager.settings.get("local", {}).get("daemon_socket") or default_socket_path()
+
+
+def peer_uid(sock):
+    """uid of the process at the other end of a Unix socket, or None if the OS cannot tell."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    except OSError:
+        return None
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid
+
+
+def trusted_uids():
+    """Users whose daemon may receive our audio: ourselves, root and local.daemon_uid."""
+    uids = {0, os.getuid()}
+    configured = config_manager.settings.get("local", {}).get("daemon_uid")
+    if configured not in (None, ""):
+        uids.add(int(configured))
+    return uids
+
+
+def send_message(sock, header, payload=b""):
+    header = dict(header, bytes=len(payload))
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """(header, payload), or (None, b"") if the peer closed the connection."""
+    prefix = _recv_exact(sock, 4)
+    if prefix is None:
+        return None, b""
+    (length,) = struct.unpack(">I", prefix)
+    if length > MAX_HEADER:
+        raise ValueError(f"Header too large: {length} bytes")
+    data = _recv_exact(sock, length)
+    if data is None:
+        raise ConnectionError("Connection closed in the middle of a message")
+    header = json.loads(data.decode("utf-8"))
+    if not isinstance(header, dict):
+        raise ValueError("Header is not an object")
+    size = header.get("bytes") or 0
+    if not isinstance(size, int) or size < 0:
+        raise ValueError(f"Invalid payload size: {size!r}")
+    if size > MAX_PAYLOAD:
+        raise ValueError(f"Payload too large: {size} bytes")
+    payload = b""
+    if size:
+        payload = _recv_exact(sock, size)
+        if payload is None:
+            raise ConnectionError("Connection closed in the middle of a message")
+    return header, payload
+
+
+def _recv_exact(sock, n):
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+class LocalDaemonProvider(AIProvider):
+    # The daemon decodes one request at a time anyway
+    max_concurrency = 1
+
+    @classmethod
+    def settings_key(cls):
+        return (socket_path(),)
+
+    def __init__(self):
+        self.path = socket_path()
+        # Connections of requests in progress, so cancel() can cut them off
+        self._lock = threading.Lock()
+        self._sockets = set()
+        if not os.path.exists(self.path):
+            raise RuntimeError(f"Transcription daemon is not running (no socket at {self.path})")
+
+    def warm_up(self):
+        header, _ = self._request({"op": "ping"})
+        logging.info(f"Transcription daemon ready: {header.get('model')} "
+                     f"({header.get('queued', 0)} request(s) queued)")
+
+    def transcribe(self, audio, prompts: dict) -> str:
+        header = {
+            "op": "transcribe",
+            "sample_rate": audio.sample_rate,
+            "channels": audio.channels,
+            "prompts": {"groq_whisper_prompt": prompts.get("groq_whisper_prompt", "")},
+        }
+        reply, _ = self._request(header, bytes(memoryview(audio)))
+        return reply.get("text", "")
+
+    def cancel(self):
+        # shutdown() wakes a thread blocked in send/recv on the socket; the
+        # daemon notices the closed connection once it has a reply to send
+        with self._lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _request(self, header, payload=b""):
+        timeout = float(config_manager.settings.get("local", {}).get("daemon_timeout_seconds", 300))
+        header = dict(header, version=PROTOCOL_VERSION, client=_client_name())
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                raise RuntimeError(f"Cannot reach transcription daemon at {self.path}: {e}")
+            self._check_peer(sock)
+            with self._lock:
+                self._sockets.add(sock)
+            try:
+                send_message(sock, header, payload)
+                reply, _ = recv_message(sock)
+            finally:
+                with self._lock:
+                    self._sockets.discard(sock)
+        if reply is None:
+            raise RuntimeError("Transcription daemon closed the connection")
+        if not reply.get("ok"):
+            raise RuntimeError(f"Transcription daemon: {reply.get('error', 'unknown error')}")
+        return reply, b""
+
+    def _check_peer(self, sock):
+        # Anyone can create a socket at a guessable path; make sure it is our daemon
+        uid = peer_uid(sock)
+        if uid is None:
+            uid = os.stat(self.path).st_uid
+        if uid not in trusted_uids():
+            raise RuntimeError(
+                f"Refusing to send audio to {self.path}: it is served by uid {uid}, "
+                f"not by you, root or local.daemon_uid"
+            )
+
+
+def _client_name():
+    # Only used when the daemon cannot read peer credentials (non-Linux)
+    try:
+        return os.getlogin()
+    except OSError:
+        return str(os.getuid()) if hasattr(os, "getuid") else "unknown"
@@ -0,0 +1,197 @@
+import logging
+import multiprocessing
+import threading
+import weakref
+
+import numpy as np
+
+from src.core.config import config_manager
+from src.ai.providers.base import AIProvider
+from src.ai.providers.local import LocalProvider
+from src.ai.providers import local_tuning
+
+# LocalProvider hosted in a child process. Decoding (and the Python-side segment
+# iteration) then never competes with the Qt event loop for the GIL, a crash in
+# CTranslate2 only takes the worker down, and restarting the worker gives all
+# model memory back to the OS.
+
+# How long to wait for the worker to exit on shutdown before killing it
+_SHUTDOWN_TIMEOUT = 2.0
+
+
+class LocalProcessProvider(AIProvider):
+    # The model decodes one request at a time
+    max_concurrency = 1
+
+    @classmethod
+    def settings_key(cls):
+        return LocalProvider.settings_key()
+
+    @classmethod
+    def prepare(cls):
+        local_tuning.benchmark_in_background(cls.benchmark)
+
+    @classmethod
+    def benchmark(cls, model_size, progress=None):
+        """
+        LocalProvider.benchmark() in a short-lived worker process, so the
+        candidate models are never loaded into this one. The result comes
+        back over the pipe and is stored here.
+        """
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(child_conn,), name="local-whisper-benchmark", daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            parent_conn.send(("benchmark", model_size, _local_settings()))
+            while True:
+                status, value = parent_conn.recv()
+                if status != "progress":
+                    break
+                if progress:
+                    progress(*value)
+        except (EOFError, OSError) as e:
+            process.join(_SHUTDOWN_TIMEOUT)
+            raise RuntimeError(f"Local Whisper benchmark worker crashed (exit code {process.exitcode}): {e}")
+        finally:
+            _shutdown(process, parent_conn)
+        if status == "error":
+            raise RuntimeError(value)
+        local_tuning.store(value)
+        return value
+
+    def __init__(self):
+        # One request at a time over the pipe
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._finalizer = None
+        with self._lock:
+            self._spawn()
+
+    def restart(self):
+        """Stop the worker (releasing the model) and start a fresh one."""
+        with self._lock:
+            self._stop_worker()
+            self._spawn()
+
+    def close(self):
+        with self._lock:
+            self._stop_worker()
+
+    def cancel(self):
+        # Without the lock, which the stuck request holds. Killing the worker
+        # ends that request's recv() with EOF; it then closes the pipe and
+        # releases the lock, and the next _call() starts a fresh worker.
+        process = self._process
+        if process is not None and process.is_alive():
+            logging.warning(f"Killing local Whisper worker (pid {process.pid}) after a timeout")
+            process.kill()
+
+    def warm_up(self):
+        self._call("warm_up")
+
+    def transcribe(self, audio, prompts: dict) -> str:
+        pcm = bytes(memoryview(audio))
+        return self._call("transcribe", pcm, audio.sample_rate, audio.channels, prompts, _local_settings())
+
+    def _call(self, kind, *args):
+        with self._lock:
+            if self._process is None:
+                # The previous worker crashed; start over
+                self._spawn()
+            return self._request(kind, *args)
+
+    def _spawn(self):
+        # Caller holds self._lock
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(child_conn,), name="local-whisper", daemon=True)
+        process.start()
+        child_conn.close()
+        self._process = process
+        self._conn = parent_conn
+        self._finalizer = weakref.finalize(self, _shutdown, process, parent_conn)
+        logging.info(f"Started local Whisper worker (pid {process.pid})")
+        # Load now, so a bad model/device fails here as it does in-process
+        self._request("load", _local_settings())
+
+    def _request(self, kind, *args):
+        # Caller holds self._lock
+        try:
+            self._conn.send((kind,) + args)
+            status, value = self._conn.recv()
+        except (EOFError, OSError) as e:
+            exit_code = self._process.exitcode
+            logging.error(f"Local Whisper worker died (exit code {exit_code}): {e}")
+            self._stop_worker()
+            raise RuntimeError(f"Local Whisper worker crashed (exit code {exit_code})")
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def _stop_worker(self):
+        if self._finalizer is not None:
+            self._finalizer()
+        self._process = None
+        self._conn = None
+        self._finalizer = None
+
+
+def _local_settings():
+    # The worker uses the GUI process's view of the settings, not its own copy
+    return dict(config_manager.settings.get("local", {}))
+
+
+def _shutdown(process, conn):
+    try:
+        conn.send(("stop",))
+    except (OSError, ValueError):
+        pass
+    conn.close()
+    process.join(_SHUTDOWN_TIMEOUT)
+    if process.is_alive():
+        process.terminate()
+        process.join(_SHUTDOWN_TIMEOUT)
+    logging.info(f"Local Whisper worker (pid {process.pid}) stopped")
+
+
+def _worker_main(conn):
+    """Entry point of the worker process: handles one request at a time until "stop"."""
+    from rust_core import AudioBuffer
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [local-whisper] %(message)s")
+    provider = None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind, args = message[0], message[1:]
+        if kind == "stop":
+            break
+        try:
+            result = None
+            if kind == "load":
+                config_manager.settings["local"] = args[0]
+                provider = LocalProvider()
+            elif kind == "benchmark":
+                model_size, local_settings = args
+                config_manager.settings["local"] = local_settings
+                result = local_tuning.measure(
+                    model_size, progress=lambda done, total, label: conn.send(("progress", (done, total, label))),
+                )
+            elif kind == "warm_up":
+                provider.warm_up()
+            elif kind == "transcribe":
+                pcm, sample_rate, channels, prompts, local_settings = args
+                config_manager.settings["local"] = local_settings
+                audio = AudioBuffer(np.frombuffer(pcm, dtype=np.int16), sample_rate, channels)
+                result = provider.transcribe(audio, prompts)
+            else:
+                raise ValueError(f"Unknown request: {kind}")
+            conn.send(("ok", result))
+        except Exception as e:
+            logging.exception(f"Request {kind} failed")
+            conn.send(("error", f"{type(e).__name__}: {e}"))
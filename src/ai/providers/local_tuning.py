@@ -0,0 +1,265 @@
+import os
+import time
+import functools
+import logging
+import platform
+import threading
+
+import numpy as np
+
+from src.core.config import config_manager
+
+# Hardware detection and a short benchmark that picks the fastest faster-whisper
+# configuration for this machine. Used when local.device / local.compute_type
+# are "auto"; the winner is stored under local.tuned in settings.json.
+
+# Compute types tried on each device, in order of preference on ties
+CPU_COMPUTE_TYPES = ("int8", "int8_float32", "float32")
+CUDA_COMPUTE_TYPES = ("float16", "int8_float16", "int8")
+
+# Length of the synthetic clip decoded by the benchmark
+BENCH_SECONDS = 8
+SAMPLE_RATE = 16000
+
+_background_lock = threading.Lock()
+# Model sizes with a background benchmark running
+_background = set()
+
+
+@functools.lru_cache(maxsize=1)
+def detect_hardware():
+    """
+    Devices and CPU features visible to CTranslate2, as a dict:
+    cpu (model name), cpu_count, cpu_flags, cuda_devices,
+    compute_types ({device: [types]}) and a signature string.
+    """
+    cpu_name = platform.processor() or platform.machine()
+    flags = set()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name") and ":" in line:
+                    cpu_name = line.split(":", 1)[1].strip()
+                elif line.startswith("flags") and ":" in line:
+                    flags = set(line.split(":", 1)[1].split())
+                if flags and cpu_name:
+                    break
+    except OSError:
+        pass
+    interesting = [f for f in ("avx2", "fma", "avx512f", "avx512_vnni", "avx_vnni", "amx_int8") if f in flags]
+
+    cuda_devices = 0
+    compute_types = {}
+    try:
+        import ctranslate2
+        cuda_devices = ctranslate2.get_cuda_device_count()
+        compute_types["cpu"] = sorted(ctranslate2.get_supported_compute_types("cpu"))
+        if cuda_devices:
+            compute_types["cuda"] = sorted(ctranslate2.get_supported_compute_types("cuda"))
+    except Exception as e:
+        logging.warning(f"Could not query CTranslate2 devices: {e}")
+        compute_types["cpu"] = list(CPU_COMPUTE_TYPES)
+
+    cpu_count = os.cpu_count() or 1
+    return {
+        "cpu": cpu_name,
+        "cpu_count": cpu_count,
+        "cpu_flags": interesting,
+        "cuda_devices": cuda_devices,
+        "compute_types": compute_types,
+        "signature": f"{cpu_name} x{cpu_count} cuda={cuda_devices}",
+    }
+
+
+def default_settings(hardware=None):
+    """Reasonable configuration without benchmarking: the GPU if there is one, else int8 on the CPU."""
+    hardware = hardware or detect_hardware()
+    if hardware["cuda_devices"]:
+        return {"device": "cuda", "compute_type": "float16", "cpu_threads": 0, "num_workers": 1}
+    return {"device": "cpu", "compute_type": "int8", "cpu_threads": 0, "num_workers": 1}
+
+
+def candidates(hardware):
+    """(device, compute_type, cpu_threads, num_workers) combinations worth timing."""
+    result = []
+    supported = hardware["compute_types"]
+    for compute_type in CUDA_COMPUTE_TYPES:
+        if compute_type in supported.get("cuda", ()):
+            result.append(("cuda", compute_type, 0, 1))
+
+    logical = hardware["cpu_count"]
+    thread_counts = sorted({max(1, logical // 2), logical})
+    worker_counts = [1, 2] if logical >= 8 else [1]
+    for compute_type in CPU_COMPUTE_TYPES:
+        if compute_type not in supported.get("cpu", ()):
+            continue
+        for workers in worker_counts:
+            for threads in thread_counts:
+                # Workers share the cores; don't oversubscribe
+                if workers * threads > logical:
+                    continue
+                result.append(("cpu", compute_type, threads, workers))
+    return result
+
+
+def _bench_clip():
+    # Deterministic speech-like signal: a glottal-pulse-ish harmonic stack with
+    # syllable-rate amplitude modulation, so the decoder does real work.
+    t = np.arange(BENCH_SECONDS * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    f0 = 140.0 + 30.0 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0.0, None)
+    rng = np.random.default_rng(0)
+    clip = 0.2 * voice * envelope + 0.01 * rng.standard_normal(t.shape)
+    return clip.astype(np.float32)
+
+
+def run_benchmark(model_size, progress=None):
+    """
+    Time every candidate on a short clip and store the fastest under
+    local.tuned. progress(done, total, message) is called between runs.
+    Returns the stored result dict. Takes a while: each candidate loads the model.
+    """
+    tuned = measure(model_size, progress)
+    store(tuned)
+    return tuned
+
+
+def measure(model_size, progress=None):
+    """run_benchmark() without storing the result."""
+    from faster_whisper import WhisperModel
+
+    hardware = detect_hardware()
+    combos = candidates(hardware)
+    clip = _bench_clip()
+    results = []
+    logging.info(f"Benchmarking {len(combos)} configurations of {model_size} on {hardware['signature']}")
+
+    for i, (device, compute_type, threads, workers) in enumerate(combos):
+        label = f"{device} {compute_type} threads={threads or 'auto'} workers={workers}"
+        if progress:
+            progress(i, len(combos), label)
+        try:
+            model = WhisperModel(model_size, device=device, compute_type=compute_type,
+                                 cpu_threads=threads, num_workers=workers)
+            # First decode pays one-time initialization; time the second
+            _decode(model, clip[:SAMPLE_RATE])
+            started = time.perf_counter()
+            _decode(model, clip)
+            seconds = time.perf_counter() - started
+            del model
+        except Exception as e:
+            logging.warning(f"Benchmark {label} failed: {e}")
+            continue
+        rtf = seconds / BENCH_SECONDS
+        logging.info(f"Benchmark {label}: {seconds:.2f} s (RTF {rtf:.2f})")
+        results.append({
+            "device": device, "compute_type": compute_type,
+            "cpu_threads": threads, "num_workers": workers, "rtf": round(rtf, 3),
+        })
+
+    if progress:
+        progress(len(combos), len(combos), "")
+    if not results:
+        raise RuntimeError("No faster-whisper configuration could be loaded")
+
+    best = min(results, key=lambda r: r["rtf"])
+    tuned = dict(best)
+    tuned.update({
+        "model_size": model_size,
+        "hardware": hardware["signature"],
+        "cpu_flags": hardware["cpu_flags"],
+        "results": results,
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    logging.info(f"Fastest configuration: {best}")
+    return tuned
+
+
+def store(tuned):
+    config_manager.update_settings({"local": {"tuned": tuned}})
+
+
+def benchmark_in_background(benchmark):
+    """
+    With local.auto_benchmark on, "auto" device/compute type and no stored
+    result for this model and machine, start benchmark(model_size) on a
+    background thread. Until it finishes resolve() uses default_settings();
+    afterwards a loaded local model is rebuilt with the winner.
+    """
+    local_settings = config_manager.settings.get("local", {})
+    if not local_settings.get("auto_benchmark", False):
+        return
+    if "auto" not in (local_settings.get("device"), local_settings.get("compute_type")):
+        return
+    model_size = local_settings.get("model_size", "large-v3")
+    if tuned_settings(model_size) is not None:
+        return
+    with _background_lock:
+        if model_size in _background:
+            return
+        _background.add(model_size)
+
+    def _run():
+        try:
+            benchmark(model_size)
+        except Exception as e:
+            logging.error(f"Local Whisper benchmark failed: {e}")
+            return
+        finally:
+            with _background_lock:
+                _background.discard(model_size)
+        # Imported here: the registry imports the local providers
+        from src.ai.providers import registry
+        registry.reload_stale("local")
+
+    logging.info(f"Benchmarking {model_size} in the background; using {default_settings()} meanwhile")
+    threading.Thread(target=_run, name="local-benchmark", daemon=True).start()
+
+
+def _decode(model, clip):
+    segments, _ = model.transcribe(clip, beam_size=1, language="ja", without_timestamps=True,
+                                   condition_on_previous_text=False, max_new_tokens=64)
+    for _ in segments:
+        pass
+
+
+def tuned_settings(model_size, hardware=None):
+    """Stored benchmark result if it was made for this model size and machine, else None."""
+    tuned = config_manager.settings.get("local", {}).get("tuned") or {}
+    if tuned.get("model_size") != model_size:
+        return None
+    hardware = hardware or detect_hardware()
+    if tuned.get("hardware") != hardware["signature"]:
+        return None
+    return tuned
+
+
+def resolve(local_settings):
+    """
+    Effective WhisperModel arguments (device, compute_type, cpu_threads,
+    num_workers) for the local settings, filling "auto" values from the
+    stored benchmark result or the hardware defaults.
+    """
+    model_size = local_settings.get("model_size", "large-v3")
+    device = local_settings.get("device", "auto")
+    compute_type = local_settings.get("compute_type", "auto")
+    cpu_threads = int(local_settings.get("cpu_threads", 0) or 0)
+    num_workers = int(local_settings.get("num_workers", 1) or 1)
+
+    if device != "auto" and compute_type != "auto":
+        return device, compute_type, cpu_threads, num_workers
+
+    hardware = detect_hardware()
+    chosen = tuned_settings(model_size, hardware) or default_settings(hardware)
+    if device != "auto" and chosen["device"] != device:
+        # Device pinned, compute type left to us
+        chosen = {"device": device, "compute_type": "float16" if device == "cuda" else "int8",
+                  "cpu_threads": cpu_threads, "num_workers": num_workers}
+    return (
+        chosen["device"],
+        chosen["compute_type"] if compute_type == "auto" else compute_type,
+        chosen.get("cpu_threads", 0),
+        chosen.get("num_workers", 1),
+    )
@@ -0,0 +1,176 @@
+import gc
+import logging
+import threading
+import time
+
+from src.core.config import config_manager
+from src.ai.providers.groq import GroqProvider
+from src.ai.providers.gemini import GeminiProvider
+from src.ai.providers.local import LocalProvider
+from src.ai.providers.local_process import LocalProcessProvider
+from src.ai.providers.local_daemon import LocalDaemonProvider
+
+# Process-wide cache of provider instances, so API clients and the local Whisper
+# model survive across dictations. An entry is rebuilt when the settings it was
+# built from change and dropped after providers.idle_timeout_seconds unused.
+
+PROVIDERS = {
+    "groq": GroqProvider,
+    "gemini": GeminiProvider,
+    "local": LocalProvider,
+}
+
+# How often the idle sweeper looks for unused entries
+_SWEEP_INTERVAL = 30.0
+
+_lock = threading.Lock()
+_entries = {}  # name -> _Entry
+# One build at a time per provider, so a preload and a dictation never load the same model twice
+_build_locks = {name: threading.Lock() for name in PROVIDERS}
+_sweeper_started = False
+
+
+def provider_class(name):
+    cls = PROVIDERS.get(name)
+    if cls is LocalProvider:
+        local_settings = config_manager.settings.get("local", {})
+        if local_settings.get("use_daemon", False):
+            return LocalDaemonProvider
+        if local_settings.get("out_of_process", True):
+            return LocalProcessProvider
+    return cls
+
+
+class _Entry:
+    def __init__(self, key, provider):
+        self.key = key
+        self.provider = provider
+        self.last_used = time.monotonic()
+
+
+def get_provider(name):
+    """
+    Shared provider instance for name ("groq", "gemini" or "local"), built on
+    first use or when its settings (API key, model size, device, ...) changed.
+    """
+    cls = provider_class(name)
+    if cls is None:
+        raise ValueError(f"Unknown provider: {name}")
+
+    # The class is part of the key: switching in/out of process rebuilds too
+    key = (cls, cls.settings_key())
+    with _build_locks[name]:
+        with _lock:
+            entry = _entries.get(name)
+            if entry is not None and entry.key == key:
+                entry.last_used = time.monotonic()
+                return entry.provider
+            stale = _entries.pop(name, None)
+
+        if stale is not None:
+            logging.info(f"Settings for {name} provider changed; rebuilding")
+            # Drop the old client/model before building the new one
+            _close([stale])
+            del stale
+            gc.collect()
+
+        started = time.monotonic()
+        provider = cls()
+        logging.info(f"Built {name} provider in {time.monotonic() - started:.2f} s")
+        with _lock:
+            _entries[name] = _Entry(key, provider)
+        _start_sweeper()
+        return provider
+
+
+def preload(name):
+    """Build (if needed) and warm up name's provider. Blocks; call from a worker thread."""
+    if is_loaded(name):
+        return get_provider(name)
+    started = time.monotonic()
+    cls = provider_class(name)
+    if cls is not None:
+        cls.prepare()
+    provider = get_provider(name)
+    provider.warm_up()
+    logging.info(f"Preloaded {name} provider in {time.monotonic() - started:.2f} s")
+    return provider
+
+
+def reload_stale(name):
+    """Rebuild and warm up name's provider if a cached instance no longer matches the settings."""
+    with _lock:
+        cached = name in _entries
+    if cached and not is_loaded(name):
+        preload(name)
+
+
+def is_configured(name):
+    """True if name's provider could be used with the current settings."""
+    cls = provider_class(name)
+    return cls is not None and cls.is_configured()
+
+
+def is_loaded(name):
+    """True if name has a cached instance matching the current settings."""
+    cls = provider_class(name)
+    if cls is None:
+        return False
+    with _lock:
+        entry = _entries.get(name)
+        return entry is not None and entry.key == (cls, cls.settings_key())
+
+
+def evict(name=None):
+    """Drop the cached instance of name (all providers if None)."""
+    with _lock:
+        names = list(_entries) if name is None else [name]
+        dropped = [_entries.pop(n) for n in names if n in _entries]
+    if dropped:
+        logging.info(f"Unloaded provider(s): {', '.join(names)}")
+        _close(dropped)
+        del dropped
+        gc.collect()
+
+
+def evict_idle():
+    timeout = float(config_manager.settings.get("providers", {}).get("idle_timeout_seconds", 0) or 0)
+    if timeout <= 0:
+        return
+    now = time.monotonic()
+    with _lock:
+        idle = [n for n, e in _entries.items() if now - e.last_used >= timeout]
+        # Idle for the whole timeout, so no dictation is using these
+        dropped = [_entries.pop(n) for n in idle]
+    if dropped:
+        logging.info(f"Unloaded provider(s) idle for {timeout:.0f} s: {', '.join(idle)}")
+        _close(dropped)
+        del dropped
+        gc.collect()
+
+
+def _close(entries):
+    # Called without _lock held; closing a local worker waits for its current request
+    for entry in entries:
+        try:
+            entry.provider.close()
+        except Exception as e:
+            logging.warning(f"Closing {type(entry.provider).__name__} failed: {e}")
+
+
+def _start_sweeper():
+    global _sweeper_started
+    with _lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+
+    def _sweep():
+        while True:
+            time.sleep(_SWEEP_INTERVAL)
+            try:
+                evict_idle()
+            except Exception as e:
+                logging.error(f"Provider idle sweep failed: {e}")
+
+    threading.Thread(target=_sweep, name="provider-sweeper", daemon=True).start()
@@ -0,0 +1,173 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+
+from src.core.config import config_manager
+
+# Deadlines, retries and circuit breakers for provider calls.
+#
+# Cloud providers run each stage of a request (transcription, refine) through
+# call_stage(): every attempt gets the stage's deadline, and transient failures
+# (timeouts, connection errors, 429/5xx) are retried with jittered exponential
+# backoff. Blocking providers (local model, daemon) get the "local" deadline
+# without retries. AIWorker reports successes and transient failures of each
+# provider call to that provider's CircuitBreaker. Failing over to another
+# provider is opt-in: only the providers listed for the primary in
+# providers.failover are ever tried, while its circuit is open or after a
+# transient failure.
+
+# HTTP statuses worth retrying
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# SDK exception names for network-level failures (groq, google-genai)
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "ServerError"}
+MAX_BACKOFF = 5.0
+
+
+def _settings():
+    return config_manager.settings.get("providers", {})
+
+
+def stage_timeout(stage):
+    """Deadline in seconds for one attempt at stage ("transcription", "refine", ...)."""
+    timeouts = _settings().get("timeouts", {})
+    return float(timeouts.get(stage, 30))
+
+
+def is_transient(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in TRANSIENT_STATUS:
+        return True
+    for cls in type(error).__mro__:
+        if cls.__name__ in TRANSIENT_ERRORS:
+            return True
+        # httpx.TransportError covers connect/read/write timeouts and resets
+        if cls.__name__ == "TransportError" and cls.__module__.startswith("httpx"):
+            return True
+    return False
+
+
+async def call_stage(stage, make_call, provider, retries=None):
+    """
+    Await make_call() under the stage deadline, retrying transient failures
+    (providers.retries times unless retries is given). make_call must return
+    a new coroutine on every call.
+    """
+    settings = _settings()
+    if retries is None:
+        retries = settings.get("retries", 2)
+    retries = max(0, int(retries))
+    backoff = float(settings.get("retry_backoff_ms", 400)) / 1000.0
+    timeout = stage_timeout(stage)
+    for attempt in range(retries + 1):
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(make_call(), timeout)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = TimeoutError(f"{provider} {stage} timed out after {timeout:g} s")
+            if attempt >= retries or not is_transient(e):
+                raise e
+            # Full jitter, so clients that failed together do not retry together
+            delay = random.uniform(0, min(MAX_BACKOFF, backoff * 2 ** attempt))
+            logging.warning(
+                f"{provider} {stage} failed after {time.monotonic() - started:.2f} s ({e}); "
+                f"retry {attempt + 1}/{retries} in {delay:.2f} s"
+            )
+            await asyncio.sleep(delay)
+
+
+async def iterate_stage(stage, stream, provider):
+    """Yield from an async iterator, failing if any item takes longer than the stage deadline."""
+    timeout = stage_timeout(stage)
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{provider} {stage} stalled for {timeout:g} s")
+        yield item
+
+
+class CircuitBreaker:
+    """
+    closed: requests flow. open: after `threshold` consecutive failures,
+    requests are routed elsewhere for `cooldown` seconds. Then half-open:
+    requests are let through again as trials; a success closes the breaker,
+    a failure opens it for another cool-down.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allows(self):
+        cooldown = float(_settings().get("breaker_cooldown_seconds", 60))
+        with self._lock:
+            return self.opened_at is None or time.monotonic() - self.opened_at >= cooldown
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.allows() else "open"
+
+    def record_success(self):
+        with self._lock:
+            was_open = self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+        if was_open:
+            logging.info(f"Circuit for {self.name} closed again")
+
+    def record_failure(self):
+        threshold = max(1, int(_settings().get("breaker_threshold", 3)))
+        with self._lock:
+            self.failures += 1
+            if self.failures < threshold:
+                return
+            # Trip (or re-trip after a failed half-open trial)
+            self.opened_at = time.monotonic()
+            failures = self.failures
+        logging.warning(f"Circuit for {self.name} opened after {failures} consecutive failure(s)")
+
+
+_breakers_lock = threading.Lock()
+_breakers = {}
+
+
+def should_fail_over(name, error):
+    """True if a request that failed at name with error may move on to another provider."""
+    return is_transient(error) or not breaker(name).allows()
+
+
+def breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def candidates(primary, is_configured):
+    """
+    Providers to try for a request, in order: primary, then the ones listed
+    for it in providers.failover, skipping any whose circuit is open.
+    is_configured(name) filters out failovers that cannot work (e.g. no API
+    key). Never empty.
+    """
+    failover = (_settings().get("failover") or {}).get(primary) or []
+    order = [primary] + [n for n in failover if n != primary and is_configured(n)]
+    healthy = [n for n in order if breaker(n).allows()]
+    if not healthy:
+        # Everything is failing; keep trying the primary rather than nothing
+        return [primary]
+    if healthy[0] != primary:
+        logging.info(f"Circuit for {primary} is open; routing to {healthy[0]}")
+    return healthy
@@ -1,40 +1,334 @@
 from PyQt6.QtCore import QObject, pyqtSignal
+import asyncio
 import logging
+import threading
+import time
 import traceback
 import io
 
 from src.core.config import config_manager
-from src.ai.providers.groq import GroqProvider
-from src.ai.providers.gemini import GeminiProvider
-from src.ai.providers.local import LocalProvider
+from src.ai import event_loop
+from src.ai import hedging
+from src.ai import resilience
+from src.ai.providers import registry
+
+# How long run() waits for a segment the recorder has reported but not yet delivered
+SEGMENT_DELIVERY_TIMEOUT = 10.0
+
+# Streamed text is handed out after these (a "." only when followed by whitespace)
+SENTENCE_ENDS = "。．！？!?"
+# Hand out pending text anyway once this much has piled up without a sentence end
+MAX_PENDING_CHARS = 80
 
 class AIWorker(QObject):
+    """
+    One transcription. start() runs it on the shared inference event loop
+    (src.ai.event_loop); the signals are emitted from the loop thread and
+    delivered to receivers on their own (GUI) thread.
+    """
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
+    # Sentence-sized pieces of the result while it is still being generated (stream mode)
+    partial = pyqtSignal(str)
 
-    def __init__(self, provider_name, audio_path, prompts):
+    def __init__(self, provider_name, audio, prompts, stream=False):
         super().__init__()
         self.provider_name = provider_name
-        self.audio_path = audio_path
+        self.audio = audio
         self.prompts = prompts
+        # Emit partial() as text arrives; finished() then carries the concatenation
+        self.stream = stream
         self.provider = None
+        # Segments transcribed while recording: index -> concurrent.futures.Future
+        self._segments = {}
+        self._segments_lock = threading.Lock()
+        # index -> asyncio.Future resolved when that segment is dispatched (loop thread only)
+        self._segment_waiters = {}
+        self._segment_count = 0
+        self._final_segment = None
+        self._future = None
+        # (backup provider, settings) in race mode; read once per dictation
+        self._race = hedging.race_settings(provider_name)
+
+    async def _get_provider(self):
+        # Shared across dictations; only built on first use or after a settings
+        # change. Building can load a model, so it runs off the loop.
+        self.provider = await event_loop.run_blocking(registry.get_provider, self.provider_name)
+        return self.provider
+
+    def submit_segment(self, index, audio):
+        """
+        Transcribe a finished piece of a recording in the background while
+        recording continues. Called from the recorder's segment thread.
+        """
+        logging.info(f"Dispatching segment {index} ({audio.duration:.1f} s)")
+        future = event_loop.submit(self._transcribe(audio))
+        with self._segments_lock:
+            self._segments[index] = future
+        event_loop.get_loop().call_soon_threadsafe(self._segment_dispatched, index, future)
+
+    def finish_segments(self, segment_count, final_segment):
+        """
+        Set once recording has stopped: how many segments were delivered and
+        the audio after the last one. With no segments, the worker transcribes
+        self.audio as a whole.
+        """
+        self._segment_count = segment_count
+        self._final_segment = final_segment
+
+    def start(self):
+        """Run the transcription; the result arrives through finished() or error()."""
+        self._future = event_loop.submit(self._run())
+
+    def cancel(self):
+        if self._future is not None:
+            self._future.cancel()
+        self._cancel_segments()
+
+    def _cancel_segments(self):
+        with self._segments_lock:
+            futures = list(self._segments.values())
+        for future in futures:
+            future.cancel()
+
+    async def _transcribe(self, audio):
+        provider = await self._get_provider()
+        if self._race is not None:
+            backup, settings = self._race
+            # A second attempt at a provider that decodes one request at a
+            # time would only queue behind the first
+            if not (backup == self.provider_name and provider.max_concurrency == 1):
+                return await hedging.race(
+                    self.provider_name, backup, lambda name: self._transcribe_with(name, audio), settings
+                )
+        return await self._transcribe_with(self.provider_name, audio)
 
-    def run(self):
+    async def _transcribe_with(self, name, audio):
+        # name, or the next provider in providers.failover while name's circuit
+        # is open; a transient failure falls through to the next candidate too
+        names = resilience.candidates(name, registry.is_configured)
+        for i, candidate in enumerate(names):
+            try:
+                provider = await event_loop.run_blocking(registry.get_provider, candidate)
+                async with event_loop.limiter(provider):
+                    text = await provider.transcribe_async(audio, self.prompts)
+            except Exception as e:
+                # Only an unhealthy service should open the circuit, not e.g. a rejected request
+                if resilience.is_transient(e):
+                    resilience.breaker(candidate).record_failure()
+                if i + 1 >= len(names) or not resilience.should_fail_over(candidate, e):
+                    raise
+                logging.warning(f"{candidate} failed ({e}); falling back to {names[i + 1]}")
+                continue
+            resilience.breaker(candidate).record_success()
+            return text
+
+    async def _transcribe_stream(self, audio):
+        # Like _transcribe_with, but once text has been handed out there is no
+        # falling back: it may already be pasted
+        names = resilience.candidates(self.provider_name, registry.is_configured)
+        for i, candidate in enumerate(names):
+            streamed = False
+            try:
+                provider = await event_loop.run_blocking(registry.get_provider, candidate)
+                async with event_loop.limiter(provider):
+                    async for piece in provider.transcribe_stream_async(audio, self.prompts):
+                        streamed = True
+                        yield piece
+            except Exception as e:
+                if resilience.is_transient(e):
+                    resilience.breaker(candidate).record_failure()
+                if streamed or i + 1 >= len(names) or not resilience.should_fail_over(candidate, e):
+                    raise
+                logging.warning(f"{candidate} failed ({e}); falling back to {names[i + 1]}")
+                continue
+            resilience.breaker(candidate).record_success()
+            return
+
+    async def _run(self):
+        limit = int(config_manager.settings.get("providers", {}).get("max_concurrent_jobs", 2) or 0)
+        async with event_loop.job_slot(self.provider_name, limit):
+            await self._run_job()
+
+    async def _run_job(self):
         try:
-            if self.provider_name == "groq":
-                self.provider = GroqProvider()
-            elif self.provider_name == "gemini":
-                self.provider = GeminiProvider()
-            elif self.provider_name == "local":
-                self.provider = LocalProvider()
-            else:
-                raise ValueError(f"Unknown provider: {self.provider_name}")
+            provider = await self._get_provider()
 
             logging.info(f"Starting transcription with {self.provider_name}")
-            text = self.provider.transcribe(self.audio_path, self.prompts)
+            # Race mode compares whole answers, so it does not stream
+            stream = self.stream and self._race is None
+            if self._segment_count and stream:
+                text = await self._stream_segments(provider)
+            elif self._segment_count:
+                text = await self._stitch_segments()
+            elif stream and provider.streams_output:
+                text = await self._stream_text(self._transcribe_stream(self.audio))
+            else:
+                text = await self._transcribe(self.audio)
             logging.info(f"Transcription finished: {len(text)} chars")
             self.finished.emit(text)
 
         except Exception as e:
             logging.error(f"AIWorker Error: {traceback.format_exc()}")
             self.error.emit(str(e))
+        finally:
+            self._cancel_segments()
+            # Let the registry decide how long the provider lives
+            self.provider = None
+
+    async def _stitch_segments(self):
+        # The final piece runs while earlier ones may still be in flight
+        final = None
+        if self._final_segment is not None:
+            final = asyncio.ensure_future(self._transcribe(self._final_segment))
+        try:
+            parts = [await self._segment_result(index) for index in range(self._segment_count)]
+            parts.append(await final if final is not None else "")
+        except BaseException:
+            if final is not None:
+                final.cancel()
+            raise
+        logging.info(f"Stitched {self._segment_count} segment(s) and the final piece")
+        return _join_texts(parts)
+
+    async def _stream_segments(self, provider):
+        # Segments are handed out in order as soon as each is ready, then the
+        # final piece is streamed. Unlike _stitch_segments the final piece only
+        # starts once the earlier ones are done, which they usually are by the
+        # time recording stops.
+        text = ""
+        for index in range(self._segment_count):
+            part = (await self._segment_result(index) or "").strip()
+            if part:
+                text = self._emit_partial(text, _separator(text, part) + part)
+        if self._final_segment is not None:
+            text = await self._stream_text(self._transcribe_stream(self._final_segment), text)
+        logging.info(f"Streamed {self._segment_count} segment(s) and the final piece")
+        return text
+
+    async def _segment_result(self, index):
+        with self._segments_lock:
+            future = self._segments.get(index)
+        if future is None:
+            # The last segments may still be on their way from the recorder
+            # thread; submit_segment() resolves the waiter on this loop
+            waiter = self._segment_waiters.get(index)
+            if waiter is None:
+                waiter = self._segment_waiters[index] = asyncio.get_running_loop().create_future()
+            try:
+                future = await asyncio.wait_for(waiter, SEGMENT_DELIVERY_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"Segment {index} was never dispatched")
+        return await asyncio.wrap_future(future)
+
+    def _segment_dispatched(self, index, future):
+        waiter = self._segment_waiters.pop(index, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(future)
+
+    async def _stream_text(self, pieces, text=""):
+        """Emit pieces (in sentence-sized chunks) after text; returns the whole text."""
+        chunker = SentenceChunker()
+        started = time.monotonic()
+        first = True
+        async for piece in pieces:
+            chunk = chunker.feed(piece)
+            if chunk and first:
+                logging.info(f"First streamed chunk after {time.monotonic() - started:.2f} s")
+                chunk = _separator(text, chunk) + chunk
+                first = False
+            text = self._emit_partial(text, chunk)
+        chunk = chunker.flush()
+        if chunk and first:
+            chunk = _separator(text, chunk) + chunk
+        return self._emit_partial(text, chunk)
+
+    def _emit_partial(self, text, chunk):
+        if chunk:
+            self.partial.emit(chunk)
+            text += chunk
+        return text
+
+
+class SentenceChunker:
+    """Buffers streamed tokens and releases them a sentence at a time."""
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def feed(self, text):
+        """Add text; returns the completed sentences so far (possibly "")."""
+        self._pending += text or ""
+        if not self._started:
+            self._pending = self._pending.lstrip()
+            if not self._pending:
+                return ""
+            self._started = True
+        cut = _last_boundary(self._pending)
+        if cut <= 0 and len(self._pending) >= MAX_PENDING_CHARS:
+            cut = len(self._pending)
+        if cut <= 0:
+            return ""
+        chunk, self._pending = self._pending[:cut], self._pending[cut:]
+        return chunk
+
+    def flush(self):
+        """Whatever is left once the stream has ended."""
+        chunk, self._pending = self._pending.rstrip(), ""
+        return chunk
+
+
+def release_point(text, keys=()):
+    """
+    Index up to which streamed text can be pasted: the last sentence end (or
+    all of it past MAX_PENDING_CHARS) that does not split one of keys, the
+    dictionary entries, either complete or still arriving at the end of text.
+    """
+    cut = _last_boundary(text)
+    if cut <= 0 and len(text) >= MAX_PENDING_CHARS:
+        cut = len(text)
+    moved = True
+    while moved and cut > 0:
+        moved = False
+        for key in keys:
+            for start in range(max(0, cut - len(key) + 1), cut):
+                piece = text[start:start + len(key)]
+                if piece == key or (start + len(piece) == len(text) and key.startswith(piece)):
+                    # Hold back the sentence the key starts in
+                    cut = _last_boundary(text[:start])
+                    moved = True
+                    break
+            if moved:
+                break
+    return cut
+
+
+def _last_boundary(text):
+    # Index just past the last sentence end; a newline ends the sentence before it
+    cut = 0
+    for i, ch in enumerate(text):
+        if ch in SENTENCE_ENDS:
+            cut = i + 1
+        elif ch == "\n":
+            cut = i
+        elif ch == "." and i + 1 < len(text) and text[i + 1].isspace():
+            cut = i + 1
+    return cut
+
+
+def _separator(text, part):
+    # Japanese needs no separator; keep a space between Latin words
+    if text and part and text[-1].isascii() and text[-1].isalnum() and part[0].isascii() and part[0].isalnum():
+        return " "
+    return ""
+
+
+def _join_texts(parts):
+    text = ""
+    for part in parts:
+        part = (part or "").strip()
+        if not part:
+            continue
+        text += _separator(text, part) + part
+    return text
@@ -0,0 +1,87 @@
+import logging
+import threading
+
+import rust_core
+
+# Python-side fan-out for the single native hotplug callback
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def list_input_devices():
+    """
+    Cached input devices from the rust_core registry as (name, id, is_default).
+    Only the first call enumerates the host.
+    """
+    try:
+        return rust_core.get_input_devices()
+    except Exception as e:
+        logging.error(f"Failed to list input devices: {e}")
+        return []
+
+
+def refresh_input_devices():
+    """Re-enumerate devices now. Returns True if the list changed."""
+    try:
+        return rust_core.refresh_input_devices()
+    except Exception as e:
+        logging.error(f"Failed to refresh input devices: {e}")
+        return False
+
+
+def resolve_input_device_id(value):
+    """
+    Map a configured audio.input_device to a registry ID (None = default device).
+    Accepts registry IDs as well as legacy device names and positional indexes.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+
+    devices = list_input_devices()
+    if isinstance(value, int):
+        # Legacy: index into the host enumeration order, which the registry keeps
+        if 0 <= value < len(devices):
+            return devices[value][1]
+        logging.warning(f"Input device index {value} no longer exists. Using default device.")
+        return None
+
+    if isinstance(value, str):
+        for _, dev_id, _ in devices:
+            if dev_id == value:
+                return dev_id
+        for name, dev_id, _ in devices:
+            if name == value:
+                return dev_id
+        # Unplugged right now: keep the ID so recording fails loudly instead of
+        # silently using another microphone.
+        return value
+
+    return None
+
+
+def add_change_listener(callback):
+    """Call callback() from a background thread when devices are added or removed."""
+    with _listeners_lock:
+        if callback in _listeners:
+            return
+        _listeners.append(callback)
+        if len(_listeners) == 1:
+            rust_core.watch_input_devices(_notify)
+
+
+def remove_change_listener(callback):
+    with _listeners_lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+        if not _listeners:
+            rust_core.watch_input_devices(None)
+
+
+def _notify():
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback()
+        except Exception as e:
+            logging.error(f"Device change listener failed: {e}")
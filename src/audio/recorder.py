@@ -1,6 +1,4 @@
-import threading
 import os
-import time
 import tempfile
 import logging
 
@@ -12,8 +10,12 @@ except ImportError:
     raise
 
 from src.core.config import config_manager
+from src.audio.devices import resolve_input_device_id
 from src.core.const import SAMPLE_RATE
 
+# Marker for "take the input device from config" (None means the system default).
+_CONFIG_DEVICE = object()
+
 # Assuming Rust uses default device SR which is typically 44100 or 48000 on modern OS?
 # For PoC we use hardcoded guessed SR for duration calc if Rust doesn't return it.
 # Ideally Rust should return used SR.
@@ -22,88 +24,153 @@ class AudioRecorder:
     def __init__(self):
         self._native_recorder = PyAudioRecorder()
         self._recording_path = None
-        self._monitor_thread = None
-        self._stop_event = threading.Event()
+        self._buffer = None
+        # Segmented recording: audio after the last on_segment() call, and how
+        # many segments were delivered (both set by stop())
+        self.final_segment = None
+        self.segment_count = 0
         self.is_recording = False
         self.on_auto_stop = None
         self.sample_rate = SAMPLE_RATE # Default fallback
 
-    def start(self, max_seconds=60, on_auto_stop=None):
+    def start(self, max_seconds=60, on_auto_stop=None, to_file=False,
+              input_device=_CONFIG_DEVICE, monitor_only=False, on_segment=None):
+        """
+        Start recording. By default audio is kept in memory and stop() returns a
+        rust_core.AudioBuffer; with to_file=True it is written to a temp WAV and
+        stop() returns its path. monitor_only keeps nothing and only feeds the
+        subscriber (see subscribe()).
+
+        After max_seconds (None = unlimited) rust_core finalizes the recording
+        itself and calls on_auto_stop() once from a background thread; stop()
+        still has to be called to collect the result.
+
+        With on_segment, speech is cut at pauses (audio.segment_pause_ms) while
+        recording and each piece is passed to on_segment(index, AudioBuffer) in
+        order from a background thread. After stop(), final_segment holds the
+        rest (None if it has no speech) and segment_count the pieces delivered.
+        """
         if self.is_recording:
             return
 
         self.cleanup()
         self.on_auto_stop = on_auto_stop
         
-        # Temp file creation
-        # Rust expects a path string
-        tf = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        self._recording_path = tf.name
-        tf.close()
+        if to_file:
+            # Rust expects a path string
+            tf = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+            self._recording_path = tf.name
+            tf.close()
 
-        input_device = config_manager.settings.get("audio", {}).get("input_device") # Index or Name (Legacy)
-        
-        # Rust backend expects index (int) or None.
-        if isinstance(input_device, str):
-            # Legacy config might have string name. Fallback to default.
-            # Ideally we should lookup index by name via rust_core.get_input_devices()
-            logging.warning("Device name provided in config, but Rust backend expects index. Using default device.")
-            input_device = None
-        elif not isinstance(input_device, int) and input_device is not None:
-             input_device = None
+        input_device = self._resolve_input_device(input_device)
         
+        audio_settings = config_manager.settings.get("audio", {})
+        target_rate = int(audio_settings.get("target_sample_rate") or 0) or None
+        target_channels = int(audio_settings.get("target_channels") or 0) or None
+        trim_margin_ms = None
+        if audio_settings.get("trim_silence", True):
+            trim_margin_ms = int(audio_settings.get("trim_margin_ms", 200))
+        vad_energy = float(audio_settings.get("vad_energy_threshold", 0.005))
+        gain_db = float(audio_settings.get("input_gain_db", 0.0))
+        highpass_hz = float(audio_settings.get("highpass_hz") or 0) or None
+        segment_pause_ms = None
+        if on_segment is not None:
+            segment_pause_ms = int(audio_settings.get("segment_pause_ms", 700))
+        segment_min_ms = int(audio_settings.get("segment_min_seconds", 5) * 1000)
+
         try:
-            # Rust returns the actual sample rate used
-            sr = self._native_recorder.start(self._recording_path, input_device)
+            # Rust returns the output sample rate (after any resampling)
+            sr = self._native_recorder.start(
+                self._recording_path,
+                input_device,
+                target_rate,
+                target_channels,
+                trim_margin_ms,
+                vad_energy,
+                monitor_only,
+                gain_db,
+                highpass_hz,
+                float(max_seconds) if max_seconds else None,
+                on_auto_stop,
+                segment_pause_ms,
+                segment_min_ms,
+                on_segment,
+            )
             if sr > 0:
                 self.sample_rate = sr
             logging.info(f"Recording started with sample rate: {self.sample_rate}")
             
             self.is_recording = True
             
-            # Start monitor thread for auto-stop
-            self._stop_event.clear()
-            self._monitor_thread = threading.Thread(
-                target=self._monitor_loop,
-                args=(max_seconds,),
-                daemon=True
-            )
-            self._monitor_thread.start()
-            
         except Exception as e:
             logging.error(f"Failed to start recording (Rust): {e}")
             self.cleanup()
             raise RuntimeError(f"Failed to start recording: {e}")
 
-    def _monitor_loop(self, max_seconds):
-        start_time = time.time()
-        while not self._stop_event.is_set():
-            if time.time() - start_time >= max_seconds:
-                # Time limit reached
-                if self.is_recording:
-                    # Notify via callback
-                    if self.on_auto_stop:
-                        self.on_auto_stop()
-                break
-            time.sleep(0.1)
+    def _resolve_input_device(self, input_device=_CONFIG_DEVICE):
+        if input_device is _CONFIG_DEVICE:
+            input_device = config_manager.settings.get("audio", {}).get("input_device") # ID, or legacy index/name
+        # Rust backend expects a registry ID or None (default device)
+        return resolve_input_device_id(input_device)
+
+    def warm_up(self):
+        """
+        Keep the configured input device open with a pre-roll buffer so start()
+        begins instantly and includes audio from just before the key press.
+        """
+        audio_settings = config_manager.settings.get("audio", {})
+        target_rate = int(audio_settings.get("target_sample_rate") or 0) or None
+        preroll_ms = int(audio_settings.get("preroll_ms", 500))
+        try:
+            self._native_recorder.warm_up(self._resolve_input_device(), target_rate, preroll_ms)
+            logging.info(f"Warm input stream open ({preroll_ms} ms pre-roll)")
+        except Exception as e:
+            # Not fatal: start() falls back to opening the stream on demand
+            logging.error(f"Failed to open warm input stream: {e}")
+
+    def cool_down(self):
+        self._native_recorder.cool_down()
+
+    @property
+    def is_warm(self):
+        return self._native_recorder.is_warm()
+
+    def subscribe(self, callback, interval_ms=50, include_audio=False):
+        """
+        Receive callback(peak, rms, chunk) every interval_ms while recording.
+        chunk is a rust_core.AudioBuffer when include_audio is set, else None.
+        The callback runs on a background thread; hand results to the UI via
+        a lock or a queued signal.
+        """
+        self._native_recorder.subscribe(callback, interval_ms, include_audio)
+
+    def unsubscribe(self):
+        self._native_recorder.unsubscribe()
 
     def stop(self):
         if not self.is_recording:
             return None
             
         self.is_recording = False
-        self._stop_event.set()
         
         try:
             self._native_recorder.stop()
+            self._buffer = self._native_recorder.take_buffer()
+            self.final_segment = self._native_recorder.take_final_segment()
+            self.segment_count = self._native_recorder.get_segment_count()
+            span = self._native_recorder.get_speech_span()
+            if span:
+                start_s, end_s, speech_s = span
+                logging.info(f"Speech detected {start_s:.2f}-{end_s:.2f} s ({speech_s:.2f} s voiced)")
+            overruns = self._native_recorder.get_overrun_count()
+            if overruns:
+                logging.warning(f"Audio ring buffer overran {overruns} times; some audio was dropped")
         except Exception as e:
             logging.error(f"Error calling native stop: {e}")
 
-        if self._monitor_thread and self._monitor_thread.is_alive():
-            # Wait a bit? No need, we set event.
-            pass
-            
-        return self._recording_path
+        if self._recording_path:
+            return self._recording_path
+        return self._buffer
 
     def cleanup(self):
         self.stop()
@@ -113,22 +180,23 @@ class AudioRecorder:
             except Exception:
                 pass
         self._recording_path = None
+        self._buffer = None
+        self.final_segment = None
+        self.segment_count = 0
 
     def get_stats(self):
         try:
-            # Rust returns (peak, rms, samples)
-            peak, rms, samples = self._native_recorder.get_stats()
-            
-            # Calculate duration using actual sample rate
-            duration = samples / self.sample_rate if self.sample_rate > 0 else 0.0
+            # Rust returns (peak, rms, duration in seconds)
+            peak, rms, duration = self._native_recorder.get_stats()
             
             return {
                 "peak": peak,
                 "avg_rms": rms,
-                "duration": duration
+                "duration": duration,
+                "overruns": self._native_recorder.get_overrun_count(),
             }
         except Exception:
-            return {"peak": 0.0, "avg_rms": 0.0, "duration": 0.0}
+            return {"peak": 0.0, "avg_rms": 0.0, "duration": 0.0, "overruns": 0}
 
     def is_silence(self, energy_threshold=None, peak_threshold=None, min_duration=None):
         """
@@ -15,8 +15,32 @@ DEFAULT_SETTINGS = {
     "audio": {
         "input_device": None,
         "input_gain_db": 0.0,
+        # DC removal / rumble filter applied in the audio callback (0 = off)
+        "highpass_hz": 80,
+        # Output format of the native recorder (0 = keep the device format).
+        # Whisper works on 16 kHz mono internally, so anything more is wasted upload.
+        "target_sample_rate": 16000,
+        "target_channels": 1,
+        # Payload sent to cloud providers: "flac" (lossless), "opus" (Ogg Opus) or "wav".
+        "upload_format": "flac",
+        # Cut leading/trailing silence from the in-memory recording (frame-level VAD).
+        "trim_silence": True,
+        "trim_margin_ms": 200,
+        # Keep the input stream open between recordings and prepend the last
+        # preroll_ms of audio, so the first syllable is not lost on key press.
+        "warm_stream": False,
+        "preroll_ms": 500,
+        # Send long dictations to the provider in pieces while still recording,
+        # cutting at pauses of segment_pause_ms once a piece is long enough.
+        "pipeline_segments": True,
+        "segment_pause_ms": 700,
+        "segment_min_seconds": 5,
+        "opus_bitrate": 24000,
         "max_record_seconds": 60,
         "auto_paste": True,
+        # Paste streamed results sentence by sentence as the provider generates
+        # them (Groq refinement, Gemini), instead of all at once when it is done.
+        "stream_paste": True,
         "paste_delay_ms": 60,
         "hold_key": "alt_l",
     },
@@ -54,10 +78,70 @@ DEFAULT_SETTINGS = {
 """.strip(),
     },
     "dictionary": {},
+    "providers": {
+        # Cached clients / the loaded local model are released after this long
+        # without a dictation (0 = keep them for the lifetime of the app).
+        "idle_timeout_seconds": 900,
+        # Open the connection to the cloud API when the hold key goes down, so
+        # the request after release does not pay DNS/TCP/TLS setup.
+        "warm_on_key_press": True,
+        # Dictations per provider transcribed at the same time while more are
+        # queued (results are still pasted in recording order; 0 = no limit)
+        "max_concurrent_jobs": 2,
+        # Race mode: when the provider has not answered within its
+        # hedge_quantile latency (hedge_default_delay_ms until enough samples),
+        # send the audio to race_with as well ("same" = a second attempt) and
+        # use whichever answer arrives first. Stats: hedge_stats.json.
+        "race": False,
+        "race_with": "same",
+        "hedge_quantile": 0.95,
+        "hedge_min_delay_ms": 300,
+        "hedge_default_delay_ms": 2500,
+        # Deadlines in seconds: connect/upload per network operation,
+        # transcription/refine for each whole API call of that stage.
+        # local covers a whole request to the local model, worker process or daemon.
+        "timeouts": {"connect": 5, "upload": 20, "transcription": 30, "refine": 20, "local": 120},
+        # Timeouts, connection errors and 429/5xx are retried with jittered backoff
+        "retries": 2,
+        "retry_backoff_ms": 400,
+        # After breaker_threshold consecutive failures a provider is skipped for
+        # breaker_cooldown_seconds.
+        "breaker_threshold": 3,
+        "breaker_cooldown_seconds": 60,
+        # Opt-in failover, per primary provider: providers to try instead while its
+        # circuit is open or after a transient failure, e.g. {"groq": ["gemini"]}.
+        # Audio only goes to a provider listed here, so {"local": []} keeps it local.
+        "failover": {},
+    },
     "local": {
         "model_size": "large-v3",
-        "device": "cuda",
-        "compute_type": "float16"
+        # "auto" picks the benchmarked fastest configuration for this machine
+        # (stored under "tuned"), or the GPU / int8 on CPU until one exists.
+        "device": "auto",
+        "compute_type": "auto",
+        "cpu_threads": 0,
+        "num_workers": 1,
+        # Benchmark in the background after the model is preloaded when no result
+        # exists (otherwise only from Settings); the model is reloaded once it is done
+        "auto_benchmark": False,
+        # 1 = greedy (fastest), 5 = beam search (the previous fixed value)
+        "beam_size": 5,
+        # Recordings at least this long use faster-whisper's batched pipeline,
+        # which splits on VAD and decodes batch_size chunks at once.
+        "batched": True,
+        "batched_min_seconds": 15,
+        "batch_size": 8,
+        # Decode in a separate worker process instead of a thread of the GUI process
+        "out_of_process": True,
+        # Send requests to a shared daemon (python -m src.ai.daemon) instead of
+        # loading the model in this process. Empty socket = the per-user default,
+        # $XDG_RUNTIME_DIR/voice-in/whisperd.sock
+        "use_daemon": False,
+        "daemon_socket": "",
+        # uid a shared daemon runs as, if not yourself or root; audio is never
+        # sent to a daemon run by anybody else
+        "daemon_uid": None,
+        "daemon_timeout_seconds": 300,
     }
 }
 
@@ -75,6 +75,30 @@ TRANSLATIONS = {
         "saved_title": "保存",
         "saved_message": "設定を保存して適用しました。",
         "warning_title": "警告",
+        "label_upload_format": "アップロード形式",
+        "label_warm_stream": "マイクを常時待機 (録音開始を高速化)",
+        "status_warming": "音声認識モデルを準備中...",
+        "label_local_cpu_threads": "CPUスレッド数 (0 = 自動)",
+        "label_local_num_workers": "並列ワーカー数",
+        "label_local_tuned": "自動チューニング",
+        "btn_local_benchmark": "ベンチマークを実行",
+        "local_tuned_none": "未実施 (現在: {device} / {compute_type})",
+        "local_tuned_summary": "{model}: {device} / {compute_type}, スレッド {threads}, ワーカー {workers} — 実時間比 {rtf:.2f} ({date})",
+        "local_benchmark_running": "計測中: {label}",
+        "local_benchmark_failed": "ベンチマーク失敗: {error}",
+        "label_local_batched": "長い録音はバッチ推論",
+        "label_local_batch_size": "バッチサイズ",
+        "label_local_decoding": "デコード",
+        "local_beam_greedy": "高速 (greedy)",
+        "local_beam_balanced": "バランス (beam 2)",
+        "local_beam_accurate": "高精度 (beam 5)",
+        "label_local_out_of_process": "別プロセスで推論 (UIの応答性を優先)",
+        "label_local_use_daemon": "共有デーモンを使用",
+        "label_local_daemon_socket": "デーモンのソケット",
+        "label_stream_paste": "生成しながら貼り付け",
+        "label_race": "レース (並列リクエスト)",
+        "race_off": "オフ",
+        "race_same": "同じプロバイダーで再送",
     },
     "en": {
         "app_name": "Voice In",
@@ -150,6 +174,30 @@ TRANSLATIONS = {
         "saved_title": "Saved",
         "saved_message": "Settings saved and applied.",
         "warning_title": "Warning",
+        "label_upload_format": "Upload Format",
+        "label_warm_stream": "Keep microphone warm (instant start)",
+        "status_warming": "Preparing the speech model...",
+        "label_local_cpu_threads": "CPU threads (0 = auto)",
+        "label_local_num_workers": "Parallel workers",
+        "label_local_tuned": "Auto-tuning",
+        "btn_local_benchmark": "Run benchmark",
+        "local_tuned_none": "Not run yet (using {device} / {compute_type})",
+        "local_tuned_summary": "{model}: {device} / {compute_type}, {threads} threads, {workers} worker(s) — {rtf:.2f}x realtime ({date})",
+        "local_benchmark_running": "Benchmarking: {label}",
+        "local_benchmark_failed": "Benchmark failed: {error}",
+        "label_local_batched": "Batched inference for long recordings",
+        "label_local_batch_size": "Batch size",
+        "label_local_decoding": "Decoding",
+        "local_beam_greedy": "Fast (greedy)",
+        "local_beam_balanced": "Balanced (beam 2)",
+        "local_beam_accurate": "Accurate (beam 5)",
+        "label_local_out_of_process": "Run inference in a separate process (keeps the UI responsive)",
+        "label_local_use_daemon": "Use the shared daemon",
+        "label_local_daemon_socket": "Daemon socket",
+        "label_stream_paste": "Paste while generating",
+        "label_race": "Race (hedged requests)",
+        "race_off": "Off",
+        "race_same": "Retry same provider",
     },
     # Skipping fr, es, ko for brevity in this step, can add later or valid to include all if needed.
     # I'll include them to be complete as I have them in context.
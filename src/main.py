@@ -89,6 +89,7 @@ def main():
     def set_provider(name):
         config_manager.update_env("AI_PROVIDER", name)
         overlay.update_style()
+        overlay.preload_provider()
         update_menu()
         tray.showMessage("Voice In", f"Switched to {name}")
 
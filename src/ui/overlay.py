@@ -1,5 +1,6 @@
 import sys
 import os
+import collections
 import shutil
 import subprocess
 import threading
@@ -8,7 +9,7 @@ import logging
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QLabel, QApplication, QSystemTrayIcon, QMenu
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QThread, QObject
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QObject
 from PyQt6.QtGui import QAction
 from pynput import keyboard
 
@@ -16,8 +17,12 @@ from src.core.config import config_manager
 from src.core.i18n import t
 from src.core.history import append_history_item
 from src.audio.recorder import AudioRecorder
+from src.audio.devices import add_change_listener, remove_change_listener
 from src.audio.vad import SimpleVAD
-from src.ai.worker import AIWorker
+from src.ai.worker import AIWorker, release_point
+from src.ai.jobs import JobQueue
+from src.ai import event_loop
+from src.ai.providers import registry
 from src.ui.widgets import make_tray_icon_for_state
 from src.ui.settings import SettingsDialog
 from src.ui.history import HistoryDialog
@@ -26,6 +31,9 @@ from src.ui.setup import SetupWizardDialog
 class AquaOverlay(QMainWindow):
     start_recording_signal = pyqtSignal()
     stop_recording_signal = pyqtSignal()
+    devices_changed_signal = pyqtSignal()
+    recording_stopped_signal = pyqtSignal(object, bool)
+    warming_finished_signal = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
@@ -36,26 +44,46 @@ class AquaOverlay(QMainWindow):
         self._last_text = ""
         self._last_error = ""
         self._paste_target_window = None
+        # (text, paste) pairs put on the clipboard one after another
+        self._paste_queue = collections.deque()
+        self._paste_busy = False
+        # Text already pasted from partial results of the current dictation, and
+        # received text held back until the dictionary can be applied to it
+        self._streamed_text = ""
+        self._stream_pending = ""
         self._history_dialog = None
         self._settings_dialog = None
         self._setup_dialog = None
         
-        self._ai_thread = None
+        # Worker of the recording in progress (it takes segments while recording)
         self._ai_worker = None
+        # Dictations handed to the AI layer; results come back in recording order
+        self._jobs = JobQueue(self)
+        self._jobs.partial.connect(self.on_ai_partial)
+        self._jobs.finished.connect(self.on_ai_finished)
+        self._jobs.error.connect(self.on_ai_error)
+        # True only while the recorder is being stopped
         self._is_processing = False
         self._status = "idle"
+        self._warming_jobs = 0
+        self._connection_warming = False
         
         self.initUI()
+        self.apply_audio_settings()
         self.initKeyboard()
         self.keyboard_controller = keyboard.Controller()
         
         self.start_recording_signal.connect(self.start_recording)
         self.stop_recording_signal.connect(self.stop_recording)
+        self.recording_stopped_signal.connect(self.on_recording_stopped)
+        self.warming_finished_signal.connect(self.on_warming_finished)
+        # A replugged mic invalidates the warm stream; reopen it on the GUI thread
+        self.devices_changed_signal.connect(self.apply_audio_settings)
+        add_change_listener(self._on_devices_changed)
+        self.preload_provider()
         
-        # Poll for auto-stop form recorder if needed, but recorder has callback slot now.
-        # But callback is in audio thread. We need to handle it. 
-        # Actually I didn't connect recorder callback to signal in previous recorder code.
-        # I added `on_auto_stop`.
+        # Auto-stop is enforced in rust_core; its callback arrives on a background
+        # thread and is forwarded through stop_recording_signal (see start_recording).
         
     def initUI(self):
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.ToolTip | Qt.WindowType.WindowDoesNotAcceptFocus)
@@ -139,13 +167,82 @@ class AquaOverlay(QMainWindow):
         
     def set_tray(self, tray):
         self._tray = tray
-        self._set_status("idle")
+        self._set_status(self._status)
 
     def _set_status(self, status):
         self._status = status
         if self._tray:
             self._tray.setIcon(make_tray_icon_for_state(status))
 
+    def apply_audio_settings(self):
+        # (Re)open or close the always-on input stream to match the settings
+        audio = config_manager.settings.get("audio", {})
+        if self.recorder.is_recording:
+            return
+        if audio.get("warm_stream", False):
+            self.recorder.warm_up()
+        elif self.recorder.is_warm:
+            self.recorder.cool_down()
+
+    def preload_provider(self):
+        # Load the selected provider (the local Whisper model in particular) in the
+        # background, so the first dictation does not wait for it.
+        provider = os.getenv("AI_PROVIDER", "gemini")
+        if registry.is_loaded(provider):
+            return
+        self._warming_jobs += 1
+        if self._status in ("idle", "success", "error"):
+            self._set_status("warming")
+            self.label.setText("⌛")
+            self.label.setToolTip(t("status_warming"))
+
+        def _job():
+            error = ""
+            try:
+                registry.preload(provider)
+            except Exception as e:
+                logging.error(f"Preloading {provider} provider failed: {e}")
+                error = str(e)
+            self.warming_finished_signal.emit(error)
+
+        threading.Thread(target=_job, name="provider-preload", daemon=True).start()
+
+    def warm_connection(self):
+        # Called from the keyboard listener thread; the request itself runs on its own thread
+        if self._connection_warming:
+            return
+        if not config_manager.settings.get("providers", {}).get("warm_on_key_press", True):
+            return
+        provider = os.getenv("AI_PROVIDER", "gemini")
+        # Never build a provider (e.g. load a model) from a key press
+        if not registry.is_loaded(provider):
+            return
+        self._connection_warming = True
+
+        async def _job():
+            try:
+                # get_provider takes the registry lock; keep it off the loop thread
+                instance = await event_loop.run_blocking(registry.get_provider, provider)
+                # Same loop and async clients as the request that follows
+                await instance.open_connection()
+            except Exception as e:
+                logging.warning(f"Warming {provider} connection failed: {e}")
+            finally:
+                self._connection_warming = False
+
+        event_loop.submit(_job())
+
+    def on_warming_finished(self, error):
+        self._warming_jobs -= 1
+        if self._warming_jobs > 0:
+            return
+        self.label.setToolTip("")
+        if self._status == "warming":
+            self.reset_ui()
+
+    def _on_devices_changed(self):
+        self.devices_changed_signal.emit()
+
     def initKeyboard(self):
         self.listener = keyboard.Listener(on_press=self.on_key_press, on_release=self.on_key_release)
         self.listener.start()
@@ -162,6 +259,8 @@ class AquaOverlay(QMainWindow):
                          r = subprocess.run(["xdotool", "getactivewindow"], stdout=subprocess.PIPE, text=True)
                          if r.returncode == 0: self._paste_target_window = r.stdout.strip()
                  except: pass
+            if not self.recorder.is_recording:
+                self.warm_connection()
             self.start_recording_signal.emit()
 
     def on_key_release(self, key):
@@ -171,21 +270,34 @@ class AquaOverlay(QMainWindow):
             self.stop_recording_signal.emit()
 
     def start_recording(self):
+        # Earlier dictations may still be processing; they stay queued
         if self.recorder.is_recording or self._is_processing: return
         self._set_status("recording")
         self.label.setText("🎙️")
         self.widget.setStyleSheet("""
             QWidget { background-color: rgba(220, 20, 60, 230); border-radius: 30px; border: 2px solid #ff9999; }
         """)
-        max_sec = config_manager.settings.get("audio", {}).get("max_record_seconds", 60)
+        audio_settings = config_manager.settings.get("audio", {})
+        max_sec = audio_settings.get("max_record_seconds", 60)
         
         def on_auto_stop():
             # Signal emitter from background thread
             self.stop_recording_signal.emit()
+
+        # Long dictations are transcribed piece by piece while still recording;
+        # the worker is created now and started on release.
+        self._ai_worker = None
+        on_segment = None
+        if audio_settings.get("pipeline_segments", True):
+            self._ai_worker = self._create_ai_worker(None)
+            on_segment = self._ai_worker.submit_segment
             
         try:
-            self.recorder.start(max_seconds=max_sec, on_auto_stop=on_auto_stop)
+            self.recorder.start(max_seconds=max_sec, on_auto_stop=on_auto_stop, on_segment=on_segment)
         except Exception as e:
+            if self._ai_worker:
+                self._ai_worker.cancel()
+                self._ai_worker = None
             self._set_status("error")
             self.label.setText("❌")
             print(f"Rec Error: {e}")
@@ -194,59 +306,141 @@ class AquaOverlay(QMainWindow):
             self.reset_ui_delayed()
 
     def stop_recording(self):
-        if not self.recorder.is_recording: return
-        wav_path = self.recorder.stop()
-        
-        # Use Rust-based VAD check
-        if self.recorder.is_silence():
-             try: os.remove(wav_path)
-             except: pass
+        if not self.recorder.is_recording or self._is_processing: return
+        # Blocks new recordings until the stop below has finished
+        self._is_processing = True
+
+        def _stop():
+            # rust_core releases the GIL while it flushes and finalizes, so the
+            # overlay keeps repainting even for long recordings.
+            audio = self.recorder.stop()
+            # Use Rust-based VAD check
+            silent = audio is None or self.recorder.is_silence()
+            self.recording_stopped_signal.emit(audio, silent)
+
+        threading.Thread(target=_stop, daemon=True).start()
+
+    def on_recording_stopped(self, audio, silent):
+        # The next recording may start right away
+        self._is_processing = False
+        # Results that arrived while recording can be pasted now
+        self._resume_paste()
+        if silent:
+             if self._ai_worker:
+                 self._ai_worker.cancel()
+                 self._ai_worker = None
+             self.recorder.cleanup()
              self.reset_ui()
              return
 
+        self._show_processing()
+        
+        if self._ai_worker:
+            self._ai_worker.audio = audio
+            self._ai_worker.finish_segments(self.recorder.segment_count, self.recorder.final_segment)
+        else:
+            self._ai_worker = self._create_ai_worker(audio)
+        
+        # Runs on the shared inference loop next to earlier dictations; the
+        # queue hands the results back in recording order
+        self._jobs.add(self._ai_worker)
+        self._ai_worker = None
+
+    def _show_processing(self):
         self._set_status("processing")
         self.label.setText("⏳")
         self.widget.setStyleSheet("""
              QWidget { background-color: rgba(255, 193, 7, 230); border-radius: 30px; border: 2px solid #ffeabe; }
         """)
-        self._is_processing = True
-        
+
+    def _create_ai_worker(self, audio):
         provider = os.getenv("AI_PROVIDER", "gemini")
         prompts = config_manager.settings.get("prompts", {})
-        
-        self._ai_thread = QThread()
-        self._ai_worker = AIWorker(provider, wav_path, prompts)
-        self._ai_worker.moveToThread(self._ai_thread)
-        self._ai_thread.started.connect(self._ai_worker.run)
-        self._ai_worker.finished.connect(self.on_ai_finished)
-        self._ai_worker.error.connect(self.on_ai_error)
-        self._ai_worker.finished.connect(self._ai_thread.quit)
-        self._ai_worker.error.connect(self._ai_thread.quit)
-        self._ai_worker.finished.connect(lambda: threading.Thread(target=lambda: self.cleanup_wav(wav_path)).start())
-        self._ai_thread.start()
-
-    def cleanup_wav(self, path):
-        if path and os.path.exists(path):
-            try: os.remove(path)
-            except: pass
+        audio_settings = config_manager.settings.get("audio", {})
+        stream = audio_settings.get("auto_paste", True) and audio_settings.get("stream_paste", True)
+        return AIWorker(provider, audio, prompts, stream=stream)
 
-    def on_ai_finished(self, text):
+    def _apply_dictionary(self, text):
         dic = config_manager.settings.get("dictionary", {})
         for k, v in dic.items():
             text = text.replace(k, v)
+        return text
+
+    def on_ai_partial(self, chunk):
+        # Streamed pieces are pasted a sentence at a time (the worker only
+        # streams with auto paste on). The dictionary is applied to whole
+        # sentences, so a key split across pieces is replaced as it would be
+        # without streaming.
+        self._stream_pending += chunk
+        keys = config_manager.settings.get("dictionary", {}).keys()
+        cut = release_point(self._stream_pending, keys)
+        if cut > 0:
+            text, self._stream_pending = self._stream_pending[:cut], self._stream_pending[cut:]
+            self._paste_streamed(text)
+
+    def _paste_streamed(self, text):
+        text = self._apply_dictionary(text)
+        if not text:
+            return
+        if not self._streamed_text and not self.recorder.is_recording:
+            # Text is arriving; the result is no longer just pending
+            self.label.setText("✍️")
+        self._streamed_text += text
+        self._queue_paste(text)
+
+    def on_ai_finished(self, text):
+        if self._stream_pending:
+            self._paste_streamed(self._stream_pending)
+            self._stream_pending = ""
+        if self._streamed_text:
+            # Already pasted piece by piece; the clipboard ends up holding the whole text
+            text = self._streamed_text
+            self._streamed_text = ""
+            paste = False
+        else:
+            text = self._apply_dictionary(text)
+            paste = config_manager.settings.get("audio", {}).get("auto_paste", True)
         self._last_text = text
         append_history_item(text=text, provider=os.getenv("AI_PROVIDER"))
         
         if text:
-             QApplication.clipboard().setText(text)
-             if config_manager.settings.get("audio", {}).get("auto_paste", True):
-                 self.do_paste()
+             self._queue_paste(text, paste)
         
+        if self.recorder.is_recording:
+            # The next dictation is already being recorded; leave its UI alone
+            return
+        if self._jobs.pending:
+            self._show_processing()
+            return
         self.label.setText("✅")
         self._set_status("success")
         self.reset_ui_delayed()
 
-    def do_paste(self):
+    def _queue_paste(self, text, paste=True):
+        # The clipboard is shared, so each text must be pasted before the next is set
+        self._paste_queue.append((text, paste))
+        if not self._paste_busy:
+            self._paste_next()
+
+    def _paste_next(self):
+        if not self._paste_queue or self.recorder.is_recording:
+            # Pasting sends modifier releases and ctrl+v, which would disturb a
+            # held record key; on_recording_stopped resumes the queue
+            self._paste_busy = False
+            return
+        self._paste_busy = True
+        text, paste = self._paste_queue.popleft()
+        QApplication.clipboard().setText(text)
+        if paste:
+            self.do_paste(on_done=self._paste_next)
+        else:
+            self._paste_next()
+
+    def _resume_paste(self):
+        if not self._paste_busy:
+            self._paste_next()
+
+    def do_paste(self, on_done=None):
         # Simplified paste logic
         delay = config_manager.settings.get("audio", {}).get("paste_delay_ms", 200)
         def _job():
@@ -282,20 +476,35 @@ class AquaOverlay(QMainWindow):
                          self.keyboard_controller.release('v')
             except Exception as e:
                 print(f"Paste failed: {e}")
+            if on_done:
+                on_done()
                 
         QTimer.singleShot(delay, _job)
 
     def on_ai_error(self, err):
+        self._streamed_text = ""
+        self._stream_pending = ""
+        print(f"AI Error: {err}")
+        if self.recorder.is_recording:
+            return
         self.label.setText("❌")
         self._set_status("error")
-        print(f"AI Error: {err}")
         self.reset_ui_delayed()
 
     def reset_ui(self):
-        self._is_processing = False
+        if self.recorder.is_recording:
+            return
+        if self._jobs.pending:
+            # Earlier dictations are still being transcribed
+            self._show_processing()
+            return
         self.update_style()
         self.label.setText("🎤")
         self._set_status("idle")
+        if self._warming_jobs:
+            # A preload is still running (e.g. the provider was switched meanwhile)
+            self._set_status("warming")
+            self.label.setText("⌛")
         self.setWindowOpacity(0.8)
 
     def reset_ui_delayed(self):
@@ -305,6 +514,9 @@ class AquaOverlay(QMainWindow):
         if not self._settings_dialog:
              self._settings_dialog = SettingsDialog(self)
              self._settings_dialog.settings_applied.connect(lambda s: self.update_style()) # Refresh style on save
+             self._settings_dialog.settings_applied.connect(lambda s: self.apply_audio_settings())
+             # A new model size / device means a new model to load
+             self._settings_dialog.settings_applied.connect(lambda s: self.preload_provider())
         self._settings_dialog.show()
 
     def show_history(self):
@@ -320,4 +532,6 @@ class AquaOverlay(QMainWindow):
     
     def closeEvent(self, event):
         self.listener.stop()
+        remove_change_listener(self._on_devices_changed)
+        self.recorder.cool_down()
         event.accept()
@@ -7,15 +7,21 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QTimer
 import threading
 import numpy as np
-import sounddevice as sd
 
 from src.core.config import config_manager
 from src.core.i18n import t
 from src.ai.worker import AIWorker
-
-# Reuse audio logic for tests if possible or keep simple inside dialog
-# from src.audio.recorder import open_input_stream_with_fallback, SAMPLE_RATE
-from src.core.const import SAMPLE_RATE
+from src.ai.providers import local_tuning
+from src.ai.providers.local import LocalProvider
+from src.ai.providers.local_process import LocalProcessProvider
+from src.ai.providers.local_daemon import default_socket_path
+
+# Tests share the native capture path with the overlay
+from src.audio.recorder import AudioRecorder
+from src.audio.devices import (
+    list_input_devices, refresh_input_devices, resolve_input_device_id,
+    add_change_listener, remove_change_listener,
+)
 
 class SettingsDialog(QDialog):
     # settings_applied signal? 
@@ -27,6 +33,11 @@ class SettingsDialog(QDialog):
     # Or I can just emit a custom signal from dialog.
     from PyQt6.QtCore import pyqtSignal
     settings_applied = pyqtSignal(dict)
+    # Emitted from the device watcher thread; queued onto the GUI thread
+    devices_changed = pyqtSignal()
+    # Local Whisper benchmark, emitted from its worker thread
+    benchmark_progress = pyqtSignal(int, int, str)
+    benchmark_finished = pyqtSignal(object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -39,16 +50,10 @@ class SettingsDialog(QDialog):
         
         self._audio_lock = threading.Lock()
         self._mic_level = 0.0
-        self._mic_stream = None
-        self._test_rec_stream = None
-        self._test_recorded_chunks = []
-        self._test_is_recording = False
-        self._test_recording_fs = SAMPLE_RATE
+        self._mic_recorder = None
+        self._test_recorder = None
+        self._test_audio = None
         self._ai_worker = None
-        # Thread management for test AI worker?
-        # Using QThread locally for tests.
-        from PyQt6.QtCore import QThread
-        self._ai_thread = None
 
         self.tabs = QTabWidget()
         self._build_general_tab()
@@ -75,6 +80,7 @@ class SettingsDialog(QDialog):
         self._mic_timer = QTimer(self)
         self._mic_timer.setInterval(100)
         self._mic_timer.timeout.connect(self._update_mic_bar)
+        self.devices_changed.connect(self._populate_input_devices)
 
         self._load_from_current()
 
@@ -85,6 +91,12 @@ class SettingsDialog(QDialog):
         
         self.cmb_provider = QComboBox()
         self.cmb_provider.addItems(["gemini", "groq", "local"])
+
+        self.cmb_race = QComboBox()
+        self.cmb_race.addItem(t("race_off"), "")
+        self.cmb_race.addItem(t("race_same"), "same")
+        for name in ("gemini", "groq", "local"):
+            self.cmb_race.addItem(name, name)
         
         self.txt_gemini_model = QLineEdit()
         self.txt_groq_key = QLineEdit()
@@ -114,6 +126,9 @@ class SettingsDialog(QDialog):
         self.spn_min_duration.setSuffix(" s")
         
         self.chk_auto_paste = QCheckBox(t("label_auto_paste"))
+        self.chk_stream_paste = QCheckBox(t("label_stream_paste"))
+        self.chk_auto_paste.toggled.connect(self.chk_stream_paste.setEnabled)
+        self.chk_warm_stream = QCheckBox(t("label_warm_stream"))
         self.spn_paste_delay_ms = QSpinBox()
         self.spn_paste_delay_ms.setRange(0, 1000)
         self.spn_paste_delay_ms.setSuffix(" ms")
@@ -121,22 +136,30 @@ class SettingsDialog(QDialog):
         self.cmb_hold_key = QComboBox()
         for k, v in [("Left Alt", "alt_l"), ("Right Alt", "alt_r"), ("Left Ctrl", "ctrl_l"), ("Right Ctrl", "ctrl_r")]:
             self.cmb_hold_key.addItem(k, v)
+
+        self.cmb_upload_format = QComboBox()
+        for k, v in [("FLAC (lossless)", "flac"), ("Opus (smallest)", "opus"), ("WAV", "wav")]:
+            self.cmb_upload_format.addItem(k, v)
             
         self.cmb_language = QComboBox()
         for k, v in [("日本語", "ja"), ("English", "en"), ("Français", "fr"), ("Español", "es"), ("한국어", "ko")]:
             self.cmb_language.addItem(k, v)
         
         form.addRow(t("label_ai_provider"), self.cmb_provider)
+        form.addRow(t("label_race"), self.cmb_race)
         form.addRow(t("label_gemini_model"), self.txt_gemini_model)
         form.addRow(t("label_groq_key"), self.txt_groq_key)
         form.addRow(t("label_gemini_key"), self.txt_gemini_key)
         form.addRow(t("label_input_device"), device_row)
         form.addRow(t("label_input_gain"), self.spn_input_gain_db)
         form.addRow(t("label_hold_key"), self.cmb_hold_key)
+        form.addRow(t("label_warm_stream"), self.chk_warm_stream)
         form.addRow(t("label_max_recording"), self.spn_max_record_seconds)
         form.addRow(t("label_min_duration"), self.spn_min_duration)
         form.addRow(t("label_auto_paste"), self.chk_auto_paste)
+        form.addRow(t("label_stream_paste"), self.chk_stream_paste)
         form.addRow(t("label_paste_delay"), self.spn_paste_delay_ms)
+        form.addRow(t("label_upload_format"), self.cmb_upload_format)
         form.addRow(t("label_language"), self.cmb_language)
         
         w.setLayout(form)
@@ -169,14 +192,60 @@ class SettingsDialog(QDialog):
             self.cmb_local_size.addItem(m)
             
         self.cmb_local_device = QComboBox()
-        self.cmb_local_device.addItems(["cuda", "cpu", "auto"])
+        self.cmb_local_device.addItems(["auto", "cuda", "cpu"])
         
         self.cmb_local_compute = QComboBox()
-        self.cmb_local_compute.addItems(["float16", "int8_float16", "int8"])
+        self.cmb_local_compute.addItems(["auto", "float16", "int8_float16", "int8", "int8_float32", "float32"])
+
+        self.spn_local_cpu_threads = QSpinBox()
+        self.spn_local_cpu_threads.setRange(0, 256)
+        self.spn_local_num_workers = QSpinBox()
+        self.spn_local_num_workers.setRange(1, 16)
+
+        self.cmb_local_decoding = QComboBox()
+        self.cmb_local_decoding.addItem(t("local_beam_greedy"), 1)
+        self.cmb_local_decoding.addItem(t("local_beam_balanced"), 2)
+        self.cmb_local_decoding.addItem(t("local_beam_accurate"), 5)
+        self.chk_local_batched = QCheckBox(t("label_local_batched"))
+        self.spn_local_batch_size = QSpinBox()
+        self.spn_local_batch_size.setRange(1, 64)
+        self.chk_local_batched.toggled.connect(self.spn_local_batch_size.setEnabled)
+        self.chk_local_out_of_process = QCheckBox(t("label_local_out_of_process"))
+        self.chk_local_use_daemon = QCheckBox(t("label_local_use_daemon"))
+        self.txt_local_daemon_socket = QLineEdit()
+        self.txt_local_daemon_socket.setPlaceholderText(default_socket_path())
+        self.chk_local_use_daemon.toggled.connect(self.txt_local_daemon_socket.setEnabled)
+
+        # Auto-tuning result and a button to (re)run the benchmark
+        self.lbl_local_tuned = QLabel()
+        self.lbl_local_tuned.setWordWrap(True)
+        self.btn_local_benchmark = QPushButton(t("btn_local_benchmark"))
+        self.btn_local_benchmark.clicked.connect(self.on_run_benchmark)
+        self.bar_local_benchmark = QProgressBar()
+        self.bar_local_benchmark.setVisible(False)
+        tune_box = QVBoxLayout()
+        tune_box.addWidget(self.lbl_local_tuned)
+        tune_row = QHBoxLayout()
+        tune_row.addWidget(self.btn_local_benchmark)
+        tune_row.addWidget(self.bar_local_benchmark, 1)
+        tune_box.addLayout(tune_row)
+        self.benchmark_progress.connect(self._on_benchmark_progress)
+        self.benchmark_finished.connect(self._on_benchmark_finished)
+        # Results are per model size
+        self.cmb_local_size.currentTextChanged.connect(lambda _: self._show_tuning())
         
         form.addRow(t("label_local_model_size"), self.cmb_local_size)
         form.addRow(t("label_local_device"), self.cmb_local_device)
         form.addRow(t("label_local_compute_type"), self.cmb_local_compute)
+        form.addRow(t("label_local_cpu_threads"), self.spn_local_cpu_threads)
+        form.addRow(t("label_local_num_workers"), self.spn_local_num_workers)
+        form.addRow(t("label_local_decoding"), self.cmb_local_decoding)
+        form.addRow(t("label_local_batched"), self.chk_local_batched)
+        form.addRow(t("label_local_batch_size"), self.spn_local_batch_size)
+        form.addRow(t("label_local_out_of_process"), self.chk_local_out_of_process)
+        form.addRow(t("label_local_use_daemon"), self.chk_local_use_daemon)
+        form.addRow(t("label_local_daemon_socket"), self.txt_local_daemon_socket)
+        form.addRow(t("label_local_tuned"), tune_box)
         
         w.setLayout(form)
         self.tabs.addTab(w, "Local Whisper")
@@ -247,6 +316,8 @@ class SettingsDialog(QDialog):
         self.spn_max_record_seconds.setValue(int(audio.get("max_record_seconds", 60)))
         self.spn_min_duration.setValue(float(audio.get("min_duration", 0.2)))
         self.chk_auto_paste.setChecked(bool(audio.get("auto_paste", True)))
+        self.chk_stream_paste.setChecked(bool(audio.get("stream_paste", True)))
+        self.chk_warm_stream.setChecked(bool(audio.get("warm_stream", False)))
         self.spn_paste_delay_ms.setValue(int(audio.get("paste_delay_ms", 60)))
         
         # Keys & Provider
@@ -262,9 +333,17 @@ class SettingsDialog(QDialog):
         self.txt_groq_key.setText(os.getenv("GROQ_API_KEY", ""))
         self.txt_gemini_key.setText(os.getenv("GEMINI_API_KEY", ""))
 
+        providers = settings.get("providers", {})
+        race = (providers.get("race_with") or "same") if providers.get("race", False) else ""
+        idx = self.cmb_race.findData(race)
+        if idx >= 0: self.cmb_race.setCurrentIndex(idx)
+
         hold_key = audio.get("hold_key", "alt_l")
         idx = self.cmb_hold_key.findData(hold_key)
         if idx >= 0: self.cmb_hold_key.setCurrentIndex(idx)
+
+        idx = self.cmb_upload_format.findData(audio.get("upload_format", "flac"))
+        if idx >= 0: self.cmb_upload_format.setCurrentIndex(idx)
         
         ui = settings.get("ui", {})
         idx = self.cmb_language.findData(ui.get("language", "ja"))
@@ -287,33 +366,89 @@ class SettingsDialog(QDialog):
         # Local
         loc = settings.get("local", {})
         self.cmb_local_size.setCurrentText(loc.get("model_size", "large-v3"))
-        self.cmb_local_device.setCurrentText(loc.get("device", "cuda"))
-        self.cmb_local_compute.setCurrentText(loc.get("compute_type", "float16"))
-        
-        self.on_refresh_input_devices()
-        current_dev = audio.get("input_device")
+        self.cmb_local_device.setCurrentText(loc.get("device", "auto"))
+        self.cmb_local_compute.setCurrentText(loc.get("compute_type", "auto"))
+        self.spn_local_cpu_threads.setValue(int(loc.get("cpu_threads", 0) or 0))
+        self.spn_local_num_workers.setValue(int(loc.get("num_workers", 1) or 1))
+        idx = self.cmb_local_decoding.findData(int(loc.get("beam_size", 5)))
+        self.cmb_local_decoding.setCurrentIndex(idx if idx >= 0 else self.cmb_local_decoding.count() - 1)
+        self.chk_local_batched.setChecked(bool(loc.get("batched", True)))
+        self.spn_local_batch_size.setValue(int(loc.get("batch_size", 8)))
+        self.spn_local_batch_size.setEnabled(self.chk_local_batched.isChecked())
+        self.chk_local_out_of_process.setChecked(bool(loc.get("out_of_process", True)))
+        self.chk_local_use_daemon.setChecked(bool(loc.get("use_daemon", False)))
+        self.txt_local_daemon_socket.setText(loc.get("daemon_socket", ""))
+        self.txt_local_daemon_socket.setEnabled(self.chk_local_use_daemon.isChecked())
+        self._show_tuning()
+        
+        self._populate_input_devices()
+        current_dev = resolve_input_device_id(audio.get("input_device"))
         idx = self.cmb_input_device.findData(current_dev)
         if idx >= 0: self.cmb_input_device.setCurrentIndex(idx)
 
     def on_refresh_input_devices(self):
+        refresh_input_devices()
+        self._populate_input_devices()
+
+    def _populate_input_devices(self):
+        current = self.cmb_input_device.currentData()
         self.cmb_input_device.clear()
         self.cmb_input_device.addItem("Default", None)
-        try:
-            import rust_core
-            devices = rust_core.get_input_devices()
-            # devices is list of (name, index)
-            for name, idx in devices:
-                self.cmb_input_device.addItem(f"{name} ({idx})", idx)
-        except Exception as e:
-            # Fallback to sounddevice if rust fails or logic differs
+        seen = {}
+        for name, dev_id, is_default in list_input_devices():
+            seen[name] = seen.get(name, 0) + 1
+            label = name if seen[name] == 1 else f"{name} #{seen[name]}"
+            self.cmb_input_device.addItem(label, dev_id)
+        idx = self.cmb_input_device.findData(current)
+        if idx >= 0: self.cmb_input_device.setCurrentIndex(idx)
+
+    def _show_tuning(self):
+        model_size = self.cmb_local_size.currentText()
+        loc = dict(config_manager.settings.get("local", {}), model_size=model_size)
+        tuned = local_tuning.tuned_settings(model_size)
+        if tuned:
+            self.lbl_local_tuned.setText(t(
+                "local_tuned_summary", model=model_size, device=tuned["device"],
+                compute_type=tuned["compute_type"], threads=tuned.get("cpu_threads") or "auto",
+                workers=tuned.get("num_workers", 1), rtf=tuned.get("rtf", 0.0),
+                date=tuned.get("tuned_at", ""),
+            ))
+        else:
+            device, compute_type, _, _ = local_tuning.resolve(loc)
+            self.lbl_local_tuned.setText(t("local_tuned_none", device=device, compute_type=compute_type))
+
+    def on_run_benchmark(self):
+        model_size = self.cmb_local_size.currentText()
+        # Out of process, the candidate models are loaded by a worker process instead of this one
+        provider = LocalProcessProvider if self.chk_local_out_of_process.isChecked() else LocalProvider
+        self.btn_local_benchmark.setEnabled(False)
+        self.bar_local_benchmark.setVisible(True)
+        self.bar_local_benchmark.setValue(0)
+
+        def _job():
             try:
-                import sounddevice as sd
-                devices = sd.query_devices()
-                for idx, dev in enumerate(devices):
-                    if int(dev.get("max_input_channels", 0)) > 0:
-                        self.cmb_input_device.addItem(f"{dev.get('name')} (sd:{idx})", idx)
-            except:
-                pass
+                result = provider.benchmark(model_size, progress=self.benchmark_progress.emit)
+            except Exception as e:
+                result = str(e)
+            self.benchmark_finished.emit(result)
+
+        threading.Thread(target=_job, name="local-benchmark", daemon=True).start()
+
+    def _on_benchmark_progress(self, done, total, label):
+        self.bar_local_benchmark.setMaximum(max(1, total))
+        self.bar_local_benchmark.setValue(done)
+        if label:
+            self.lbl_local_tuned.setText(t("local_benchmark_running", label=label))
+
+    def _on_benchmark_finished(self, result):
+        self.btn_local_benchmark.setEnabled(True)
+        self.bar_local_benchmark.setVisible(False)
+        if isinstance(result, str):
+            self.lbl_local_tuned.setText(t("local_benchmark_failed", error=result))
+            return
+        self._show_tuning()
+        # Let the overlay reload the model with the new configuration
+        self.settings_applied.emit(config_manager.settings)
 
     def on_dict_add(self):
         row = self.tbl_dict.rowCount()
@@ -349,10 +484,13 @@ class SettingsDialog(QDialog):
                 "max_record_seconds": self.spn_max_record_seconds.value(),
                 "min_duration": self.spn_min_duration.value(),
                 "auto_paste": self.chk_auto_paste.isChecked(),
+                "stream_paste": self.chk_stream_paste.isChecked(),
+                "warm_stream": self.chk_warm_stream.isChecked(),
                 "paste_delay_ms": self.spn_paste_delay_ms.value(),
                 # keep legacy or hidden values
                 "hold_key": self.cmb_hold_key.currentData(),
                 "input_device": self.cmb_input_device.currentData(),
+                "upload_format": self.cmb_upload_format.currentData(),
             },
             "ui": {
                 "language": self.cmb_language.currentData()
@@ -363,10 +501,22 @@ class SettingsDialog(QDialog):
                 "gemini_transcribe_prompt": self.txt_gemini_prompt.toPlainText()
             },
             "dictionary": dic,
+            "providers": {
+                "race": bool(self.cmb_race.currentData()),
+                "race_with": self.cmb_race.currentData() or "same",
+            },
             "local": {
                 "model_size": self.cmb_local_size.currentText(),
                 "device": self.cmb_local_device.currentText(),
-                "compute_type": self.cmb_local_compute.currentText()
+                "compute_type": self.cmb_local_compute.currentText(),
+                "cpu_threads": self.spn_local_cpu_threads.value(),
+                "num_workers": self.spn_local_num_workers.value(),
+                "beam_size": self.cmb_local_decoding.currentData(),
+                "batched": self.chk_local_batched.isChecked(),
+                "batch_size": self.spn_local_batch_size.value(),
+                "out_of_process": self.chk_local_out_of_process.isChecked(),
+                "use_daemon": self.chk_local_use_daemon.isChecked(),
+                "daemon_socket": self.txt_local_daemon_socket.text().strip(),
             }
         }
         
@@ -377,42 +527,31 @@ class SettingsDialog(QDialog):
     # Test logic stubs (mic test, recording test)
     # Similar to main.py but using local methods
     def on_toggle_mic_test(self):
-        if self._mic_stream:
+        if self._mic_recorder:
             self._stop_mic_test()
         else:
             self._start_mic_test()
 
     def _start_mic_test(self):
-        def callback(indata, frames, time_info, status):
-             level = float(np.sqrt(np.mean(np.square(indata)))) if frames else 0.0
+        def on_level(peak, rms, chunk):
              with self._audio_lock:
-                 self._mic_level = level
+                 self._mic_level = rms
         try:
             device = self.cmb_input_device.currentData()
-            # Use sounddevice directly for testing since Rust recorder doesn't support callback streaming to Python yet
-            # Use sounddevice directly for testing since Rust recorder doesn't support callback streaming to Python yet
-            # if device is not None and not isinstance(device, int):
-            #    # Fallback if device is not int (Rust path uses int, SD uses int or str but Config stores int mostly now)
-            #    pass  
-                
-            self._mic_stream = sd.InputStream(
-                device=device,
-                channels=1,
-                samplerate=SAMPLE_RATE,
-                callback=callback
-            )
-            self._mic_stream.start()
+            self._mic_recorder = AudioRecorder()
+            self._mic_recorder.subscribe(on_level)
+            self._mic_recorder.start(max_seconds=None, input_device=device, monitor_only=True)
             self.btn_mic_test.setText(t("tests_mic_stop"))
             self._mic_timer.start()
         except Exception as e:
             print(f"Mic Test Error: {e}")
-            self._mic_stream = None
+            self._mic_recorder = None
 
     def _stop_mic_test(self):
-        if self._mic_stream:
-            self._mic_stream.stop()
-            self._mic_stream.close()
-            self._mic_stream = None
+        if self._mic_recorder:
+            self._mic_recorder.unsubscribe()
+            self._mic_recorder.cleanup()
+            self._mic_recorder = None
         self.btn_mic_test.setText(t("tests_mic_start"))
         self._mic_timer.stop()
         self.mic_bar.setValue(0)
@@ -423,35 +562,21 @@ class SettingsDialog(QDialog):
         self.mic_bar.setValue(min(100, int(level * 300)))
 
     def on_test_start_recording(self):
-        self._test_recorded_chunks = []
-        self._test_is_recording = True
-        
-        def callback(indata, frames, time_info, status):
-             if self._test_is_recording:
-                 self._test_recorded_chunks.append(indata.copy())
-        
+        self._test_audio = None
         try:
             device = self.cmb_input_device.currentData()
-            self._test_rec_stream = sd.InputStream(
-                device=device,
-                channels=1,
-                samplerate=SAMPLE_RATE,
-                callback=callback
-            )
-            self._test_recording_fs = int(self._test_rec_stream.samplerate)
-            self._test_rec_stream.start()
+            self._test_recorder = AudioRecorder()
+            self._test_recorder.start(input_device=device)
             self.btn_test_record.setEnabled(False)
             self.btn_test_stop.setEnabled(True)
         except Exception as e:
             print(f"Test Record Error: {e}")
-            pass
+            self._test_recorder = None
 
     def on_test_stop_recording(self):
-        self._test_is_recording = False
-        if self._test_rec_stream:
-            self._test_rec_stream.stop()
-            self._test_rec_stream.close()
-            self._test_rec_stream = None
+        if self._test_recorder:
+            self._test_audio = self._test_recorder.stop()
+            self._test_recorder = None
         self.btn_test_record.setEnabled(True)
         self.btn_test_stop.setEnabled(False)
         self.btn_test_transcribe.setEnabled(True)
@@ -459,26 +584,16 @@ class SettingsDialog(QDialog):
     # ... (previous methods)
 
     def on_test_transcribe(self):
-        if not self._test_recorded_chunks: return
-        import wave
-        import tempfile
-        from PyQt6.QtCore import QThread
+        if not self._test_audio: return
+        from rust_core import AudioBuffer
         
-        full_audio = np.concatenate(self._test_recorded_chunks, axis=0)
+        full_audio = np.frombuffer(self._test_audio, dtype=np.int16).astype(np.float32)
         # normalize
         mx = np.max(np.abs(full_audio))
         if mx > 0: full_audio = full_audio / mx
         
-        # Cleanup previous temp file if exists? 
-        # In this scope we create a new one. cleanup logic should be in worker or here after done.
-        
-        tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-        self._test_temp_path = tmp.name # Keep reference
-        with wave.open(tmp.name, "wb") as w:
-            w.setnchannels(1)
-            w.setsampwidth(2)
-            w.setframerate(self._test_recording_fs)
-            w.writeframes((full_audio * 32767).astype(np.int16).tobytes())
+        pcm = np.ascontiguousarray((full_audio * 32767).astype(np.int16))
+        audio = AudioBuffer(pcm, self._test_audio.sample_rate, self._test_audio.channels)
             
         provider = self.cmb_provider.currentText()
         prompts = config_manager.settings.get("prompts", {})
@@ -486,41 +601,30 @@ class SettingsDialog(QDialog):
         self.txt_test_result.setPlainText(t("tests_transcribing"))
         self.btn_test_transcribe.setEnabled(False)
         
-        self._ai_thread = QThread()
-        self._ai_worker = AIWorker(provider, tmp.name, prompts)
-        self._ai_worker.moveToThread(self._ai_thread)
-        self._ai_thread.started.connect(self._ai_worker.run)
+        # Runs on the shared inference loop like dictations do
+        self._ai_worker = AIWorker(provider, audio, prompts)
         self._ai_worker.finished.connect(self._on_test_finished)
         self._ai_worker.error.connect(self._on_test_error)
-        # Cleanup thread
-        self._ai_worker.finished.connect(self._ai_thread.quit)
-        self._ai_worker.error.connect(self._ai_thread.quit)
-        self._ai_worker.finished.connect(self._ai_worker.deleteLater)
-        self._ai_thread.finished.connect(self._ai_thread.deleteLater)
-        # Cleanup temp file
-        self._ai_worker.finished.connect(lambda: self._cleanup_test_file())
-        self._ai_worker.error.connect(lambda: self._cleanup_test_file())
-        
-        self._ai_thread.start()
-        
-    def _cleanup_test_file(self):
-        if hasattr(self, '_test_temp_path') and self._test_temp_path and os.path.exists(self._test_temp_path):
-            try:
-                os.remove(self._test_temp_path)
-            except Exception:
-                pass
-            self._test_temp_path = None
-        self.btn_test_transcribe.setEnabled(True)
+        self._ai_worker.start()
 
     def _on_test_finished(self, text):
         self.txt_test_result.setPlainText(text)
+        self.btn_test_transcribe.setEnabled(True)
         
     def _on_test_error(self, err):
         self.txt_test_result.setPlainText(f"Error: {err}")
+        self.btn_test_transcribe.setEnabled(True)
+
+    def _on_devices_changed(self):
+        self.devices_changed.emit()
+
+    def showEvent(self, event):
+        add_change_listener(self._on_devices_changed)
+        super().showEvent(event)
 
     def closeEvent(self, event):
+        remove_change_listener(self._on_devices_changed)
         self._stop_mic_test()
         self.on_test_stop_recording()
-        self._cleanup_test_file() # Ensure cleanup on close
         event.accept()
 
@@ -4,13 +4,11 @@ from PyQt6.QtWidgets import (
     QCheckBox, QMessageBox, QFormLayout, QProgressBar
 )
 from PyQt6.QtCore import QTimer, Qt
-import sounddevice as sd
-import numpy as np
 import threading
 
 from src.core.config import config_manager
-# from src.audio.recorder import open_input_stream_with_fallback, SAMPLE_RATE
-from src.core.const import SAMPLE_RATE
+from src.audio.recorder import AudioRecorder
+from src.audio.devices import list_input_devices, refresh_input_devices, resolve_input_device_id
 
 class SetupWizardDialog(QDialog):
     from PyQt6.QtCore import pyqtSignal
@@ -23,7 +21,7 @@ class SetupWizardDialog(QDialog):
 
         self._audio_lock = threading.Lock()
         self._mic_level = 0.0
-        self._mic_stream = None
+        self._mic_recorder = None
 
         self.pages = QStackedWidget()
         self._build_page_welcome()
@@ -109,7 +107,7 @@ class SetupWizardDialog(QDialog):
         top = QHBoxLayout()
         self.wiz_input_device = QComboBox()
         self.btn_refresh_devices = QPushButton("Refresh")
-        self.btn_refresh_devices.clicked.connect(self._refresh_devices)
+        self.btn_refresh_devices.clicked.connect(self._rescan_devices)
         top.addWidget(QLabel("Input Device"))
         top.addWidget(self.wiz_input_device, 1)
         top.addWidget(self.btn_refresh_devices)
@@ -174,7 +172,7 @@ class SetupWizardDialog(QDialog):
         self.wiz_auto_paste.setChecked(bool(audio.get("auto_paste", True)))
         
         self._refresh_devices()
-        current_dev = audio.get("input_device")
+        current_dev = resolve_input_device_id(audio.get("input_device"))
         idx = self.wiz_input_device.findData(current_dev)
         if idx >= 0: self.wiz_input_device.setCurrentIndex(idx)
         self._update_provider_ui()
@@ -187,56 +185,45 @@ class SetupWizardDialog(QDialog):
         self.wiz_groq_key.setEnabled(prov == "groq")
         self.lbl_local_note.setVisible(prov == "local")
 
+    def _rescan_devices(self):
+        refresh_input_devices()
+        self._refresh_devices()
+
     def _refresh_devices(self):
         self.wiz_input_device.clear()
         self.wiz_input_device.addItem("Default", None)
-        try:
-            import rust_core
-            devices = rust_core.get_input_devices()
-            for name, idx in devices:
-                self.wiz_input_device.addItem(f"{name} ({idx})", idx)
-        except Exception as e:
-             # Fallback
-            try:
-                import sounddevice as sd
-                devices = sd.query_devices()
-                for idx, dev in enumerate(devices):
-                     if int(dev.get("max_input_channels", 0)) > 0:
-                         self.wiz_input_device.addItem(f"{dev.get('name')} (sd:{idx})", idx)
-            except:
-                pass
+        seen = {}
+        for name, dev_id, is_default in list_input_devices():
+            seen[name] = seen.get(name, 0) + 1
+            label = name if seen[name] == 1 else f"{name} #{seen[name]}"
+            self.wiz_input_device.addItem(label, dev_id)
 
     def _toggle_mic_test(self):
-        if self._mic_stream:
+        if self._mic_recorder:
              self._stop_mic_test()
         else:
              self._start_mic_test()
 
     def _start_mic_test(self):
-        def callback(indata, frames, time_info, status):
-             level = float(np.sqrt(np.mean(np.square(indata)))) if frames else 0.0
+        def on_level(peak, rms, chunk):
              with self._audio_lock:
-                 self._mic_level = level
+                 self._mic_level = rms
         try:
             device = self.wiz_input_device.currentData()
-            self._mic_stream = sd.InputStream(
-                device=device,
-                channels=1,
-                samplerate=SAMPLE_RATE,
-                callback=callback
-            )
-            self._mic_stream.start()
+            self._mic_recorder = AudioRecorder()
+            self._mic_recorder.subscribe(on_level)
+            self._mic_recorder.start(max_seconds=None, input_device=device, monitor_only=True)
             self.btn_mic_test.setText("Stop Mic Test")
             self._mic_timer.start()
         except Exception as e:
             print(f"Mic Test Error: {e}")
-            self._mic_stream = None
+            self._mic_recorder = None
 
     def _stop_mic_test(self):
-        if self._mic_stream:
-            self._mic_stream.stop()
-            self._mic_stream.close()
-            self._mic_stream = None
+        if self._mic_recorder:
+            self._mic_recorder.unsubscribe()
+            self._mic_recorder.cleanup()
+            self._mic_recorder = None
         self.btn_mic_test.setText("Start Mic Test")
         self._mic_timer.stop()
         self.mic_bar.setValue(0)
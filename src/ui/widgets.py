@@ -8,6 +8,8 @@ def make_tray_icon_for_state(state: str):
         fill = QColor("#dc143c")
     elif s == "processing":
         fill = QColor("#ffc107")
+    elif s == "warming":
+        fill = QColor("#9e9e9e")
     elif s == "error":
         fill = QColor("#b00020")
     elif s == "success":
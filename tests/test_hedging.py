@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from src.ai import hedging
+
+SETTINGS = {"hedge_default_delay_ms": 50, "hedge_min_delay_ms": 10}
+
+
+@pytest.fixture(autouse=True)
+def stats(tmp_path, monkeypatch):
+    stats = hedging.HedgeStats(str(tmp_path / "hedge_stats.json"))
+    monkeypatch.setattr(hedging, "stats", stats)
+    return stats
+
+
+def run_race(answers):
+    """Race "a" against "b"; answers[name] is an async callable. Returns (result, {name: start time})."""
+    calls = {}
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def call(name):
+            calls[name] = loop.time() - started
+            return await answers[name]()
+
+        return await hedging.race("a", "b", call, SETTINGS)
+
+    return asyncio.run(main()), calls
+
+
+def answer(text, after=0.0):
+    async def _answer():
+        await asyncio.sleep(after)
+        return text
+    return _answer
+
+
+def fail(error):
+    async def _fail():
+        raise error
+    return _fail
+
+
+def test_backup_fires_after_the_delay():
+    result, calls = run_race({"a": answer("slow", after=1.0), "b": answer("fast")})
+    assert result == "fast"
+    assert calls["b"] >= 0.05
+
+
+def test_fast_primary_never_fires_the_backup():
+    result, calls = run_race({"a": answer("quick"), "b": answer("unused")})
+    assert result == "quick"
+    assert "b" not in calls
+
+
+def test_all_empty_answers_return_empty_text(stats):
+    result, calls = run_race({"a": answer(""), "b": answer("  ")})
+    assert result == ""
+    # The empty primary fired the backup without waiting for the delay
+    assert calls["b"] < 0.05
+    assert stats.races["a>b"]["no_answer"] == 1
+
+
+def test_transient_error_fires_the_backup_early():
+    result, calls = run_race({"a": fail(ConnectionError("reset")), "b": answer("ok")})
+    assert result == "ok"
+    assert calls["b"] < 0.05
+
+
+def test_other_errors_are_raised_without_a_backup():
+    with pytest.raises(ValueError):
+        run_race({"a": fail(ValueError("bad request")), "b": answer("unused")})
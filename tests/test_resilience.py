@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from src.core.config import config_manager
+from src.ai import resilience
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    providers = {
+        "retries": 2,
+        "retry_backoff_ms": 0,
+        "timeouts": {"transcription": 0.05},
+        "breaker_threshold": 3,
+        "breaker_cooldown_seconds": 0.05,
+    }
+    monkeypatch.setitem(config_manager.settings, "providers", providers)
+    return providers
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def call_stage(errors, result="ok", retries=None):
+    """Run call_stage with a call that raises errors in turn, then returns result. Returns (outcome, attempts)."""
+    attempts = []
+
+    async def make_call():
+        attempts.append(len(attempts))
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+
+    async def main():
+        return await resilience.call_stage("transcription", make_call, "test", retries=retries)
+
+    try:
+        return asyncio.run(main()), len(attempts)
+    except Exception as e:
+        return e, len(attempts)
+
+
+def test_transient_errors_are_retried():
+    outcome, attempts = call_stage([ConnectionError("reset"), StatusError(503)])
+    assert outcome == "ok"
+    assert attempts == 3
+
+
+def test_other_errors_are_not_retried():
+    outcome, attempts = call_stage([StatusError(400)])
+    assert isinstance(outcome, StatusError)
+    assert attempts == 1
+
+
+def test_gives_up_after_the_configured_retries():
+    outcome, attempts = call_stage([ConnectionError("reset")] * 3)
+    assert isinstance(outcome, ConnectionError)
+    assert attempts == 3
+
+
+def test_explicit_retries_override_the_setting():
+    outcome, attempts = call_stage([ConnectionError("reset")], retries=0)
+    assert isinstance(outcome, ConnectionError)
+    assert attempts == 1
+
+
+def test_deadline_raises_timeout_error():
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def main():
+        return await resilience.call_stage("transcription", slow, "test", retries=0)
+
+    with pytest.raises(TimeoutError, match="timed out"):
+        asyncio.run(main())
+
+
+def test_is_transient_classification():
+    assert resilience.is_transient(TimeoutError())
+    assert resilience.is_transient(StatusError(429))
+    assert not resilience.is_transient(StatusError(401))
+    assert not resilience.is_transient(ValueError("bad audio"))
+
+
+def test_breaker_opens_after_the_threshold():
+    breaker = resilience.CircuitBreaker("test")
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allows()
+
+
+def test_breaker_half_opens_after_the_cooldown():
+    breaker = resilience.CircuitBreaker("test")
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allows()
+    # A failed trial opens it for another cool-down
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_breaker_closes_on_success():
+    breaker = resilience.CircuitBreaker("test")
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    # Consecutive failures start counting again
+    breaker.record_failure()
+    assert breaker.state == "closed"
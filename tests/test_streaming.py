@@ -0,0 +1,53 @@
+from src.ai.worker import MAX_PENDING_CHARS, SentenceChunker, release_point
+
+
+def test_release_point_cuts_after_the_last_sentence_end():
+    assert release_point("今日は晴れ。明日は") == 6
+    assert release_point("Hello world. More") == 12
+
+
+def test_release_point_needs_whitespace_after_a_period():
+    assert release_point("pi is 3.14 and") == 0
+
+
+def test_release_point_cuts_before_a_newline():
+    assert release_point("一行目\n二行目") == 3
+
+
+def test_release_point_releases_long_text_without_a_sentence_end():
+    assert release_point("あ" * MAX_PENDING_CHARS) == MAX_PENDING_CHARS
+    assert release_point("あ" * (MAX_PENDING_CHARS - 1)) == 0
+
+
+def test_release_point_does_not_split_a_dictionary_entry():
+    assert release_point("I met Dr. Smith today", ["Dr. Smith"]) == 0
+    # Still arriving at the end of the text
+    assert release_point("I met Dr. Sm", ["Dr. Smith"]) == 0
+
+
+def test_release_point_keeps_earlier_sentences_before_a_cjk_entry():
+    keys = ["モーニング娘。"]
+    assert release_point("こんにちは。昨日はモーニング", keys) == 6
+    # Ending on the entry's own 。 is a boundary after it, not inside it
+    assert release_point("こんにちは。昨日はモーニング娘。のライブ", keys) == 16
+
+
+def test_chunker_releases_whole_sentences():
+    chunker = SentenceChunker()
+    assert chunker.feed("  Hello") == ""
+    assert chunker.feed(" world. Next") == "Hello world."
+    assert chunker.feed(" one") == ""
+    assert chunker.flush() == " Next one"
+
+
+def test_chunker_flush_empties_the_buffer():
+    chunker = SentenceChunker()
+    chunker.feed("まだ途中")
+    assert chunker.flush() == "まだ途中"
+    assert chunker.flush() == ""
+
+
+def test_chunker_flush_of_whitespace_only_stream_is_empty():
+    chunker = SentenceChunker()
+    assert chunker.feed("  \n ") == ""
+    assert chunker.flush() == ""
@@ -16,8 +16,8 @@ def main():
     try:
         devices = rust_core.get_input_devices()
         print(f"Found {len(devices)} devices:")
-        for name, idx in devices:
-            print(f"  [{idx}] {name}")
+        for name, dev_id, is_default in devices:
+            print(f"  {'*' if is_default else ' '} {name} [{dev_id}]")
     except Exception as e:
         print(f"FAILED to list devices: {e}")
         return
@@ -47,12 +47,23 @@ def main():
     is_silent = rec.is_silence(energy_threshold=vad_energy, peak_threshold=vad_peak, min_duration=min_dur)
     print(f"Is Silence? {is_silent} (Thresholds: E={vad_energy}, P={vad_peak}, D={min_dur})")
     
-    path = rec.stop()
-    print(f"Recording saved at: {path}")
-    
-    if path and os.path.exists(path):
-        os.remove(path)
-        print("File cleaned up.")
+    audio = rec.stop()
+    if audio is not None:
+        print(f"In-memory recording: {audio.frames} frames, {audio.channels} ch @ {audio.sample_rate} Hz ({audio.duration:.2f} s)")
+    rec.cleanup()
+
+    # 3. Level subscription (monitor only, nothing is kept)
+    print("\n3. Testing level subscription (1 second)...")
+    batches = []
+    rec.subscribe(lambda peak, rms, chunk: batches.append((peak, rms)), interval_ms=100)
+    try:
+        rec.start(max_seconds=None, monitor_only=True)
+        time.sleep(1)
+    finally:
+        rec.stop()
+        rec.unsubscribe()
+    time.sleep(0.1)
+    print(f"Received {len(batches)} level batches (expected ~10)")
     
     print("\n=== Verification Complete ===")
 
@@ -13,7 +13,7 @@ def main():
     
     print("Starting recording (2 seconds)...")
     try:
-        rec.start(max_seconds=5)
+        rec.start(max_seconds=5, to_file=True)
     except Exception as e:
         print(f"Failed to start: {e}")
         return